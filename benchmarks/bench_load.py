@@ -0,0 +1,238 @@
+"""
+Load test: drive the server's tools against a local fake Graph at fixed concurrency
+
+Starts benchmarks/fake_graph.py on a local port, points a GraphServiceClient
+built with the server's own middleware pipeline at it, and calls tools through
+the MCP call_tool handler. Reports latency percentiles, throughput and Graph
+requests per tool call for each scenario.
+
+    python benchmarks/bench_load.py --concurrency 8 --calls 50
+    python benchmarks/bench_load.py --scenarios search_messages --latency 0.02 \\
+        --latency-for messages=0.05 --throttle-rate 0.05
+    python benchmarks/bench_load.py --transport default --connect-latency 0.05
+
+``--transport default`` uses the SDK's stock httpx client, as the server did before
+its transport became configurable, for comparison with the tuned client.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_graph import FakeGraph
+from kiota_abstractions.authentication import AnonymousAuthenticationProvider
+from kiota_http.kiota_client_factory import KiotaClientFactory
+from mcp import types
+from msgraph import GraphRequestAdapter, GraphServiceClient
+from msgraph_core import GraphClientFactory
+
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.server import M365TeamsServer
+
+
+def scenarios(graph: FakeGraph, rng: random.Random) -> dict[str, Callable[[], dict]]:
+    """Tool name and argument generators, one per scenario"""
+
+    def channel() -> tuple[str, str]:
+        team = rng.choice(graph.teams)["id"]
+        return team, rng.choice(graph.channels[team])["id"]
+
+    def channel_messages() -> dict:
+        team_id, channel_id = channel()
+        return {"team_id": team_id, "channel_id": channel_id, "limit": 100}
+
+    return {
+        "list_teams": lambda: ("list_teams", {}),
+        "get_team_channels": lambda: (
+            "get_team_channels",
+            {"team_id": rng.choice(graph.teams)["id"]},
+        ),
+        "get_channel_messages": lambda: ("get_channel_messages", channel_messages()),
+        "search_messages": lambda: ("search_messages", {"query": "deploy", "limit": 1000}),
+        "get_users_presence": lambda: (
+            "get_users_presence",
+            {"users": [user["mail"] for user in rng.sample(graph.users, 20)]},
+        ),
+        "send_channel_message": lambda: (
+            "send_channel_message",
+            {**dict(zip(("team_id", "channel_id"), channel())), "message": "load test"},
+        ),
+    }
+
+
+def percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_scenario(
+    server: M365TeamsServer, graph: FakeGraph, make_call: Callable, calls: int, concurrency: int
+) -> dict:
+    handler = server.app.request_handlers[types.CallToolRequest]
+    latencies: list[float] = []
+    errors: list[str] = []
+    remaining = iter(range(calls))
+
+    async def call() -> str:
+        name, arguments = make_call()
+        request = types.CallToolRequest(
+            method="tools/call",
+            params=types.CallToolRequestParams(name=name, arguments=arguments),
+        )
+        result = (await handler(request)).root
+        return result.content[0].text
+
+    async def worker() -> None:
+        for _ in remaining:
+            started = time.perf_counter()
+            text = await call()
+            latencies.append(time.perf_counter() - started)
+            if text.startswith("Error:"):
+                errors.append(text)
+
+    # The first call pays for importing the Graph models it deserializes
+    await call()
+    graph.reset_stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    graph_requests = sum(graph.requests.values())
+    return {
+        "calls": calls,
+        "errors": len(errors),
+        "first_error": errors[0][:200] if errors else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "calls_per_second": round(calls / elapsed, 1),
+        "graph_requests_per_call": round(graph_requests / calls, 2),
+        "graph_requests": dict(graph.requests),
+        "throttled": graph.throttled,
+        "connections": graph.connections,
+        "bytes_received": graph.bytes_sent,
+    }
+
+
+def build_server(graph: FakeGraph, args: argparse.Namespace) -> M365TeamsServer:
+    settings = Settings(
+        eager_init=False,
+        graph_batching=args.batching,
+        graph_rate=args.graph_rate,
+        graph_burst=args.graph_rate * 2,
+        graph_max_concurrency=args.graph_concurrency,
+        search_concurrency=args.search_concurrency,
+        directory_cache_ttl=300.0 if args.cache else 0.0,
+        presence_cache_ttl=30.0 if args.cache else 0.0,
+        user_cache_ttl=3600.0 if args.cache else 0.0,
+        http_max_connections=args.max_connections,
+        http_max_keepalive=args.max_keepalive,
+        http_compression=not args.no_compression,
+    )
+    server = M365TeamsServer(settings)
+    if args.transport == "tuned":
+        http_client = server._build_http_client(graph.base_url)
+    else:
+        client = KiotaClientFactory.get_default_client()
+        client.base_url = graph.base_url
+        http_client = GraphClientFactory.create_with_custom_middleware(
+            server._graph_middleware(), client=client
+        )
+    adapter = GraphRequestAdapter(AnonymousAuthenticationProvider(), http_client)
+    server.http_client = http_client
+    server.client = GraphServiceClient(request_adapter=adapter)
+    return server
+
+
+def parse_latency(values: list[str]) -> dict[str, float]:
+    latency = {}
+    for value in values:
+        route, _, seconds = value.partition("=")
+        latency[route] = float(seconds)
+    return latency
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenarios", default="list_teams,get_team_channels,get_channel_messages,"
+                        "search_messages,get_users_presence,send_channel_message")
+    parser.add_argument("--calls", type=int, default=20, help="Tool calls per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent tool calls")
+    parser.add_argument("--teams", type=int, default=10)
+    parser.add_argument("--channels", type=int, default=5, help="Channels per team")
+    parser.add_argument("--messages", type=int, default=120, help="Messages per channel")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005, help="Default Graph latency (s)")
+    parser.add_argument("--latency-for", action="append", default=[], metavar="ROUTE=SECONDS",
+                        help="Per-endpoint latency, e.g. messages=0.05 (see fake_graph.ROUTES)")
+    parser.add_argument("--connect-latency", type=float, default=0.0,
+                        help="Extra delay on each new connection (s), like a TLS handshake")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction answered 429")
+    parser.add_argument("--retry-after", default="0", help="Retry-After of injected 429s")
+    parser.add_argument("--graph-rate", type=float, default=1000.0,
+                        help="Scheduler requests/second per resource")
+    parser.add_argument("--graph-concurrency", type=int, default=16)
+    parser.add_argument("--search-concurrency", type=int, default=8)
+    parser.add_argument("--transport", choices=("tuned", "default"), default="tuned",
+                        help="Configured HTTP client, or the SDK's stock one")
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--max-keepalive", type=int, default=100)
+    parser.add_argument("--no-compression", action="store_true", help="Ask for identity bodies")
+    parser.add_argument("--batching", action="store_true", help="Enable $batch coalescing")
+    parser.add_argument("--cache", action="store_true", help="Keep directory and user caches on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="Also write results as JSON")
+    args = parser.parse_args()
+
+    graph = FakeGraph(
+        teams=args.teams,
+        channels=args.channels,
+        messages=args.messages,
+        users=args.users,
+        default_latency=args.latency,
+        latency=parse_latency(args.latency_for),
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        connect_latency=args.connect_latency,
+        seed=args.seed,
+    )
+    await graph.start()
+    server = build_server(graph, args)
+    rng = random.Random(args.seed)
+    available = scenarios(graph, rng)
+
+    results: dict[str, Any] = {}
+    try:
+        for name in args.scenarios.split(","):
+            results[name] = await run_scenario(
+                server, graph, available[name], args.calls, args.concurrency
+            )
+    finally:
+        await server.http_client.aclose()
+        await graph.stop()
+
+    print(
+        f"{'scenario':<22}{'p50 ms':>9}{'p99 ms':>9}{'calls/s':>9}"
+        f"{'graph/call':>11}{'429s':>6}{'conns':>7}{'KiB':>9}{'errors':>8}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<22}{r['p50_ms']:>9}{r['p99_ms']:>9}{r['calls_per_second']:>9}"
+            f"{r['graph_requests_per_call']:>11}{r['throttled']:>6}{r['connections']:>7}"
+            f"{r['bytes_received'] // 1024:>9}{r['errors']:>8}"
+        )
+        if r["first_error"]:
+            print(f"  first error: {r['first_error']}")
+    if args.json:
+        Path(args.json).write_text(json.dumps({"args": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
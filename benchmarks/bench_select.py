@@ -0,0 +1,129 @@
+"""
+Benchmark: bytes transferred by the read tools with and without $select projection
+
+Serves realistic team and channel payloads from an in-process $batch endpoint
+that applies $select, and compares response sizes for each read tool. Channel
+messages are left out: Graph ignores $select on them, so get_channel_messages
+only trims fields locally and transfers the same bytes either way.
+
+    python benchmarks/bench_select.py
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from kiota_abstractions.authentication import AnonymousAuthenticationProvider
+from msgraph import GraphRequestAdapter, GraphServiceClient
+
+from mcp_m365_teams import server as server_module
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.server import M365TeamsServer
+
+ENTITIES = {
+    "joinedTeams": [
+        {
+            "id": f"team-{i}",
+            "createdDateTime": "2023-05-01T00:00:00Z",
+            "displayName": f"Team {i}",
+            "description": f"Team {i} description",
+            "internalId": f"19:{i}@thread.tacv2",
+            "classification": None,
+            "specialization": "none",
+            "visibility": "private",
+            "webUrl": f"https://teams.microsoft.com/l/team/19%3A{i}%40thread.tacv2",
+            "isArchived": False,
+            "tenantId": "e61ef81e-8bd8-476a-92e8-4a62f8426fca",
+            "isMembershipLimitedToOwners": False,
+            "memberSettings": None,
+            "guestSettings": None,
+            "messagingSettings": None,
+            "funSettings": None,
+            "discoverySettings": None,
+            "summary": None,
+        }
+        for i in range(20)
+    ],
+    "channels": [
+        {
+            "id": f"19:channel{i}@thread.tacv2",
+            "createdDateTime": "2023-05-01T00:00:00Z",
+            "displayName": f"Channel {i}",
+            "description": f"Channel {i} description",
+            "isFavoriteByDefault": None,
+            "email": f"channel{i}@contoso.onmicrosoft.com",
+            "tenantId": "e61ef81e-8bd8-476a-92e8-4a62f8426fca",
+            "webUrl": f"https://teams.microsoft.com/l/channel/19%3Achannel{i}%40thread.tacv2",
+            "membershipType": "standard",
+            "isArchived": False,
+        }
+        for i in range(20)
+    ],
+}
+
+
+class FakeGraph:
+    """$batch endpoint that applies $select and $top and counts response bytes"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    async def send(self, payload: dict) -> dict:
+        responses = []
+        for request in payload["requests"]:
+            url = urlparse(request["url"])
+            query = parse_qs(url.query)
+            items = ENTITIES[url.path.rsplit("/", 1)[-1]]
+            if "$top" in query:
+                items = items[: int(query["$top"][0])]
+            if "$select" in query:
+                keep = query["$select"][0].split(",")
+                items = [{k: v for k, v in item.items() if k in keep} for item in items]
+            body = {"value": items}
+            self.bytes += len(json.dumps(body))
+            responses.append({"id": request["id"], "status": 200, "body": body})
+        return {"responses": responses}
+
+
+async def measure(select: bool) -> dict:
+    graph = FakeGraph()
+    server = M365TeamsServer(Settings(graph_batching=True))
+    server.client = GraphServiceClient(
+        request_adapter=GraphRequestAdapter(AnonymousAuthenticationProvider())
+    )
+    server.batcher._send = graph.send
+    tools = {
+        "list_teams": lambda: server._list_teams(),
+        "get_team_channels": lambda: server._get_team_channels("team-0"),
+    }
+
+    project = server_module.project
+    results = {}
+    with patch.object(
+        server_module,
+        "project",
+        project if select else (lambda mapping, fields=None: (project(mapping, fields)[0], None)),
+    ):
+        for name, call in tools.items():
+            graph.bytes = 0
+            await call()
+            results[name] = graph.bytes
+    return results
+
+
+async def main() -> None:
+    full = await measure(select=False)
+    projected = await measure(select=True)
+
+    print(f"{'tool':<42}{'full bytes':>12}{'$select':>12}{'reduction':>11}")
+    for name in full:
+        ratio = full[name] / projected[name]
+        print(f"{name:<42}{full[name]:>12,}{projected[name]:>12,}{ratio:>10.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Benchmark: time from launching the server to its first list_tools response
+
+Starts the server as a stdio subprocess with its default settings, the way MCP
+clients do, and times the initialize handshake plus the first tools/list round
+trip, while eager client initialization runs in the background. ``--eager``
+imports msgraph and azure-identity up front, as the server used to, for
+comparison.
+
+    python benchmarks/bench_startup.py [--runs 5] [--eager]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from mcp import ClientSession
+from mcp.client.stdio import StdioServerParameters, stdio_client
+
+SRC = str(Path(__file__).resolve().parents[1] / "src")
+
+LAUNCH = "import asyncio; from mcp_m365_teams.server import main; asyncio.run(main())"
+EAGER_IMPORTS = "import msgraph, azure.identity, kiota_http.middleware; "
+
+
+async def time_to_first_list_tools(eager: bool) -> tuple[float, int]:
+    """Seconds from spawning the server until tools/list answers, and the tool count"""
+    # Default settings, so eager client initialization runs as it would for a user; without
+    # credentials it stops short of calling Azure AD once the Graph SDK is imported
+    env = {
+        **{name: value for name, value in os.environ.items() if not name.startswith("M365_")},
+        "PYTHONPATH": os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")])),
+    }
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-c", (EAGER_IMPORTS if eager else "") + LAUNCH],
+        env=env,
+    )
+    started = time.perf_counter()
+    async with (
+        stdio_client(params) as (read_stream, write_stream),
+        ClientSession(read_stream, write_stream) as session,
+    ):
+        await session.initialize()
+        result = await session.list_tools()
+        elapsed = time.perf_counter() - started
+    return elapsed, len(result.tools)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="Import msgraph at startup")
+    args = parser.parse_args()
+
+    timings = []
+    tools = 0
+    for _ in range(args.runs):
+        elapsed, tools = await time_to_first_list_tools(args.eager)
+        timings.append(elapsed)
+
+    mode = "eager msgraph imports" if args.eager else "lazy msgraph imports"
+    print(f"time to first list_tools ({mode}, {tools} tools, {args.runs} runs)")
+    print(f"  median {statistics.median(timings) * 1000:8.1f} ms")
+    print(f"  min    {min(timings) * 1000:8.1f} ms")
+    print(f"  max    {max(timings) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,323 @@
+"""
+Local stand-in for the Microsoft Graph endpoints the server uses
+
+Serves a synthetic tenant over plain HTTP/1.1 with keep-alive, honouring
+$select, $top, $filter on users, @odata.nextLink paging, delta links and
+JSON $batch. Per-endpoint latency and random 429 responses can be injected,
+and every request is counted so benchmarks can report Graph calls per tool call.
+``connect_latency`` delays the first response on each new connection, standing in
+for the TCP and TLS handshakes a real Graph connection costs.
+"""
+import asyncio
+import gzip
+import json
+import random
+import re
+import uuid
+from collections import Counter
+from typing import Any
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# Largest page Graph returns for channel messages
+MAX_PAGE_SIZE = 50
+
+_CHANNEL = r"^/teams/(?P<team>[^/]+)/channels/(?P<channel>[^/]+)"
+
+ROUTES = [
+    ("GET", "joined_teams", re.compile(r"^/(?:me|users/[^/]+)/joinedTeams$")),
+    ("GET", "channels", re.compile(r"^/teams/(?P<team>[^/]+)/channels$")),
+    ("POST", "create_channel", re.compile(r"^/teams/(?P<team>[^/]+)/channels$")),
+    ("GET", "delta", re.compile(_CHANNEL + r"/messages/delta\(\)$")),
+    ("GET", "messages", re.compile(_CHANNEL + r"/messages$")),
+    ("POST", "send_message", re.compile(_CHANNEL + r"/messages$")),
+    ("POST", "add_members", re.compile(r"^/teams/(?P<team>[^/]+)/members/add$")),
+    ("POST", "add_member", re.compile(r"^/teams/(?P<team>[^/]+)/members$")),
+    ("POST", "create_team", re.compile(r"^/teams$")),
+    ("GET", "users", re.compile(r"^/users$")),
+    ("GET", "presence", re.compile(r"^/users/(?P<user>[^/]+)/presence$")),
+    ("POST", "presences", re.compile(r"^/communications/getPresencesByUserId$")),
+    ("POST", "batch", re.compile(r"^/\$batch$")),
+]
+
+# High bits of the synthetic IDs of each kind of record
+_TEAMS, _CHANNELS, _USERS = 1, 2, 3
+
+
+def _guid(kind: int, number: int) -> uuid.UUID:
+    """GUID-shaped ID of the numbered record of a kind, the same on every run"""
+    return uuid.UUID(int=kind << 64 | number)
+
+
+class FakeGraph:
+    """Synthetic tenant served over HTTP.
+
+    ``latency`` maps route names (see ``ROUTES``) to seconds and falls back to
+    ``default_latency``. A ``throttle_rate`` fraction of requests, and of $batch
+    sub-requests, is answered with 429 and ``Retry-After: retry_after``.
+    """
+
+    def __init__(
+        self,
+        teams: int = 10,
+        channels: int = 5,
+        messages: int = 100,
+        users: int = 100,
+        default_latency: float = 0.0,
+        latency: dict[str, float] | None = None,
+        throttle_rate: float = 0.0,
+        retry_after: str = "0",
+        compress: bool = True,
+        connect_latency: float = 0.0,
+        seed: int = 0,
+    ):
+        self.teams = [
+            {
+                "id": str(_guid(_TEAMS, t)),
+                "displayName": f"Team {t}",
+                "description": f"Team {t} workspace",
+            }
+            for t in range(teams)
+        ]
+        self.channels = {
+            team["id"]: [
+                {
+                    "id": f"19:{_guid(_CHANNELS, t << 32 | c).hex}@thread.tacv2",
+                    "displayName": f"Channel {c}",
+                    "description": f"Channel {c} of {team['displayName']}",
+                    "email": f"channel-{t}-{c}@contoso.onmicrosoft.com",
+                    "membershipType": "standard",
+                }
+                for c in range(channels)
+            ]
+            for t, team in enumerate(self.teams)
+        }
+        self.message_count = messages
+        self.users = [
+            {
+                "id": str(_guid(_USERS, u)),
+                "mail": f"user{u}@contoso.com",
+                "displayName": f"User {u}",
+            }
+            for u in range(users)
+        ]
+        self.default_latency = default_latency
+        self.latency = latency or {}
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.compress = compress
+        self.connect_latency = connect_latency
+        self._random = random.Random(seed)
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[asyncio.Task] = set()
+        self._writers: set[asyncio.StreamWriter] = set()
+        self.base_url = ""
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        self.requests: Counter = Counter()
+        self.throttled = 0
+        self.connections = 0
+        self.bytes_sent = 0
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; returns the base URL to give the Graph request adapter"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/v1.0"
+        return self.base_url
+
+    async def stop(self) -> None:
+        """Stop listening and close open keep-alive connections"""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in self._writers:
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    # HTTP plumbing
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        task = asyncio.current_task()
+        self._connections.add(task)
+        self._writers.add(writer)
+        handshake = self.connect_latency
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = json.loads(await reader.readexactly(length)) if length else None
+
+                if handshake:
+                    await asyncio.sleep(handshake)
+                    handshake = 0.0
+                status, payload, extra = await self.dispatch(method, target, body)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                response_headers = {"Content-Type": "application/json", **extra}
+                if self.compress and data and "gzip" in headers.get("accept-encoding", ""):
+                    data = gzip.compress(data, compresslevel=1)
+                    response_headers["Content-Encoding"] = "gzip"
+                response_headers["Content-Length"] = str(len(data))
+                head = f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n" + "".join(
+                    f"{name}: {value}\r\n" for name, value in response_headers.items()
+                )
+                writer.write(head.encode() + b"\r\n" + data)
+                await writer.drain()
+                self.bytes_sent += len(data)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            self._writers.discard(writer)
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, body: Any) -> tuple[int, Any, dict]:
+        """Serve one request (or $batch sub-request); returns status, JSON body and headers"""
+        url = urlparse(target)
+        # Graph tolerates the double slash the SDK leaves after a base URL ending in "/"
+        path = re.sub("/+", "/", url.path)
+        path = path.removeprefix("/v1.0")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        for route_method, name, pattern in ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                break
+        else:
+            return 404, {"error": {"code": "NotFound", "message": f"{method} {path}"}}, {}
+
+        self.requests[name] += 1
+        await asyncio.sleep(self.latency.get(name, self.default_latency))
+        if name != "batch" and self._random.random() < self.throttle_rate:
+            self.throttled += 1
+            error = {"error": {"code": "TooManyRequests", "message": "Throttled"}}
+            return 429, error, {"Retry-After": self.retry_after}
+        if name == "batch":
+            return 200, await self._serve_batch(body), {}
+        handler = getattr(self, f"_{name}")
+        return handler(path=path, query=query, body=body, **match.groupdict())
+
+    # Endpoints
+
+    def _select(self, items: list[dict], query: dict) -> list[dict]:
+        if "$select" not in query:
+            return items
+        keep = set(query["$select"].split(","))
+        return [{k: v for k, v in item.items() if k in keep} for item in items]
+
+    def _page(self, path: str, items: list[dict], query: dict, extra: dict) -> tuple:
+        top = min(int(query.get("$top", MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+        start = int(query.get("$skiptoken", 0))
+        body: dict[str, Any] = {"value": self._select(items[start : start + top], query)}
+        if start + top < len(items):
+            next_query = {**query, "$top": top, "$skiptoken": start + top}
+            body["@odata.nextLink"] = f"{self.base_url}{path}?{urlencode(next_query)}"
+        else:
+            body.update(extra)
+        return 200, body, {}
+
+    def _message(self, team: str, channel: str, i: int) -> dict:
+        author = self.users[i % len(self.users)]
+        topic = "deploy finished" if i % 97 == 0 else "status update"
+        return {
+            "id": f"{1700000000000 + i}",
+            "messageType": "message",
+            "createdDateTime": f"2024-01-{1 + i % 28:02d}T10:00:00Z",
+            "lastModifiedDateTime": f"2024-01-{1 + i % 28:02d}T10:00:00Z",
+            "deletedDateTime": None,
+            "importance": "normal",
+            "from": {"user": {"id": author["id"], "displayName": author["displayName"]}},
+            "body": {"contentType": "text", "content": f"{topic} #{i} in {channel}"},
+            "channelIdentity": {"teamId": team, "channelId": channel},
+            "attachments": [],
+            "mentions": [],
+            "reactions": [],
+        }
+
+    def _messages_for(self, team: str, channel: str) -> list[dict]:
+        # Newest first, like Graph
+        return [
+            self._message(team, channel, i) for i in reversed(range(self.message_count))
+        ]
+
+    def _joined_teams(self, path: str, query: dict, body: Any) -> tuple:
+        return 200, {"value": self._select(self.teams, query)}, {}
+
+    def _channels(self, path: str, query: dict, body: Any, team: str) -> tuple:
+        if team not in self.channels:
+            return 404, {"error": {"code": "NotFound", "message": "No such team"}}, {}
+        return 200, {"value": self._select(self.channels[team], query)}, {}
+
+    def _create_channel(self, path: str, query: dict, body: Any, team: str) -> tuple:
+        channel_id = uuid.UUID(int=self._random.getrandbits(128)).hex
+        channel = {**body, "id": f"19:{channel_id}@thread.tacv2"}
+        self.channels.setdefault(team, []).append(channel)
+        return 201, channel, {}
+
+    def _messages(self, path: str, query: dict, body: Any, team: str, channel: str) -> tuple:
+        return self._page(path, self._messages_for(team, channel), query, {})
+
+    def _delta(self, path: str, query: dict, body: Any, team: str, channel: str) -> tuple:
+        delta_link = f"{self.base_url}{path}?{urlencode({'$deltatoken': 'latest'})}"
+        if "$deltatoken" in query:
+            return 200, {"value": [], "@odata.deltaLink": delta_link}, {}
+        return self._page(
+            path, self._messages_for(team, channel), query, {"@odata.deltaLink": delta_link}
+        )
+
+    def _send_message(self, path: str, query: dict, body: Any, team: str, channel: str) -> tuple:
+        message = self._message(team, channel, self.message_count)
+        message["body"] = body.get("body", message["body"])
+        return 201, message, {}
+
+    def _add_member(self, path: str, query: dict, body: Any, team: str) -> tuple:
+        return 201, {"id": f"member-{team}", "roles": body.get("roles", [])}, {}
+
+    def _add_members(self, path: str, query: dict, body: Any, team: str) -> tuple:
+        results = [
+            {"userId": value["user@odata.bind"].split("'")[1], "error": None}
+            for value in body.get("values", [])
+        ]
+        return 200, {"value": results}, {}
+
+    def _create_team(self, path: str, query: dict, body: Any) -> tuple:
+        return 202, None, {"Location": f"/teams('{_guid(_TEAMS, len(self.teams))}')"}
+
+    def _users(self, path: str, query: dict, body: Any) -> tuple:
+        wanted = set(re.findall(r"mail eq '([^']*)'", query.get("$filter", "")))
+        users = [user for user in self.users if not wanted or user["mail"] in wanted]
+        return 200, {"value": self._select(users, query)}, {}
+
+    def _presence(self, path: str, query: dict, body: Any, user: str) -> tuple:
+        return 200, {"id": user, "availability": "Available", "activity": "Available"}, {}
+
+    def _presences(self, path: str, query: dict, body: Any) -> tuple:
+        known = {user["id"] for user in self.users}
+        presences = [
+            {"id": user_id, "availability": "Busy", "activity": "InACall"}
+            for user_id in body.get("ids", [])
+            if user_id in known
+        ]
+        return 200, {"value": presences}, {}
+
+    async def _serve_batch(self, body: dict) -> dict:
+        async def serve(request: dict) -> dict:
+            status, payload, headers = await self.dispatch(
+                request["method"], "/v1.0" + request["url"], request.get("body")
+            )
+            response = {"id": request["id"], "status": status, "headers": headers}
+            if payload is not None:
+                response["body"] = payload
+            return response
+
+        # Graph runs sub-requests of a batch concurrently
+        return {"responses": await asyncio.gather(*(serve(r) for r in body["requests"]))}
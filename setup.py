@@ -1,7 +1,7 @@
 """
 Setup script for mcp-m365-teams
 """
-from setuptools import setup, find_packages
+from setuptools import find_packages, setup
 
 setup(
     name="mcp-m365-teams",
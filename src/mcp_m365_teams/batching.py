@@ -0,0 +1,220 @@
+"""
+Coalescing of concurrent Graph requests into JSON $batch calls
+"""
+import asyncio
+import random
+from collections.abc import Awaitable, Callable, Generator
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+# Graph accepts at most 20 sub-requests per $batch call
+MAX_BATCH_SIZE = 20
+
+Send = Callable[[dict], Awaitable[dict]]
+
+
+class GraphBatchError(Exception):
+    """A sub-request of a $batch call returned a non-success status"""
+
+    def __init__(self, status: int, body: Any = None):
+        self.status = status
+        self.body = body
+        message = None
+        if isinstance(body, dict):
+            message = (body.get("error") or {}).get("message")
+        super().__init__(f"Graph request failed with status {status}: {message or body}")
+
+
+@dataclass(eq=False)
+class BatchItem:
+    """One queued sub-request; await ``future`` for its response body"""
+
+    method: str
+    url: str
+    future: asyncio.Future
+    body: Any = None
+    headers: dict = field(default_factory=dict)
+    depends_on: Optional["BatchItem"] = None
+    attempts: int = 0
+
+    def __await__(self) -> Generator[Any, None, Any]:
+        return self.future.__await__()
+
+
+def _retry_after(headers: dict | None, attempt: int) -> float:
+    for name, value in (headers or {}).items():
+        if name.lower() == "retry-after":
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                break
+    return min(30.0, 2.0**attempt) * (0.5 + random.random() / 2)
+
+
+class BatchCoalescer:
+    """Gather requests issued within ``window`` seconds into $batch calls.
+
+    ``send`` posts a ``{"requests": [...]}`` payload to ``/$batch`` and returns
+    the decoded ``{"responses": [...]}`` document. Sub-requests answered with
+    429 or 503 are re-queued after their ``Retry-After`` delay, up to
+    ``max_retries`` times.
+    """
+
+    def __init__(
+        self,
+        send: Send,
+        window: float = 0.01,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_retries: int = 3,
+    ):
+        self._send = send
+        self.window = window
+        self.max_batch_size = min(max_batch_size, MAX_BATCH_SIZE)
+        self.max_retries = max_retries
+        self._pending: list[BatchItem] = []
+        self._timer: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        self.batches_sent = 0
+        self.requests_sent = 0
+        self.retries = 0
+
+    def enqueue(
+        self,
+        method: str,
+        url: str,
+        body: Any = None,
+        headers: dict | None = None,
+        depends_on: BatchItem | None = None,
+    ) -> BatchItem:
+        """Queue a request; ``depends_on`` makes it run only after that item succeeds"""
+        item = BatchItem(
+            method=method.upper(),
+            url=url,
+            future=asyncio.get_running_loop().create_future(),
+            body=body,
+            headers=dict(headers or {}),
+            depends_on=depends_on,
+        )
+        if body is not None and not any(k.lower() == "content-type" for k in item.headers):
+            item.headers["Content-Type"] = "application/json"
+        self._queue(item)
+        return item
+
+    async def request(self, method: str, url: str, body: Any = None, **kwargs: Any) -> Any:
+        """Queue a request and wait for its response body"""
+        return await self.enqueue(method, url, body, **kwargs)
+
+    async def flush(self) -> None:
+        """Send everything queued so far and wait for the responses"""
+        while self._pending or self._in_flight:
+            self._dispatch()
+            if self._in_flight:
+                await asyncio.gather(*self._in_flight, return_exceptions=True)
+            elif self._pending:
+                # Only items waiting on retries or unfinished dependencies remain
+                await asyncio.sleep(self.window)
+
+    def _queue(self, item: BatchItem) -> None:
+        self._pending.append(item)
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._dispatch_later())
+
+    async def _dispatch_later(self) -> None:
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Move ready items into as many batches as needed"""
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                break
+            task = asyncio.ensure_future(self._send_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    def _take_batch(self) -> list[BatchItem]:
+        batch: list[BatchItem] = []
+        remaining: list[BatchItem] = []
+        for item in self._pending:
+            if item.future.done():
+                continue
+            dependency = item.depends_on
+            if dependency is not None and dependency.future.done():
+                if dependency.future.cancelled() or dependency.future.exception():
+                    item.future.set_exception(GraphBatchError(424, "Failed dependency"))
+                    continue
+                item.depends_on = dependency = None
+            ready = dependency is None or dependency in batch
+            if ready and len(batch) < self.max_batch_size:
+                batch.append(item)
+            else:
+                remaining.append(item)
+        self._pending = remaining
+        return batch
+
+    async def _send_batch(self, batch: list[BatchItem]) -> None:
+        ids = {item: str(i) for i, item in enumerate(batch, 1)}
+        requests = []
+        for item in batch:
+            request: dict[str, Any] = {"id": ids[item], "method": item.method, "url": item.url}
+            if item.headers:
+                request["headers"] = item.headers
+            if item.body is not None:
+                request["body"] = item.body
+            if item.depends_on is not None:
+                request["dependsOn"] = [ids[item.depends_on]]
+            requests.append(request)
+
+        self.batches_sent += 1
+        self.requests_sent += len(batch)
+        try:
+            document = await self._send({"requests": requests})
+        except Exception as e:  # noqa: BLE001 - handed to every waiting caller
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            self._after_batch()
+            return
+
+        responses = {r.get("id"): r for r in (document or {}).get("responses", [])}
+        retried: set[BatchItem] = set()
+        for item in batch:
+            response = responses.get(ids[item])
+            status = int(response.get("status", 0)) if response else 0
+            if response and status in (429, 503) and item.attempts < self.max_retries:
+                retried.add(item)
+                self._retry_later(item, _retry_after(response.get("headers"), item.attempts))
+            elif status == 424 and item.depends_on in retried:
+                # Graph skipped this item because its dependency was throttled
+                retried.add(item)
+                self._pending.append(item)
+            elif item.future.done():
+                continue
+            elif response is None:
+                item.future.set_exception(GraphBatchError(0, "Missing response in $batch reply"))
+            elif 200 <= status < 300:
+                item.future.set_result(response.get("body"))
+            else:
+                item.future.set_exception(GraphBatchError(status, response.get("body")))
+        self._after_batch()
+
+    def _retry_later(self, item: BatchItem, delay: float) -> None:
+        item.attempts += 1
+        self.retries += 1
+
+        async def requeue() -> None:
+            await asyncio.sleep(delay)
+            self._queue(item)
+
+        task = asyncio.ensure_future(requeue())
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    def _after_batch(self) -> None:
+        # Items held back for an in-flight dependency can go out now
+        if self._pending and self._timer is None:
+            self._timer = asyncio.ensure_future(self._dispatch_later())
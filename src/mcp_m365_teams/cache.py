@@ -0,0 +1,74 @@
+"""
+Size-bounded LRU cache with per-entry expiry
+"""
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+# Returned by TTLCache.get for absent or expired keys, so None can be cached
+MISSING: Any = object()
+
+
+class TTLCache:
+    """LRU cache whose entries expire ``ttl`` seconds after they are stored"""
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or MISSING"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= self._clock():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Store a value, evicting the least recently used entries beyond ``max_size``"""
+        self._entries[key] = (value, self._clock() + (self.ttl if ttl is None else ttl))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, match: Callable[[Hashable], bool] | None = None) -> int:
+        """Drop every entry, or those whose key satisfies ``match``; returns how many"""
+        if match is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+            return dropped
+        keys = [key for key in self._entries if match(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def stats(self) -> dict:
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
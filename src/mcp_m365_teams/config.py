@@ -0,0 +1,204 @@
+"""
+Runtime settings for the MCP M365 Teams server
+"""
+import os
+from dataclasses import dataclass
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+@dataclass
+class Settings:
+    """Tunable server settings, read from M365_* environment variables"""
+
+    # MCP transport: "stdio" for one client per process, "http" for streamable HTTP sessions
+    transport: str = "stdio"
+    # HTTP mode: listen address, session bound and idle lifetime in seconds (0 disables
+    # either), tool calls one session may run at once (0 is unlimited), and how long
+    # in-flight requests get to finish on shutdown
+    listen_host: str = "127.0.0.1"
+    listen_port: int = 8000
+    max_sessions: int = 100
+    session_idle_timeout: float = 1800.0
+    session_max_concurrency: int = 8
+    shutdown_timeout: float = 10.0
+    # Maximum number of Graph requests search_messages keeps in flight
+    search_concurrency: int = 8
+    # Per-search deadline in seconds; matches found so far are returned as partial
+    search_timeout: float | None = 30.0
+    # Maximum channels broadcast_channel_message posts to at once
+    broadcast_concurrency: int = 5
+    # Serialize tool results without indentation
+    response_compact: bool = True
+    # Use orjson for serialization when it is installed
+    fast_json: bool = True
+    # Per-response budgets; larger results are split behind a continuation handle. 0 disables
+    response_max_bytes: int = 100_000
+    response_max_tokens: int = 0
+    # Message bodies longer than this are cut to an excerpt in tool output; 0 disables
+    message_excerpt_chars: int = 2000
+    # Port for the Prometheus /metrics endpoint; 0 disables it
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+    # Wrap tool calls and Graph requests in OpenTelemetry spans (needs opentelemetry-api)
+    otel_tracing: bool = False
+    # Port for the Graph change-notification receiver; 0 disables it
+    notification_port: int = 0
+    notification_host: str = "127.0.0.1"
+    # Public HTTPS URL relayed to the receiver; set it to subscribe to every team's channel
+    # and message changes
+    notification_url: str | None = None
+    # Secret echoed in each notification's clientState; random per process when unset
+    notification_client_state: str | None = None
+    # Requested subscription lifetime in minutes (channel messages allow at most 60)
+    subscription_minutes: int = 55
+    # SQLite file for the local message index; None disables the index
+    index_path: str | None = None
+    # Seconds between background index refreshes; 0 disables them
+    index_refresh_interval: float = 300.0
+    # Messages requested per page when syncing a channel
+    index_page_size: int = 50
+    # SQLite file for persisted delta links and the change log; None keeps them in memory
+    sync_path: str | None = None
+    # Changes retained per channel for get_channel_changes
+    sync_max_changes: int = 10000
+    # Gzip JSON snapshot of teams, channels and users for name lookups; None keeps it in memory
+    directory_path: str | None = None
+    # Seconds between background directory refreshes; 0 disables them
+    directory_refresh_interval: float = 3600.0
+    # Users read into the directory, which needs User.Read.All; 0 leaves users out
+    directory_max_users: int = 0
+    # SQLite file of the send_channel_message outbox; None sends messages synchronously
+    outbox_path: str | None = None
+    # Outbox delivery: channels sent to at once, minimum seconds between posts to one
+    # channel, attempts before a message fails, undelivered messages accepted, and how
+    # long delivered messages (and so their idempotency keys) are kept, in seconds
+    outbox_concurrency: int = 4
+    outbox_channel_interval: float = 1.0
+    outbox_max_attempts: int = 8
+    outbox_max_depth: int = 10000
+    outbox_retention: float = 7 * 24 * 3600.0
+    # Team and channel list cache: entry bound and lifetime in seconds
+    directory_cache_size: int = 1000
+    directory_cache_ttl: float = 300.0
+    # Email -> user-id cache: entry bound and lifetimes of found / not-found results
+    user_cache_size: int = 5000
+    user_cache_ttl: float = 3600.0
+    user_cache_negative_ttl: float = 300.0
+    # Presence cache: entry bound and lifetime in seconds, short enough for dashboards
+    presence_cache_size: int = 10000
+    presence_cache_ttl: float = 30.0
+    # Let identical Graph reads in flight at the same time share one request
+    single_flight: bool = True
+    # Coalesce concurrent Graph reads into JSON $batch calls, waiting up to batch_window seconds
+    graph_batching: bool = False
+    batch_window: float = 0.01
+    # Per-resource Graph request rate (req/s) and burst, the ceiling of the adaptive
+    # concurrency limit, and how often a throttled request is retried
+    graph_rate: float = 20.0
+    graph_burst: float = 40.0
+    graph_max_concurrency: int = 16
+    graph_max_retries: int = 5
+    # Graph HTTP transport: pool bounds, idle keep-alive lifetime in seconds, HTTP/2
+    # multiplexing (needs the h2 package), timeouts in seconds and gzip responses
+    http_max_connections: int = 100
+    http_max_keepalive: int = 100
+    http_keepalive_expiry: float = 60.0
+    http2: bool = True
+    http_connect_timeout: float = 10.0
+    http_read_timeout: float = 100.0
+    http_compression: bool = True
+    # JSON file of named tenants ({name: {tenant_id, client_id, client_secret}}) served
+    # alongside the default one from M365_TENANT_ID; None serves only the default tenant
+    tenants_path: str | None = None
+    # Named tenants whose clients, caches and stores are kept live at once
+    tenant_pool_size: int = 8
+    # Create the Graph client and fetch a token at startup instead of on the first tool call
+    eager_init: bool = True
+    # Refresh the access token this many seconds before it expires; 0 disables refreshing
+    token_refresh_margin: float = 240.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from the environment, falling back to defaults"""
+        search_timeout = _env_float("M365_SEARCH_TIMEOUT", 30.0)
+        transport = os.getenv("M365_TRANSPORT", "stdio").strip().lower()
+        if transport not in ("stdio", "http"):
+            raise ValueError(f"M365_TRANSPORT must be 'stdio' or 'http', not {transport!r}")
+        return cls(
+            transport=transport,
+            listen_host=os.getenv("M365_LISTEN_HOST", "127.0.0.1"),
+            listen_port=_env_int("M365_LISTEN_PORT", 8000),
+            max_sessions=max(0, _env_int("M365_MAX_SESSIONS", 100)),
+            session_idle_timeout=max(0.0, _env_float("M365_SESSION_IDLE_TIMEOUT", 1800.0)),
+            session_max_concurrency=max(0, _env_int("M365_SESSION_MAX_CONCURRENCY", 8)),
+            shutdown_timeout=max(0.0, _env_float("M365_SHUTDOWN_TIMEOUT", 10.0)),
+            search_concurrency=max(1, _env_int("M365_SEARCH_CONCURRENCY", 8)),
+            search_timeout=search_timeout if search_timeout > 0 else None,
+            broadcast_concurrency=max(1, _env_int("M365_BROADCAST_CONCURRENCY", 5)),
+            response_compact=_env_bool("M365_RESPONSE_COMPACT", True),
+            fast_json=_env_bool("M365_FAST_JSON", True),
+            response_max_bytes=max(0, _env_int("M365_RESPONSE_MAX_BYTES", 100_000)),
+            response_max_tokens=max(0, _env_int("M365_RESPONSE_MAX_TOKENS", 0)),
+            message_excerpt_chars=max(0, _env_int("M365_MESSAGE_EXCERPT_CHARS", 2000)),
+            metrics_port=max(0, _env_int("M365_METRICS_PORT", 0)),
+            metrics_host=os.getenv("M365_METRICS_HOST", "127.0.0.1"),
+            otel_tracing=_env_bool("M365_OTEL_TRACING", False),
+            notification_port=max(0, _env_int("M365_NOTIFICATION_PORT", 0)),
+            notification_host=os.getenv("M365_NOTIFICATION_HOST", "127.0.0.1"),
+            notification_url=os.getenv("M365_NOTIFICATION_URL") or None,
+            notification_client_state=os.getenv("M365_NOTIFICATION_CLIENT_STATE") or None,
+            subscription_minutes=min(60, max(1, _env_int("M365_SUBSCRIPTION_MINUTES", 55))),
+            index_path=os.getenv("M365_INDEX_PATH") or None,
+            index_refresh_interval=_env_float("M365_INDEX_REFRESH_INTERVAL", 300.0),
+            index_page_size=max(1, _env_int("M365_INDEX_PAGE_SIZE", 50)),
+            sync_path=os.getenv("M365_SYNC_PATH") or None,
+            sync_max_changes=max(1, _env_int("M365_SYNC_MAX_CHANGES", 10000)),
+            outbox_path=os.getenv("M365_OUTBOX_PATH") or None,
+            outbox_concurrency=max(1, _env_int("M365_OUTBOX_CONCURRENCY", 4)),
+            outbox_channel_interval=max(0.0, _env_float("M365_OUTBOX_CHANNEL_INTERVAL", 1.0)),
+            outbox_max_attempts=max(1, _env_int("M365_OUTBOX_MAX_ATTEMPTS", 8)),
+            outbox_max_depth=max(1, _env_int("M365_OUTBOX_MAX_DEPTH", 10000)),
+            outbox_retention=_env_float("M365_OUTBOX_RETENTION", 7 * 24 * 3600.0),
+            directory_path=os.getenv("M365_DIRECTORY_PATH") or None,
+            directory_refresh_interval=_env_float("M365_DIRECTORY_REFRESH_INTERVAL", 3600.0),
+            directory_max_users=max(0, _env_int("M365_DIRECTORY_MAX_USERS", 0)),
+            directory_cache_size=max(1, _env_int("M365_DIRECTORY_CACHE_SIZE", 1000)),
+            directory_cache_ttl=_env_float("M365_DIRECTORY_CACHE_TTL", 300.0),
+            user_cache_size=max(1, _env_int("M365_USER_CACHE_SIZE", 5000)),
+            user_cache_ttl=_env_float("M365_USER_CACHE_TTL", 3600.0),
+            user_cache_negative_ttl=_env_float("M365_USER_CACHE_NEGATIVE_TTL", 300.0),
+            presence_cache_size=max(1, _env_int("M365_PRESENCE_CACHE_SIZE", 10000)),
+            presence_cache_ttl=_env_float("M365_PRESENCE_CACHE_TTL", 30.0),
+            single_flight=_env_bool("M365_SINGLE_FLIGHT", True),
+            graph_batching=_env_bool("M365_GRAPH_BATCHING", False),
+            batch_window=_env_float("M365_BATCH_WINDOW_MS", 10.0) / 1000,
+            graph_rate=_env_float("M365_GRAPH_RATE", 20.0),
+            graph_burst=_env_float("M365_GRAPH_BURST", 40.0),
+            graph_max_concurrency=max(1, _env_int("M365_GRAPH_MAX_CONCURRENCY", 16)),
+            graph_max_retries=max(0, _env_int("M365_GRAPH_MAX_RETRIES", 5)),
+            http_max_connections=max(1, _env_int("M365_HTTP_MAX_CONNECTIONS", 100)),
+            http_max_keepalive=max(0, _env_int("M365_HTTP_MAX_KEEPALIVE", 100)),
+            http_keepalive_expiry=_env_float("M365_HTTP_KEEPALIVE_EXPIRY", 60.0),
+            http2=_env_bool("M365_HTTP2", True),
+            http_connect_timeout=_env_float("M365_HTTP_CONNECT_TIMEOUT", 10.0),
+            http_read_timeout=_env_float("M365_HTTP_READ_TIMEOUT", 100.0),
+            http_compression=_env_bool("M365_HTTP_COMPRESSION", True),
+            tenants_path=os.getenv("M365_TENANTS_PATH") or None,
+            tenant_pool_size=max(1, _env_int("M365_TENANT_POOL_SIZE", 8)),
+            eager_init=_env_bool("M365_EAGER_INIT", True),
+            token_refresh_margin=_env_float("M365_TOKEN_REFRESH_MARGIN", 240.0),
+        )
@@ -0,0 +1,249 @@
+"""
+Snapshot of teams, channels and users with a local name index, kept on disk for warm starts
+"""
+import bisect
+import difflib
+import gzip
+import json
+import os
+import re
+import time
+from collections.abc import Callable, Iterable
+
+# Bumped when the snapshot layout changes; older snapshots are ignored
+SNAPSHOT_VERSION = 1
+# Similarity (0-1) a misspelled name needs to match when nothing matches by prefix
+FUZZY_CUTOFF = 0.75
+# Candidates listed when a name is ambiguous
+MAX_CANDIDATES = 5
+
+_GUID = re.compile(r"^[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}$", re.IGNORECASE)
+
+
+def normalize(name: str) -> str:
+    """Case-folded name with runs of whitespace collapsed"""
+    return " ".join(name.casefold().split())
+
+
+def looks_like_id(value: str) -> bool:
+    """Team and user IDs are GUIDs; channel IDs look like 19:...@thread.tacv2"""
+    return bool(_GUID.match(value)) or value.startswith("19:")
+
+
+class NameIndex:
+    """Exact, prefix and fuzzy lookup of records by display name.
+
+    A name matches by prefix when the query starts it or starts any of its words, so
+    "eng" finds both "Engineering" and "Platform Engineering".
+    """
+
+    def __init__(self, entries: Iterable[tuple[str | None, dict]]):
+        self._exact: dict[str, list[dict]] = {}
+        suffixes: set[tuple[str, str]] = set()
+        for name, record in entries:
+            key = normalize(name or "")
+            if not key:
+                continue
+            self._exact.setdefault(key, []).append(record)
+            words = key.split(" ")
+            suffixes.update((" ".join(words[i:]), key) for i in range(len(words)))
+        # (word-suffix of a name, the name), sorted for bisection
+        self._suffixes = sorted(suffixes)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def find(self, name: str) -> list[dict]:
+        """Records named exactly ``name``, else starting with it, else spelled like it"""
+        key = normalize(name)
+        if not key:
+            return []
+        if key in self._exact:
+            return self._exact[key]
+
+        names = []
+        position = bisect.bisect_left(self._suffixes, (key,))
+        while position < len(self._suffixes) and self._suffixes[position][0].startswith(key):
+            names.append(self._suffixes[position][1])
+            position += 1
+        if not names:
+            names = difflib.get_close_matches(key, self._exact, MAX_CANDIDATES, FUZZY_CUTOFF)
+        return [record for full in dict.fromkeys(names) for record in self._exact[full]]
+
+
+def _candidates(matches: list[dict]) -> str:
+    names = ", ".join(f"{m.get('display_name')!r} ({m['id']})" for m in matches[:MAX_CANDIDATES])
+    more = f" and {len(matches) - MAX_CANDIDATES} more" if len(matches) > MAX_CANDIDATES else ""
+    return names + more
+
+
+def unique(kind: str, value: str, matches: list[dict], exact: bool = False) -> dict | None:
+    """The one record ``value`` names; None when nothing matches, ValueError when several do.
+
+    With ``exact``, prefix and fuzzy matches do not count: only records whose display
+    name is ``value`` (ignoring case and spacing) are considered.
+    """
+    if exact:
+        key = normalize(value)
+        matches = [m for m in matches if normalize(m.get("display_name") or "") == key]
+    if len(matches) > 1:
+        raise ValueError(
+            f"{kind.capitalize()} name {value!r} is ambiguous: {_candidates(matches)}"
+        )
+    return matches[0] if matches else None
+
+
+def not_found(kind: str, value: str, matches: list[dict], hint: str = "") -> ValueError:
+    """Error for a name that picked no record, listing the near ``matches`` if any"""
+    if matches:
+        return ValueError(
+            f"No {kind} named exactly {value!r}; did you mean {_candidates(matches)}?"
+        )
+    return ValueError(f"No {kind} named {value!r}{hint}")
+
+
+class Directory:
+    """Teams, channels and users of one tenant, indexed by name.
+
+    With a ``path``, the directory is saved there as gzip-compressed JSON, replaced
+    atomically, and loaded back on the next start.
+    """
+
+    def __init__(self, path: str | None = None, clock: Callable[[], float] = time.time):
+        self.path = path
+        self._clock = clock
+        self.teams: list[dict] = []
+        self.channels: dict[str, list[dict]] = {}
+        self.users: list[dict] = []
+        # Epoch seconds of the last full refresh, None until there was one
+        self.refreshed_at: float | None = None
+        self._team_names = NameIndex(())
+        self._channel_names: dict[str, NameIndex] = {}
+        self._user_names = NameIndex(())
+        self._team_ids: dict[str, dict] = {}
+        self._channel_ids: dict[str, dict[str, dict]] = {}
+        self._user_ids: dict[str, dict] = {}
+        self._mail: dict[str, dict] = {}
+
+    def set_teams(self, teams: list[dict]) -> None:
+        self.teams = list(teams)
+        self._team_names = NameIndex((team.get("display_name"), team) for team in self.teams)
+        self._team_ids = {team["id"]: team for team in self.teams}
+
+    def set_channels(self, team_id: str, channels: list[dict]) -> None:
+        channels = [{**channel, "team_id": team_id} for channel in channels]
+        self.channels[team_id] = channels
+        self._channel_names[team_id] = NameIndex(
+            (channel.get("display_name"), channel) for channel in channels
+        )
+        self._channel_ids[team_id] = {channel["id"]: channel for channel in channels}
+
+    def set_users(self, users: list[dict]) -> None:
+        self.users = list(users)
+        self._user_names = NameIndex((user.get("display_name"), user) for user in self.users)
+        self._mail = {}
+        self._user_ids = {user["id"]: user for user in self.users}
+        for user in self.users:
+            for address in (user.get("mail"), user.get("user_principal_name")):
+                if address:
+                    self._mail[address.lower()] = user
+
+    def replace(
+        self,
+        teams: list[dict],
+        channels: dict[str, list[dict]],
+        users: list[dict] | None = None,
+        refreshed_at: float | None = None,
+    ) -> None:
+        """Swap in a complete directory; ``users`` None keeps the current users"""
+        self.set_teams(teams)
+        self.channels = {}
+        self._channel_names = {}
+        self._channel_ids = {}
+        for team_id, team_channels in channels.items():
+            self.set_channels(team_id, team_channels)
+        if users is not None:
+            self.set_users(users)
+        self.refreshed_at = self._clock() if refreshed_at is None else refreshed_at
+
+    def team_by_id(self, team_id: str) -> dict | None:
+        return self._team_ids.get(team_id)
+
+    def channel_by_id(self, channel_id: str, team_id: str | None = None) -> dict | None:
+        """The channel with this ID in one team, or in any team when ``team_id`` is None"""
+        if team_id is not None:
+            return self._channel_ids.get(team_id, {}).get(channel_id)
+        return next(
+            (ids[channel_id] for ids in self._channel_ids.values() if channel_id in ids), None
+        )
+
+    def user_by_id(self, user_id: str) -> dict | None:
+        return self._user_ids.get(user_id)
+
+    def find_team(self, name: str) -> list[dict]:
+        return self._team_names.find(name)
+
+    def find_channel(self, name: str, team_id: str | None = None) -> list[dict]:
+        """Channels called ``name`` in one team, or in any team when ``team_id`` is None"""
+        if team_id is not None:
+            index = self._channel_names.get(team_id)
+            return index.find(name) if index else []
+        return [channel for index in self._channel_names.values() for channel in index.find(name)]
+
+    def user_by_mail(self, address: str) -> dict | None:
+        """The user with this email address or user principal name"""
+        return self._mail.get(address.lower())
+
+    def find_user(self, name: str) -> list[dict]:
+        """Users with this email address or user principal name, else display name"""
+        user = self.user_by_mail(name)
+        return [user] if user else self._user_names.find(name)
+
+    def age(self) -> float | None:
+        """Seconds since the last full refresh"""
+        return None if self.refreshed_at is None else self._clock() - self.refreshed_at
+
+    def load(self) -> bool:
+        """Read the snapshot at ``path``; False when there is none or it cannot be used"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            return False
+        self.replace(
+            snapshot["teams"], snapshot["channels"], snapshot["users"], snapshot["refreshed_at"]
+        )
+        return True
+
+    def save(self) -> None:
+        """Write the snapshot to ``path``, replacing the previous one atomically"""
+        if not self.path:
+            return
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "refreshed_at": self.refreshed_at,
+            "teams": self.teams,
+            "channels": {
+                team_id: [{k: v for k, v in c.items() if k != "team_id"} for c in channels]
+                for team_id, channels in list(self.channels.items())
+            },
+            "users": self.users,
+        }
+        partial = f"{self.path}.tmp"
+        with gzip.open(partial, "wt", encoding="utf-8") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(partial, self.path)
+
+    def status(self) -> dict:
+        age = self.age()
+        return {
+            "path": self.path,
+            "teams": len(self.teams),
+            "channels": sum(len(channels) for channels in self.channels.values()),
+            "users": len(self.users),
+            "age_seconds": round(age, 1) if age is not None else None,
+        }
@@ -0,0 +1,131 @@
+"""
+Compact, size-bounded JSON encoding of tool results
+"""
+import hashlib
+import json
+from collections.abc import Hashable
+from typing import Any
+
+from .cache import MISSING, TTLCache
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, installed with the "fast" extra
+    orjson = None  # type: ignore[assignment]
+
+# Rough bytes of JSON text per model token, used to turn token budgets into byte budgets
+BYTES_PER_TOKEN = 4
+# How long, and how many, truncated remainders are kept for get_continuation
+CONTINUATION_TTL = 600.0
+CONTINUATION_CACHE_SIZE = 256
+EXCERPT_MARKER = "…"
+
+
+class ResponseEncoder:
+    """Serialize tool results, trimming long message bodies and splitting oversized results.
+
+    A result larger than ``max_bytes`` keeps the longest prefix of its largest
+    list (or mapping) that fits, and gains a ``truncated`` entry whose
+    ``continuation`` handle returns the rest via ``resume``. Remainders are kept
+    per ``scope``, and a handle only resumes in the scope that produced it.
+    """
+
+    def __init__(
+        self,
+        compact: bool = True,
+        fast: bool = True,
+        max_bytes: int | None = None,
+        excerpt_chars: int | None = None,
+    ):
+        self.compact = compact
+        self.fast = fast and orjson is not None
+        self.max_bytes = max_bytes
+        self.excerpt_chars = excerpt_chars
+        self.continuations = TTLCache(max_size=CONTINUATION_CACHE_SIZE, ttl=CONTINUATION_TTL)
+
+    def dumps(self, value: Any) -> str:
+        """Serialize without size limits"""
+        if self.fast:
+            option = orjson.OPT_NON_STR_KEYS | (0 if self.compact else orjson.OPT_INDENT_2)
+            return orjson.dumps(value, option=option, default=str).decode()
+        if self.compact:
+            return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+        return json.dumps(value, indent=2, ensure_ascii=False, default=str)
+
+    def encode(self, result: Any, scope: Hashable = None) -> str:
+        """Serialize a tool result within the byte budget"""
+        if self.excerpt_chars:
+            result = self._excerpt(result, self.excerpt_chars)
+        text = self.dumps(result)
+        if not self.max_bytes or len(text.encode()) <= self.max_bytes:
+            return text
+
+        field = self._split_field(result) if isinstance(result, dict) else None
+        if field is None:
+            return text
+        return self._split(result, field, self.max_bytes, scope)
+
+    def resume(self, handle: str, scope: Hashable = None) -> str:
+        """Serialize the next part of a truncated result ``encode`` gave ``scope``"""
+        entry = self.continuations.get((scope, handle))
+        if entry is MISSING:
+            raise ValueError("Unknown or expired continuation")
+        field, items = entry
+        return self.encode({field: items}, scope)
+
+    def _excerpt(self, value: Any, chars: int) -> Any:
+        """Copy of ``value`` with every long ``content`` string cut to ``chars``"""
+        if isinstance(value, list):
+            return [self._excerpt(item, chars) for item in value]
+        if not isinstance(value, dict):
+            return value
+        trimmed = {key: self._excerpt(item, chars) for key, item in value.items()}
+        content = trimmed.get("content")
+        if isinstance(content, str) and len(content) > chars:
+            trimmed["content"] = content[:chars] + EXCERPT_MARKER
+            trimmed["content_truncated"] = True
+        return trimmed
+
+    @staticmethod
+    def _split_field(result: dict) -> str | None:
+        """The largest list or mapping in the result; the first such field wins ties"""
+        best, size = None, 1
+        for key, value in result.items():
+            if isinstance(value, (list, dict)) and len(value) > size:
+                best, size = key, len(value)
+        return best
+
+    def _split(self, result: dict, field: str, max_bytes: int, scope: Hashable) -> str:
+        items = result[field]
+        keys = list(items) if isinstance(items, dict) else None
+        total = len(items)
+
+        def part(start: int, stop: int) -> Any:
+            if keys is None:
+                return items[start:stop]
+            return {key: items[key] for key in keys[start:stop]}
+
+        def render(count: int, handle: str) -> str:
+            truncated = {
+                "field": field,
+                "returned": count,
+                "remaining": total - count,
+                "continuation": handle,
+            }
+            return self.dumps({**result, field: part(0, count), "truncated": truncated})
+
+        # Largest prefix that fits; at least one item so every continuation makes progress.
+        # Handles have a fixed length, so a placeholder sizes the output exactly.
+        low, high = 1, total - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(render(middle, "0" * 16).encode()) <= max_bytes:
+                low = middle
+            else:
+                high = middle - 1
+
+        remainder = part(low, total)
+        # Derived from the content, so the same result always yields the same handle
+        handle = hashlib.sha256(self.dumps([field, remainder]).encode()).hexdigest()[:16]
+        self.continuations.set((scope, handle), (field, remainder))
+        return render(low, handle)
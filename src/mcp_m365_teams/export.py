@@ -0,0 +1,512 @@
+"""
+Resumable streaming export of channel history (messages and replies) to JSONL or Parquet
+
+    mcp-m365-teams-export ./archive --team Engineering --format parquet
+
+Each channel is written to numbered part files under ``<out>/<team_id>/<channel_id>/``.
+Pages are written as they arrive, so memory stays at about one page per channel being
+exported. A checkpoint is saved after every JSONL page, or whenever a Parquet part file
+is complete (Parquet files cannot be appended to), and a rerun with the same output
+directory resumes every channel from its last checkpoint.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .config import Settings
+from .fanout import FanOut
+from .pagination import MAX_MESSAGES_PAGE_SIZE, iter_pages
+
+if TYPE_CHECKING:
+    from .server import M365TeamsServer
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = "checkpoint.json"
+# Bumped when the checkpoint layout changes
+CHECKPOINT_VERSION = 1
+FORMATS = ("jsonl", "parquet")
+# Columns of every exported row, in Parquet column order
+COLUMNS = (
+    "id",
+    "reply_to_id",
+    "team_id",
+    "channel_id",
+    "created_at",
+    "last_modified_at",
+    "deleted_at",
+    "from",
+    "from_id",
+    "subject",
+    "importance",
+    "content_type",
+    "content",
+    "web_url",
+)
+# Graph returns the first replies of each message inline and links to the rest
+REPLIES_NEXT_LINK = "replies@odata.nextLink"
+# Rows per part file; a Parquet part is also the unit of progress a crash can lose
+ROWS_PER_FILE = {"jsonl": 100_000, "parquet": 10_000}
+
+
+def _iso(value: Any) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _enum(value: Any) -> str | None:
+    name: str | None = getattr(value, "value", value)
+    return name
+
+
+def message_row(msg: Any, team_id: str, channel_id: str) -> dict:
+    """Flatten an SDK chat message into one export row"""
+    user = msg.from_.user if msg.from_ else None
+    return {
+        "id": msg.id,
+        "reply_to_id": msg.reply_to_id,
+        "team_id": team_id,
+        "channel_id": channel_id,
+        "created_at": _iso(msg.created_date_time),
+        "last_modified_at": _iso(msg.last_modified_date_time),
+        "deleted_at": _iso(msg.deleted_date_time),
+        "from": user.display_name if user else None,
+        "from_id": user.id if user else None,
+        "subject": msg.subject,
+        "importance": _enum(msg.importance),
+        "content_type": _enum(msg.body.content_type) if msg.body else None,
+        "content": msg.body.content if msg.body else None,
+        "web_url": msg.web_url,
+    }
+
+
+def _safe_name(value: str) -> str:
+    """File-system safe form of a Graph ID (channel IDs contain ':' and '@')"""
+    return re.sub(r"[^A-Za-z0-9._@-]", "_", value)
+
+
+class _JsonlPart:
+    """Part file of one JSON object per line, renamed into place when complete.
+
+    An unfinished part is reopened at ``offset``, the size it had when last synced;
+    anything written after that is cut off.
+    """
+
+    suffix = ".jsonl"
+    # Pages can be synced and checkpointed one at a time
+    resumable = True
+
+    def __init__(self, path: Path, offset: int = 0):
+        self.path = path
+        self._partial = path.with_name(path.name + ".tmp")
+        # Stays open across pages until close() or abort()
+        self._file = open(self._partial, "r+b" if offset else "wb")  # noqa: SIM115
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def write(self, rows: list[dict]) -> None:
+        self._file.write(
+            "".join(
+                json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+            ).encode("utf-8")
+        )
+
+    def sync(self) -> int:
+        """Flush what was written to disk; returns the offset to resume from"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self) -> int:
+        """Finish the file; returns its size in bytes"""
+        self.sync()
+        self._file.close()
+        os.replace(self._partial, self.path)
+        return self.path.stat().st_size
+
+    def abort(self) -> None:
+        """Stop writing; the file is kept for a resume from its checkpointed offset"""
+        self._file.close()
+
+
+class _ParquetPart:
+    """Part file with one Parquet row group per page, renamed into place when complete"""
+
+    suffix = ".parquet"
+    resumable = False
+
+    def __init__(self, path: Path, offset: int = 0):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:  # optional, installed with the "export" extra
+            raise RuntimeError(
+                'Parquet export needs pyarrow: pip install "mcp-m365-teams[export]"'
+            ) from e
+
+        self.path = path
+        self._partial = path.with_name(path.name + ".tmp")
+        self._pa = pa
+        self._schema = pa.schema([(column, pa.string()) for column in COLUMNS])
+        self._writer = pq.ParquetWriter(self._partial, self._schema, compression="zstd")
+
+    def write(self, rows: list[dict]) -> None:
+        self._writer.write_table(self._pa.Table.from_pylist(rows, schema=self._schema))
+
+    def close(self) -> int:
+        self._writer.close()
+        os.replace(self._partial, self.path)
+        return self.path.stat().st_size
+
+    def abort(self) -> None:
+        self._writer.close()
+        self._partial.unlink(missing_ok=True)
+
+
+class Checkpoint:
+    """Per-channel export progress, rewritten atomically at every checkpoint.
+
+    A channel's entry records how many part files are complete, the messages exported,
+    the nextLink to continue from and whether the channel is done; for a JSONL part
+    still being written, also its synced size (``offset``) and rows (``part_rows``).
+    """
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.channels: dict[str, dict] = {}
+        if path.exists():
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            if saved.get("version") != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version in {path}")
+            if saved["format"] != fmt:
+                raise ValueError(
+                    f"{path.parent} holds a {saved['format']} export; resume it with that format"
+                )
+            self.channels = saved["channels"]
+        self.format = fmt
+        self._lock = asyncio.Lock()
+
+    def channel(self, team_id: str, channel_id: str) -> dict:
+        state = self.channels.setdefault(
+            f"{team_id}/{channel_id}",
+            {"parts": 0, "messages": 0, "next_link": None, "done": False},
+        )
+        state.setdefault("offset", 0)
+        state.setdefault("part_rows", 0)
+        return state
+
+    async def save(self) -> None:
+        async with self._lock:
+            text = json.dumps(
+                {"version": CHECKPOINT_VERSION, "format": self.format, "channels": self.channels},
+                separators=(",", ":"),
+            )
+            await asyncio.to_thread(self._write, text)
+
+    def _write(self, text: str) -> None:
+        partial = self.path.with_name(self.path.name + ".tmp")
+        partial.write_text(text, encoding="utf-8")
+        os.replace(partial, self.path)
+
+
+@dataclass
+class ExportStats:
+    """Throughput counters of one export run"""
+
+    started: float = field(default_factory=time.monotonic)
+    channels: int = 0
+    channels_done: int = 0
+    channels_skipped: int = 0
+    messages: int = 0
+    bytes: int = 0
+
+    def report(self) -> dict:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            "channels": self.channels,
+            "channels_done": self.channels_done,
+            "channels_skipped": self.channels_skipped,
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "elapsed_seconds": round(elapsed, 2),
+            "messages_per_second": round(self.messages / elapsed, 1),
+            "mib_per_second": round(self.bytes / elapsed / 2**20, 3),
+        }
+
+
+class ChannelExporter:
+    """Stream the history of many channels to part files, several channels at a time"""
+
+    def __init__(
+        self,
+        server: "M365TeamsServer",
+        out_dir: str,
+        fmt: str = "jsonl",
+        concurrency: int = 4,
+        rows_per_file: int | None = None,
+        progress_interval: float = 10.0,
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.server = server
+        self.out = Path(out_dir)
+        self.part_type = _ParquetPart if fmt == "parquet" else _JsonlPart
+        self.concurrency = concurrency
+        self.rows_per_file = rows_per_file or ROWS_PER_FILE[fmt]
+        self.progress_interval = progress_interval
+        self.out.mkdir(parents=True, exist_ok=True)
+        self.checkpoint = Checkpoint(self.out / CHECKPOINT_FILE, fmt)
+        self.stats = ExportStats()
+
+    async def run(
+        self, teams: list[str] | None = None, channels: list[str] | None = None
+    ) -> dict:
+        """Export every channel of ``teams`` (IDs or names; default all), optionally only
+        the ``channels`` with these IDs or names
+        """
+        targets = await self._targets(teams, channels)
+        self.stats.channels = len(targets)
+        fan_out = FanOut(concurrency=self.concurrency)
+        for team_id, channel_id in targets:
+            fan_out.submit(self._export_channel, team_id, channel_id)
+
+        progress = asyncio.create_task(self._log_progress())
+        try:
+            outcome = await fan_out.run()
+        finally:
+            progress.cancel()
+
+        report = self.stats.report()
+        if outcome.errors:
+            report["errors"] = outcome.errors
+        return report
+
+    async def _targets(
+        self, teams: list[str] | None, channels: list[str] | None
+    ) -> list[tuple[str, str]]:
+        if teams:
+            team_ids = [await self.server._resolve_team(team) for team in teams]
+        else:
+            team_ids = [team["id"] for team in (await self.server._list_teams())["teams"]]
+        wanted = {channel.casefold() for channel in channels or ()}
+
+        targets = []
+        for team_id in team_ids:
+            for channel in (await self.server._get_team_channels(team_id))["channels"]:
+                names = {channel["id"].casefold(), (channel["display_name"] or "").casefold()}
+                if not wanted or names & wanted:
+                    targets.append((team_id, channel["id"]))
+        return targets
+
+    async def _export_channel(self, team_id: str, channel_id: str) -> None:
+        """Export one channel from its checkpoint, completing a part every rows_per_file rows"""
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.chat_message_collection_response import (
+            ChatMessageCollectionResponse,
+        )
+        from msgraph.generated.teams.item.channels.item.messages.messages_request_builder import (
+            MessagesRequestBuilder,
+        )
+
+        state = self.checkpoint.channel(team_id, channel_id)
+        if state["done"]:
+            self.stats.channels_skipped += 1
+            return
+        folder = self.out / _safe_name(team_id) / _safe_name(channel_id)
+        await asyncio.to_thread(self._discard_incomplete, folder, state)
+        builder = (
+            self.server.client.teams.by_team_id(team_id).channels.by_channel_id(channel_id).messages
+        )
+
+        async def fetch(page_url: str | None) -> Any:
+            if page_url:
+                return await self.server._graph_get(
+                    builder.with_url(page_url), ChatMessageCollectionResponse
+                )
+            query = MessagesRequestBuilder.MessagesRequestBuilderGetQueryParameters(
+                top=MAX_MESSAGES_PAGE_SIZE, expand=["replies"]
+            )
+            return await self.server._graph_get(
+                builder,
+                ChatMessageCollectionResponse,
+                RequestConfiguration(query_parameters=query),
+            )
+
+        def open_part() -> Any:
+            path = folder / f"part-{state['parts']:05d}{self.part_type.suffix}"
+            return self.part_type(path, state["offset"])
+
+        # A JSONL part interrupted after its last checkpoint is continued, not rewritten
+        part: Any = await asyncio.to_thread(open_part) if state["offset"] else None
+        resumed_bytes = state["offset"]
+        rows_in_part = state["part_rows"]
+        # Rows written since the last checkpoint
+        unsaved = 0
+        pages = iter_pages(fetch, state["next_link"])
+        try:
+            async for items, _, next_link in pages:
+                rows = []
+                for msg in items:
+                    rows.append(message_row(msg, team_id, channel_id))
+                    async for reply in self._replies(builder, msg):
+                        rows.append(message_row(reply, team_id, channel_id))
+                if rows:
+                    if part is None:
+                        part = await asyncio.to_thread(open_part)
+                    await asyncio.to_thread(part.write, rows)
+                    rows_in_part += len(rows)
+                    unsaved += len(rows)
+                    self.stats.messages += len(rows)
+
+                complete = next_link is None or rows_in_part >= self.rows_per_file
+                if not complete and not self.part_type.resumable:
+                    continue
+                offset = 0
+                if part is not None and complete:
+                    self.stats.bytes += await asyncio.to_thread(part.close) - resumed_bytes
+                    resumed_bytes = 0
+                    part = None
+                    state["parts"] += 1
+                    rows_in_part = 0
+                elif part is not None:
+                    offset = await asyncio.to_thread(part.sync)
+                state["messages"] += unsaved
+                state["next_link"] = next_link
+                state["done"] = next_link is None
+                state["offset"] = offset
+                state["part_rows"] = rows_in_part
+                unsaved = 0
+                await self.checkpoint.save()
+        except Exception as e:
+            raise RuntimeError(f"Channel {channel_id} of team {team_id}: {e}") from e
+        finally:
+            await pages.aclose()
+            if part is not None:
+                await asyncio.to_thread(part.abort)
+        self.stats.channels_done += 1
+
+    async def _replies(self, builder: Any, msg: Any) -> AsyncIterator[Any]:
+        """A message's replies: those expanded inline, then any further pages of them"""
+        from msgraph.generated.models.chat_message_collection_response import (
+            ChatMessageCollectionResponse,
+        )
+
+        for reply in msg.replies or ():
+            yield reply
+        url = (msg.additional_data or {}).get(REPLIES_NEXT_LINK)
+        if not url:
+            return
+        replies = builder.by_chat_message_id(msg.id).replies
+
+        async def fetch(page_url: str | None) -> Any:
+            return await self.server._graph_get(
+                replies.with_url(page_url), ChatMessageCollectionResponse
+            )
+
+        pages = iter_pages(fetch, url)
+        try:
+            async for items, _, _ in pages:
+                for reply in items:
+                    yield reply
+        finally:
+            await pages.aclose()
+
+    def _discard_incomplete(self, folder: Path, state: dict) -> None:
+        """Delete part files written after the last checkpoint, so a resume rewrites them;
+        the unfinished part the checkpoint continues from is kept
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        current = f"part-{state['parts']:05d}{self.part_type.suffix}.tmp"
+        for path in folder.iterdir():
+            if state["offset"] and path.name == current:
+                continue
+            number = re.match(r"part-(\d+)\.", path.name)
+            if path.name.endswith(".tmp") or (number and int(number.group(1)) >= state["parts"]):
+                path.unlink()
+
+    async def _log_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            report = self.stats.report()
+            logger.info(
+                "Exported %d messages from %d/%d channels (%.1f messages/s, %.3f MiB/s)",
+                report["messages"],
+                report["channels_done"] + report["channels_skipped"],
+                report["channels"],
+                report["messages_per_second"],
+                report["mib_per_second"],
+            )
+
+
+async def export(
+    out_dir: str,
+    teams: list[str] | None = None,
+    channels: list[str] | None = None,
+    fmt: str = "jsonl",
+    concurrency: int = 4,
+    rows_per_file: int | None = None,
+    settings: Settings | None = None,
+) -> dict:
+    """Export channel history with the credentials and limits from the environment"""
+    from .server import M365TeamsServer
+
+    server = M365TeamsServer(settings or Settings.from_env())
+    await server._ensure_client()
+    exporter = ChannelExporter(
+        server, out_dir, fmt, concurrency=concurrency, rows_per_file=rows_per_file
+    )
+    try:
+        return await exporter.run(teams, channels)
+    finally:
+        await server.http_client.aclose()
+        server.tenants.default.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Command-line entry point (mcp-m365-teams-export)"""
+    parser = argparse.ArgumentParser(
+        prog="mcp-m365-teams-export",
+        description="Export Teams channel messages and replies; rerun to resume",
+    )
+    parser.add_argument("out", help="Output directory; holds the checkpoint for resuming")
+    parser.add_argument(
+        "--team", action="append", help="Team ID or name to export (repeatable; default: all)"
+    )
+    parser.add_argument(
+        "--channel", action="append", help="Only export channels with this ID or name (repeatable)"
+    )
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="Channels exported at once")
+    parser.add_argument(
+        "--rows-per-file",
+        type=int,
+        help="Rows per part file (default: 100000 for JSONL, 10000 for Parquet, whose "
+        "progress is checkpointed per file)",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s", stream=sys.stderr)
+    report = asyncio.run(
+        export(
+            args.out,
+            args.team,
+            args.channel,
+            args.format,
+            concurrency=max(1, args.concurrency),
+            rows_per_file=max(1, args.rows_per_file) if args.rows_per_file else None,
+        )
+    )
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("errors") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Bounded, cancellable async fan-out used by cross-team operations
+"""
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class FanOutResult:
+    """Outcome of a fan-out run"""
+
+    items: list = field(default_factory=list)
+    errors: list[str] = field(default_factory=list)
+    timed_out: bool = False
+
+    @property
+    def partial(self) -> bool:
+        """True when the run stopped before every job finished successfully"""
+        return self.timed_out or bool(self.errors)
+
+
+class FanOut:
+    """Run jobs concurrently under a concurrency limit, a result limit and a deadline.
+
+    Jobs are async callables that may ``submit`` further jobs (e.g. one job per
+    team that submits one job per channel) and ``emit`` results. The run ends
+    when all jobs are done, ``limit`` results have been emitted, or the deadline
+    passes; outstanding jobs are cancelled in the latter two cases.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        limit: int | None = None,
+        timeout: float | None = None,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.limit = limit
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+        self._finished = asyncio.Event()
+        self._items: list = []
+        self._errors: list[str] = []
+
+    @property
+    def satisfied(self) -> bool:
+        """True once ``limit`` results have been emitted"""
+        return self.limit is not None and len(self._items) >= self.limit
+
+    def submit(self, job: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """Schedule a job; ignored once the run is finishing"""
+        if self._finished.is_set():
+            return
+        task = asyncio.ensure_future(self._run_job(job, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._on_job_done)
+
+    def emit(self, item: Any) -> bool:
+        """Record a result; returns False once the limit has been reached"""
+        if self.satisfied:
+            return False
+        self._items.append(item)
+        if self.satisfied:
+            self._finished.set()
+        return True
+
+    async def run(self) -> FanOutResult:
+        """Wait for the submitted jobs and return what they emitted"""
+        timed_out = False
+        if not self._tasks:
+            self._finished.set()
+        try:
+            await asyncio.wait_for(self._finished.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+        finally:
+            self._finished.set()
+            pending = list(self._tasks)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return FanOutResult(
+            items=list(self._items),
+            errors=list(self._errors),
+            timed_out=timed_out and not self.satisfied,
+        )
+
+    async def _run_job(self, job: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        async with self._semaphore:
+            if self._finished.is_set():
+                return
+            await job(*args)
+
+    def _on_job_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._errors.append(str(task.exception()))
+        if not self._tasks:
+            self._finished.set()
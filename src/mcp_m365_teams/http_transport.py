@@ -0,0 +1,96 @@
+"""
+Streamable HTTP transport: one long-lived process serving many concurrent MCP sessions
+"""
+import contextlib
+import logging
+import math
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING, Any
+
+from mcp.server import Server
+
+from .config import Settings
+
+# starlette, uvicorn and the session manager are only needed in HTTP mode
+if TYPE_CHECKING:
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from starlette.applications import Starlette
+
+logger = logging.getLogger(__name__)
+
+# Path MCP clients connect to, e.g. http://127.0.0.1:8000/mcp
+MCP_PATH = "/mcp"
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+class _SessionEndpoint:
+    """ASGI app that hands every request to the session manager"""
+
+    def __init__(self, manager: "StreamableHTTPSessionManager"):
+        self.manager = manager
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        await self.manager.handle_request(scope, receive, send)
+
+
+def session_manager(server: Server, settings: Settings) -> "StreamableHTTPSessionManager":
+    """Stateful session manager; every session runs against the same ``server``"""
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+    from mcp.server.transport_security import TransportSecuritySettings
+
+    security = None
+    if settings.listen_host in LOOPBACK_HOSTS:
+        # Bound to loopback: refuse requests a browser was tricked into sending (DNS rebinding)
+        security = TransportSecuritySettings(
+            enable_dns_rebinding_protection=True,
+            allowed_hosts=["127.0.0.1:*", "localhost:*", "[::1]:*"],
+            allowed_origins=["http://127.0.0.1:*", "http://localhost:*", "http://[::1]:*"],
+        )
+    return StreamableHTTPSessionManager(
+        server,
+        security_settings=security,
+        session_idle_timeout=settings.session_idle_timeout or None,
+        max_sessions=settings.max_sessions or None,
+    )
+
+
+def http_app(server: Server, settings: Settings) -> "Starlette":
+    """ASGI app serving MCP at ``/mcp`` and a liveness probe at ``/healthz``"""
+    from starlette.applications import Starlette
+    from starlette.responses import PlainTextResponse
+    from starlette.routing import Route
+
+    manager = session_manager(server, settings)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        async with manager.run():
+            yield
+        logger.info("All MCP sessions closed")
+
+    async def healthz(request: Any) -> PlainTextResponse:
+        return PlainTextResponse("ok\n")
+
+    return Starlette(
+        routes=[
+            Route(MCP_PATH, endpoint=_SessionEndpoint(manager)),
+            Route("/healthz", endpoint=healthz),
+        ],
+        lifespan=lifespan,
+    )
+
+
+async def serve_http(server: Server, settings: Settings) -> None:
+    """Serve until SIGINT or SIGTERM, then stop accepting connections and give in-flight
+    requests ``shutdown_timeout`` seconds to finish before sessions are closed
+    """
+    import uvicorn
+
+    config = uvicorn.Config(
+        http_app(server, settings),
+        host=settings.listen_host,
+        port=settings.listen_port,
+        timeout_graceful_shutdown=math.ceil(settings.shutdown_timeout),
+        log_level="warning",
+    )
+    await uvicorn.Server(config).serve()
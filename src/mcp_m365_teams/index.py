@@ -0,0 +1,272 @@
+"""
+Local SQLite FTS5 index of channel messages
+"""
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    team_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    author TEXT,
+    content TEXT,
+    created_at TEXT,
+    UNIQUE (team_id, channel_id, id)
+);
+CREATE INDEX IF NOT EXISTS messages_created_at ON messages (created_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content, author, content='messages', content_rowid='rowid'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_ai AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content, author)
+    VALUES (new.rowid, new.content, new.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_ad AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author)
+    VALUES ('delete', old.rowid, old.content, old.author);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_au AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content, author)
+    VALUES ('delete', old.rowid, old.content, old.author);
+    INSERT INTO messages_fts (rowid, content, author)
+    VALUES (new.rowid, new.content, new.author);
+END;
+
+CREATE TABLE IF NOT EXISTS channels (
+    team_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    team_name TEXT,
+    channel_name TEXT,
+    last_synced_at TEXT,
+    last_message_at TEXT,
+    PRIMARY KEY (team_id, channel_id)
+);
+
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _utcnow() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _match_expression(query: str) -> str:
+    """Turn free text into an FTS5 query where every term must match"""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms)
+
+
+class MessageIndex:
+    """On-disk full-text index of channel messages with per-channel sync state"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+    def completed_at(self) -> str | None:
+        """When a refresh last synced every channel of every team, None if none ever did.
+
+        Until then the index holds only some channels, and searching it would miss the rest.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = 'completed_at'"
+            ).fetchone()
+        return row[0] if row else None
+
+    def mark_complete(self) -> None:
+        """Record that every channel of every team has just been synced"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value) VALUES ('completed_at', ?)",
+                (_utcnow(),),
+            )
+
+    def upsert_messages(self, team: dict, channel: dict, messages: list[dict]) -> int:
+        """Index a channel's messages and mark it synced; returns the number of new messages"""
+        with self._lock, self._conn:
+            inserted = self._conn.executemany(
+                """
+                INSERT INTO messages (id, team_id, channel_id, author, content, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (team_id, channel_id, id) DO NOTHING
+                """,
+                [
+                    (
+                        msg["id"],
+                        team["id"],
+                        channel["id"],
+                        msg.get("from"),
+                        msg.get("content"),
+                        msg.get("created_at"),
+                    )
+                    for msg in messages
+                ],
+            )
+            added = inserted.rowcount
+            # Edited messages keep their id; refresh their text in place
+            self._conn.executemany(
+                """
+                UPDATE messages SET author = ?, content = ?
+                WHERE team_id = ? AND channel_id = ? AND id = ?
+                  AND (content IS NOT ? OR author IS NOT ?)
+                """,
+                [
+                    (
+                        msg.get("from"),
+                        msg.get("content"),
+                        team["id"],
+                        channel["id"],
+                        msg["id"],
+                        msg.get("content"),
+                        msg.get("from"),
+                    )
+                    for msg in messages
+                ],
+            )
+            newest = max((m["created_at"] for m in messages if m.get("created_at")), default=None)
+            self._conn.execute(
+                """
+                INSERT INTO channels
+                    (team_id, channel_id, team_name, channel_name, last_synced_at, last_message_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (team_id, channel_id) DO UPDATE SET
+                    team_name = COALESCE(excluded.team_name, channels.team_name),
+                    channel_name = COALESCE(excluded.channel_name, channels.channel_name),
+                    last_synced_at = excluded.last_synced_at,
+                    last_message_at = MAX(
+                        COALESCE(channels.last_message_at, ''),
+                        COALESCE(excluded.last_message_at, '')
+                    )
+                """,
+                (
+                    team["id"],
+                    channel["id"],
+                    team.get("display_name"),
+                    channel.get("display_name"),
+                    _utcnow(),
+                    newest,
+                ),
+            )
+        return added
+
+    def delete_messages(self, team_id: str, channel_id: str, message_ids: list[str]) -> int:
+        """Drop deleted messages from the index; returns how many were removed"""
+        with self._lock, self._conn:
+            deleted = self._conn.executemany(
+                "DELETE FROM messages WHERE team_id = ? AND channel_id = ? AND id = ?",
+                [(team_id, channel_id, message_id) for message_id in message_ids],
+            )
+        return deleted.rowcount
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        team_id: str | None = None,
+        channel_id: str | None = None,
+        author: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> list[dict]:
+        """Return the best-ranked messages matching every term of ``query``"""
+        match = _match_expression(query)
+        if not match:
+            return []
+
+        clauses = ["messages_fts MATCH ?"]
+        params: list = [match]
+        if team_id:
+            clauses.append("m.team_id = ?")
+            params.append(team_id)
+        if channel_id:
+            clauses.append("m.channel_id = ?")
+            params.append(channel_id)
+        if author:
+            clauses.append("m.author = ? COLLATE NOCASE")
+            params.append(author)
+        if since:
+            clauses.append("m.created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("m.created_at < ?")
+            params.append(until)
+        params.append(limit)
+
+        sql = f"""
+            SELECT m.id, m.content, m.author, m.created_at,
+                   c.team_name, c.channel_name, m.team_id, m.channel_id
+            FROM messages_fts
+            JOIN messages m ON m.rowid = messages_fts.rowid
+            LEFT JOIN channels c ON c.team_id = m.team_id AND c.channel_id = m.channel_id
+            WHERE {" AND ".join(clauses)}
+            ORDER BY bm25(messages_fts), m.created_at DESC
+            LIMIT ?
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        return [
+            {
+                "id": row["id"],
+                "content": row["content"],
+                "from": row["author"],
+                "created_at": row["created_at"],
+                "team_id": row["team_id"],
+                "channel_id": row["channel_id"],
+                "team_name": row["team_name"],
+                "channel_name": row["channel_name"],
+            }
+            for row in rows
+        ]
+
+    def status(self) -> dict:
+        """Summarize index size and freshness"""
+        with self._lock:
+            messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            channels = self._conn.execute(
+                """
+                SELECT COUNT(*) AS channels,
+                       MIN(last_synced_at) AS oldest_sync,
+                       MAX(last_synced_at) AS newest_sync,
+                       MAX(last_message_at) AS newest_message
+                FROM channels
+                """
+            ).fetchone()
+
+        completed_at = self.completed_at()
+        oldest_sync = channels["oldest_sync"]
+        staleness = None
+        if oldest_sync:
+            synced = datetime.fromisoformat(oldest_sync)
+            staleness = round((datetime.now(timezone.utc) - synced).total_seconds(), 1)
+
+        return {
+            "path": self.path,
+            "complete": completed_at is not None,
+            "completed_at": completed_at,
+            "messages": messages,
+            "channels": channels["channels"],
+            "oldest_sync": oldest_sync,
+            "newest_sync": channels["newest_sync"],
+            "newest_message": channels["newest_message"] or None,
+            "staleness_seconds": staleness,
+        }
@@ -0,0 +1,261 @@
+"""
+Latency histograms, counters and gauges for tool calls and Graph requests
+"""
+import asyncio
+import bisect
+import re
+import time
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from typing import Any
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional
+    trace = None  # type: ignore[assignment]
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Graph path segments that are followed by an item id
+_COLLECTIONS = {
+    "teams",
+    "channels",
+    "messages",
+    "replies",
+    "members",
+    "users",
+    "chats",
+    "groups",
+    "subscriptions",
+}
+_VERSION = re.compile(r"^(v1\.0|beta)$")
+
+
+def endpoint_for(path: str) -> str:
+    """Graph path with item ids templated: '/v1.0/teams/x/channels' -> '/teams/{id}/channels'"""
+    segments = [segment for segment in path.split("/") if segment]
+    if segments and _VERSION.match(segments[0]):
+        segments = segments[1:]
+    templated = []
+    for position, segment in enumerate(segments):
+        # Functions such as delta() and system segments such as $count keep their name
+        named = segment.endswith("()") or segment.startswith(("$", "microsoft.graph."))
+        if position and segments[position - 1] in _COLLECTIONS and not named:
+            templated.append("{id}")
+        else:
+            templated.append(segment)
+    return "/" + "/".join(templated)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the ``q`` quantile; None when empty.
+
+        Values beyond the last bucket report that bucket's bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self) -> dict:
+        def ms(seconds: float | None) -> float | None:
+            return round(seconds * 1000, 1) if seconds is not None else None
+
+        return {
+            "count": self.count,
+            "avg_ms": ms(self.sum / self.count) if self.count else None,
+            "p50_ms": ms(self.quantile(0.5)),
+            "p90_ms": ms(self.quantile(0.9)),
+            "p99_ms": ms(self.quantile(0.99)),
+        }
+
+
+class _Series:
+    """Latency, outcome counters and in-flight gauge for one tool or endpoint"""
+
+    def __init__(self) -> None:
+        self.latency = Histogram()
+        self.calls = 0
+        self.errors: dict[str, int] = defaultdict(int)
+        self.throttled = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+class Metrics:
+    """In-process metrics for tool calls and Graph HTTP requests.
+
+    When ``tracing`` is on and OpenTelemetry is installed, each tool call and
+    Graph request also runs inside a span.
+    """
+
+    def __init__(self, tracing: bool = False, clock: Any = time.perf_counter):
+        self._clock = clock
+        self.tools: dict[str, _Series] = defaultdict(_Series)
+        self.graph: dict[str, _Series] = defaultdict(_Series)
+        self.tracer = trace.get_tracer("mcp_m365_teams") if tracing and trace else None
+        self.started = time.time()
+
+    def span(self, name: str, **attributes: Any) -> AbstractContextManager:
+        """An OpenTelemetry span, or a no-op when tracing is off"""
+        if self.tracer is None:
+            return nullcontext()
+        return self.tracer.start_as_current_span(name, attributes=attributes)
+
+    @contextmanager
+    def tool_call(self, name: str) -> Iterator[_Series]:
+        """Time a tool call; exceptions are counted by type and re-raised"""
+        series = self.tools[name]
+        series.calls += 1
+        series.in_flight += 1
+        started = self._clock()
+        try:
+            with self.span(f"tool {name}", **{"mcp.tool": name}):
+                yield series
+        except Exception as e:
+            series.errors[type(e).__name__] += 1
+            raise
+        finally:
+            series.in_flight -= 1
+            series.latency.observe(self._clock() - started)
+
+    @contextmanager
+    def graph_request(self, method: str, path: str) -> Iterator[_Series]:
+        """Time one Graph HTTP attempt; callers record status and sizes on the series"""
+        endpoint = f"{method} {endpoint_for(path)}"
+        series = self.graph[endpoint]
+        series.calls += 1
+        series.in_flight += 1
+        started = self._clock()
+        try:
+            with self.span(f"graph {endpoint}", **{"http.method": method}):
+                yield series
+        except Exception as e:
+            series.errors[type(e).__name__] += 1
+            raise
+        finally:
+            series.in_flight -= 1
+            series.latency.observe(self._clock() - started)
+
+    def snapshot(self) -> dict:
+        """All series as plain data, for the get_metrics tool"""
+        def render(series: _Series) -> dict:
+            return {
+                "calls": series.calls,
+                "errors": dict(series.errors),
+                "throttled": series.throttled,
+                "in_flight": series.in_flight,
+                "bytes_sent": series.bytes_sent,
+                "bytes_received": series.bytes_received,
+                "latency": series.latency.snapshot(),
+            }
+
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "tools": {name: render(s) for name, s in sorted(self.tools.items())},
+            "graph": {name: render(s) for name, s in sorted(self.graph.items())},
+        }
+
+    def prometheus(self) -> str:
+        """All series in the Prometheus text exposition format"""
+        lines: list[str] = []
+        for prefix, label, group in (
+            ("m365_tool", "tool", self.tools),
+            ("m365_graph", "endpoint", self.graph),
+        ):
+            counters = {"calls_total": lambda s: s.calls}
+            if group is self.graph:
+                counters.update({
+                    "throttled_total": lambda s: s.throttled,
+                    "sent_bytes_total": lambda s: s.bytes_sent,
+                    "received_bytes_total": lambda s: s.bytes_received,
+                })
+            lines.append(f"# TYPE {prefix}_duration_seconds histogram")
+            for name, series in sorted(group.items()):
+                labels = f'{label}="{_escape(name)}"'
+                histogram = series.latency
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{prefix}_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f"{prefix}_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{prefix}_duration_seconds_count{{{labels}}} {histogram.count}")
+            for metric, value in counters.items():
+                lines.append(f"# TYPE {prefix}_{metric} counter")
+                for name, series in sorted(group.items()):
+                    lines.append(f'{prefix}_{metric}{{{label}="{_escape(name)}"}} {value(series)}')
+            lines.append(f"# TYPE {prefix}_errors_total counter")
+            for name, series in sorted(group.items()):
+                for error, count in sorted(series.errors.items()):
+                    lines.append(
+                        f'{prefix}_errors_total{{{label}="{_escape(name)}",error="{error}"}} '
+                        f"{count}"
+                    )
+            lines.append(f"# TYPE {prefix}_in_flight gauge")
+            for name, series in sorted(group.items()):
+                lines.append(f'{prefix}_in_flight{{{label}="{_escape(name)}"}} {series.in_flight}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_handler(metrics: Metrics) -> Callable[..., Awaitable[None]]:
+    """asyncio stream handler answering ``GET /metrics`` in the Prometheus text format"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if request_line[:2] == ["GET", "/metrics"]:
+                status, body = "200 OK", metrics.prometheus().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve_prometheus(metrics: Metrics, host: str, port: int) -> None:
+    """Serve ``GET /metrics`` until cancelled"""
+    server = await asyncio.start_server(prometheus_handler(metrics), host, port)
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,48 @@
+"""
+Kiota HTTP middleware; imported only once a Graph client is built
+"""
+from typing import Any
+
+from kiota_http.middleware import BaseMiddleware
+
+from .metrics import Metrics
+from .scheduler import IDEMPOTENT_METHODS, THROTTLE_STATUSES, GraphScheduler, resource_for
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    """Kiota middleware that sends each Graph HTTP request through a GraphScheduler"""
+
+    def __init__(self, scheduler: GraphScheduler):
+        super().__init__()
+        self.scheduler = scheduler
+
+    async def send(self, request: Any, transport: Any) -> Any:
+        forward = super().send
+        return await self.scheduler.execute(
+            resource_for(request.url.path),
+            lambda: forward(request, transport),
+            idempotent=request.method in IDEMPOTENT_METHODS,
+        )
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Kiota middleware recording latency, status and size of every Graph HTTP attempt"""
+
+    def __init__(self, metrics: Metrics):
+        super().__init__()
+        self.metrics = metrics
+
+    async def send(self, request: Any, transport: Any) -> Any:
+        with self.metrics.graph_request(request.method, request.url.path) as series:
+            series.bytes_sent += len(request.content or b"")
+            response = await super().send(request, transport)
+            status = response.status_code
+            if status in THROTTLE_STATUSES:
+                series.throttled += 1
+            if status >= 400:
+                series.errors[str(status)] += 1
+            length = response.headers.get("Content-Length")
+            if length is None:
+                length = len(await response.aread())
+            series.bytes_received += int(length)
+            return response
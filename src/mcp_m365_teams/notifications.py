@@ -0,0 +1,142 @@
+"""
+Local HTTP receiver for Microsoft Graph change notifications
+"""
+import asyncio
+import hmac
+import json
+import logging
+import re
+from collections.abc import Awaitable, Callable
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# Largest notification payload accepted, in bytes
+MAX_BODY_SIZE = 1_000_000
+
+# Matches both resource forms Graph uses: teams('x')/channels('y') and teams/x/channels/y
+_RESOURCE = re.compile(
+    r"^/?teams(?:\('(?P<team>[^']+)'\)|/(?P<team_path>[^/(]+))"
+    r"(?:/channels(?:\('(?P<channel>[^']+)'\)|/(?P<channel_path>[^/(]+)))?"
+    r"(?:/messages(?:\('(?P<message>[^']+)'\)|/(?P<message_path>[^/(]+)))?"
+)
+
+
+def parse_resource(resource: str) -> dict:
+    """Team, channel and message ids named by a notification's resource; missing parts are None"""
+    match = _RESOURCE.match(resource or "")
+    if not match:
+        return {"team_id": None, "channel_id": None, "message_id": None}
+    parts = match.groupdict()
+    return {
+        "team_id": parts["team"] or parts["team_path"],
+        "channel_id": parts["channel"] or parts["channel_path"],
+        "message_id": parts["message"] or parts["message_path"],
+    }
+
+
+class NotificationReceiver:
+    """Answers Graph's validation handshakes and dispatches verified notifications.
+
+    Notifications whose ``clientState`` does not match are dropped. Accepted ones are
+    acknowledged with 202 at once and handled in the background by ``on_change``, or
+    ``on_lifecycle`` for lifecycle events such as ``reauthorizationRequired``.
+    """
+
+    def __init__(
+        self,
+        client_state: str,
+        on_change: Callable[[dict], Awaitable[None]],
+        on_lifecycle: Callable[[dict], Awaitable[None]] | None = None,
+    ):
+        self.client_state = client_state
+        self._on_change = on_change
+        self._on_lifecycle = on_lifecycle
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = {"validations": 0, "received": 0, "rejected": 0, "lifecycle": 0, "failed": 0}
+
+    def accept(self, payload: Any) -> list[dict]:
+        """Notifications in a payload whose clientState verifies"""
+        accepted = []
+        for notification in (payload or {}).get("value", []):
+            state = notification.get("clientState") or ""
+            if not hmac.compare_digest(state.encode(), self.client_state.encode()):
+                self.stats["rejected"] += 1
+                continue
+            accepted.append(notification)
+        return accepted
+
+    def dispatch(self, notifications: list[dict]) -> None:
+        """Handle notifications in the background"""
+        for notification in notifications:
+            if notification.get("lifecycleEvent"):
+                self.stats["lifecycle"] += 1
+                handler = self._on_lifecycle
+            else:
+                self.stats["received"] += 1
+                handler = self._on_change
+            if handler:
+                task = asyncio.create_task(self._run(handler, notification))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, handler: Callable[[dict], Awaitable[None]], notification: dict) -> None:
+        try:
+            await handler(notification)
+        except Exception:
+            self.stats["failed"] += 1
+            logger.exception("Handling change notification failed")
+
+    async def drain(self) -> None:
+        """Wait for notifications being handled"""
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """asyncio stream handler for one notification POST"""
+        try:
+            method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY_SIZE:
+                status, body = "413 Payload Too Large", b""
+            else:
+                status, body = self.respond(method, target, await reader.readexactly(length))
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, method: str, target: str, body: bytes) -> tuple[str, bytes]:
+        """Status line and body answering one request"""
+        if method != "POST":
+            return "405 Method Not Allowed", b""
+        token = parse_qs(urlparse(target).query).get("validationToken")
+        if token:
+            # Subscription handshake: echo the token back as plain text
+            self.stats["validations"] += 1
+            return "200 OK", token[0].encode()
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return "400 Bad Request", b""
+        self.dispatch(self.accept(payload))
+        return "202 Accepted", b""
+
+    async def serve(self, host: str, port: int) -> None:
+        """Receive notifications until cancelled"""
+        server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
@@ -0,0 +1,249 @@
+"""
+Durable outbox of channel messages waiting to be delivered
+"""
+import asyncio
+import secrets
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    team_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    message TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    message_id TEXT,
+    created_at TEXT NOT NULL,
+    sent_at TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_channel ON outbox (team_id, channel_id, status, seq);
+CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, sent_at);
+"""
+
+QUEUED, SENDING, SENT, FAILED = "queued", "sending", "sent", "failed"
+# A post that may or may not have reached the channel; never sent again
+UNKNOWN = "unknown"
+
+# Columns reported for an outbox entry
+_FIELDS = (
+    "id, idempotency_key, team_id, channel_id, status, attempts, last_error, message_id, "
+    "created_at, sent_at"
+)
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class OutboxFull(ValueError):
+    """Raised when the outbox already holds ``max_depth`` undelivered messages"""
+
+
+class IdempotencyConflict(ValueError):
+    """Raised when an idempotency key is reused for a different message or channel"""
+
+
+class Outbox:
+    """SQLite queue of channel messages, delivered in order within each channel.
+
+    Every entry has a unique idempotency key: queueing the same message under a key
+    again returns the existing entry instead of a second message, and queueing a
+    different one under it is refused. Only the oldest undelivered entry
+    of a channel is ever handed out, so a channel's messages arrive in the order
+    they were queued. An entry is posted again only when the earlier attempt surely
+    did not post it; entries whose outcome is unknown, including the ones being sent
+    when the process stopped (see ``recover``), are marked ``unknown`` instead.
+    """
+
+    def __init__(self, path: str = ":memory:", max_depth: int = 10000):
+        self.path = path
+        self.max_depth = max_depth
+        # Set on the event loop whenever there may be new work for the sender
+        self.ready = asyncio.Event()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+    def enqueue(
+        self, team_id: str, channel_id: str, message: str, key: str | None = None
+    ) -> tuple[dict, bool]:
+        """Queue a message; returns its entry and False when ``key`` was queued before"""
+        key = key or secrets.token_urlsafe(16)
+        payload = (team_id, channel_id, message)
+        with self._lock, self._conn:
+            existing = self._conn.execute(
+                f"SELECT {_FIELDS}, message FROM outbox WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+            if existing:
+                entry = dict(existing)
+                if (entry["team_id"], entry["channel_id"], entry.pop("message")) != payload:
+                    raise IdempotencyConflict(
+                        f"Idempotency key {key!r} was already used for a different message "
+                        f"({entry['id']})"
+                    )
+                return entry, False
+            depth = self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (QUEUED, SENDING)
+            ).fetchone()[0]
+            if depth >= self.max_depth:
+                raise OutboxFull(
+                    f"Outbox is full ({depth} messages waiting); retry later with the same key"
+                )
+            self._conn.execute(
+                """
+                INSERT INTO outbox (id, idempotency_key, team_id, channel_id, message, status,
+                                    created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    f"ob_{secrets.token_hex(8)}",
+                    key,
+                    team_id,
+                    channel_id,
+                    message,
+                    QUEUED,
+                    _utcnow().isoformat(),
+                ),
+            )
+            entry = self._conn.execute(
+                f"SELECT {_FIELDS} FROM outbox WHERE idempotency_key = ?", (key,)
+            ).fetchone()
+        return dict(entry), True
+
+    def claim(self, now: float, limit: int, skip: set[tuple[str, str]]) -> list[dict]:
+        """Mark up to ``limit`` due channel heads as sending and return them with their
+        messages; channels in ``skip`` are passed over
+        """
+        if limit <= 0:
+            return []
+        with self._lock, self._conn:
+            heads = self._conn.execute(
+                """
+                SELECT o.seq, o.id, o.team_id, o.channel_id, o.message, o.attempts
+                FROM outbox o
+                WHERE o.status = ? AND o.next_attempt_at <= ? AND o.seq = (
+                    SELECT MIN(seq) FROM outbox
+                    WHERE team_id = o.team_id AND channel_id = o.channel_id
+                      AND status IN (?, ?)
+                )
+                ORDER BY o.seq
+                """,
+                (QUEUED, now, QUEUED, SENDING),
+            ).fetchall()
+            claimed = [
+                dict(head) for head in heads if (head["team_id"], head["channel_id"]) not in skip
+            ][:limit]
+            self._conn.executemany(
+                "UPDATE outbox SET status = ? WHERE seq = ?",
+                [(SENDING, entry["seq"]) for entry in claimed],
+            )
+        return claimed
+
+    def mark_sent(self, entry_id: str, message_id: str | None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE outbox SET status = ?, attempts = attempts + 1, message_id = ?,
+                                  last_error = NULL, sent_at = ?
+                WHERE id = ?
+                """,
+                (SENT, message_id, _utcnow().isoformat(), entry_id),
+            )
+
+    def mark_retry(self, entry_id: str, error: str, at: float) -> None:
+        """Queue an entry again after a failed attempt, not before ``at`` (epoch seconds)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ?,
+                                  next_attempt_at = ?
+                WHERE id = ?
+                """,
+                (QUEUED, error, at, entry_id),
+            )
+
+    def mark_failed(self, entry_id: str, error: str) -> None:
+        """Give up on an entry; later messages to its channel go ahead"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ? "
+                "WHERE id = ?",
+                (FAILED, error, entry_id),
+            )
+
+    def mark_unknown(self, entry_id: str, error: str) -> None:
+        """Give up on an entry that may have been posted; later messages to its channel go
+        ahead
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = ? "
+                "WHERE id = ?",
+                (UNKNOWN, error, entry_id),
+            )
+
+    def recover(self) -> int:
+        """Mark unknown the entries a stopped process was sending, which may have been
+        posted; returns how many
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "UPDATE outbox SET status = ?, last_error = ? WHERE status = ?",
+                (UNKNOWN, "Interrupted while sending", SENDING),
+            ).rowcount
+
+    def prune(self, older_than: float) -> int:
+        """Delete entries delivered more than ``older_than`` seconds ago"""
+        cutoff = (_utcnow() - timedelta(seconds=older_than)).isoformat()
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM outbox WHERE status = ? AND sent_at < ?", (SENT, cutoff)
+            ).rowcount
+
+    def get(self, entry_id: str | None = None, key: str | None = None) -> dict | None:
+        """An entry by its ID or idempotency key"""
+        column, value = ("id", entry_id) if entry_id else ("idempotency_key", key)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_FIELDS} FROM outbox WHERE {column} = ?", (value,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self) -> dict:
+        """Entries by status, channels with messages waiting and the oldest waiting one"""
+        with self._lock:
+            counts = dict(
+                self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")
+            )
+            waiting = self._conn.execute(
+                """
+                SELECT COUNT(DISTINCT team_id || '/' || channel_id), MIN(created_at)
+                FROM outbox WHERE status IN (?, ?)
+                """,
+                (QUEUED, SENDING),
+            ).fetchone()
+        return {
+            "depth": counts.get(QUEUED, 0) + counts.get(SENDING, 0),
+            "max_depth": self.max_depth,
+            **{
+                status: counts.get(status, 0)
+                for status in (QUEUED, SENDING, SENT, FAILED, UNKNOWN)
+            },
+            "channels_waiting": waiting[0],
+            "oldest_waiting_since": waiting[1],
+        }
@@ -0,0 +1,51 @@
+"""
+Lazy @odata.nextLink paging and opaque continuation cursors
+"""
+import base64
+import binascii
+import json
+from collections.abc import AsyncGenerator, Awaitable, Callable
+from typing import Any
+
+# Largest $top Graph accepts when listing channel messages
+MAX_MESSAGES_PAGE_SIZE = 50
+
+
+def encode_cursor(url: str, skip: int = 0) -> str:
+    """Encode a page URL, and how many of its items were already returned, as a cursor"""
+    payload = json.dumps({"url": url, "skip": skip}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, base_url: str) -> tuple[str, int]:
+    """Decode a cursor, refusing URLs that do not point at the Graph endpoint"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        url, skip = payload["url"], int(payload.get("skip", 0))
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if not isinstance(url, str) or not url.startswith(base_url.rstrip("/") + "/") or skip < 0:
+        raise ValueError("Invalid cursor")
+    return url, skip
+
+
+async def iter_pages(
+    fetch: Callable[[str | None], Awaitable[Any]],
+    url: str | None = None,
+) -> AsyncGenerator[tuple[list, str | None, str | None], None]:
+    """Yield ``(items, page_url, next_link)`` per page, fetching the next one only on demand.
+
+    ``fetch(None)`` loads the first page (``page_url`` is then None); ``fetch(url)``
+    loads a nextLink. Pages are SDK collection responses with ``value`` and
+    ``odata_next_link``.
+    """
+    while True:
+        page = await fetch(url)
+        items = list(page.value or []) if page else []
+        next_link = page.odata_next_link if page else None
+        yield items, url, next_link
+        if not next_link:
+            return
+        url = next_link
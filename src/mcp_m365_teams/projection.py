@@ -0,0 +1,45 @@
+"""
+Mapping of tool output fields to the Graph properties they are read from
+"""
+from typing import Any
+
+# Tool output field -> Graph property to $select for it
+TEAM_FIELDS = {
+    "id": "id",
+    "display_name": "displayName",
+    "description": "description",
+}
+
+CHANNEL_FIELDS = {
+    "id": "id",
+    "display_name": "displayName",
+    "description": "description",
+    "email": "email",
+}
+
+# Graph returns channel messages whole, ignoring $select; these are only trimmed locally
+MESSAGE_FIELDS = {
+    "id": "id",
+    "content": "body",
+    "from": "from",
+    "created_at": "createdDateTime",
+}
+
+
+def project(mapping: dict[str, str], fields: list[str] | None = None) -> tuple[list, list]:
+    """Return the output fields to keep and the Graph properties to $select for them"""
+    if not fields:
+        fields = list(mapping)
+    unknown = [field for field in fields if field not in mapping]
+    if unknown:
+        raise ValueError(
+            f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(mapping)}"
+        )
+    # Always select the id so results can be correlated and paged
+    select = list(dict.fromkeys(["id", *(mapping[field] for field in fields)]))
+    return list(fields), select
+
+
+def trim(record: dict[str, Any], fields: list[str]) -> dict[str, Any]:
+    """Keep only the requested fields of a serialized record"""
+    return {field: record[field] for field in fields}
@@ -0,0 +1,232 @@
+"""
+Throttling-aware scheduling of Graph HTTP requests
+"""
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+# Statuses Graph uses to ask callers to slow down
+THROTTLE_STATUSES = (429, 503)
+# Transient failures worth retrying for idempotent requests, but no sign of throttling
+TRANSIENT_STATUSES = (504,)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+def resource_for(path: str) -> str:
+    """Throttling bucket for a Graph URL path, e.g. '/v1.0/teams/x/channels' -> 'teams'"""
+    segments = [segment for segment in path.split("/") if segment]
+    if segments and segments[0] in ("v1.0", "beta"):
+        segments = segments[1:]
+    return segments[0] if segments else "root"
+
+
+def retry_after_seconds(headers: Any) -> float | None:
+    """Parse a numeric Retry-After header, if present"""
+    value = headers.get("Retry-After") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` tokens per second, at most ``burst`` stored"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available and take it"""
+        while True:
+            now = self._clock()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await self._sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit tuned by AIMD: +1 per window of successes, halved on throttling"""
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        cooldown: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.cooldown = cooldown
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """Wait for a free slot under the current limit"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, throttled: bool) -> None:
+        """Free a slot and adjust the limit from the request outcome"""
+        async with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                # One decrease per cooldown: a burst of 429s is one congestion signal
+                now = self._clock()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(float(self.minimum), self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class _ResourceState:
+    def __init__(self, scheduler: "GraphScheduler"):
+        self.bucket = TokenBucket(
+            scheduler.rate, scheduler.burst, scheduler._clock, scheduler._sleep
+        )
+        self.concurrency = AdaptiveConcurrency(
+            scheduler.max_concurrency,
+            scheduler.min_concurrency,
+            scheduler.max_concurrency,
+            clock=scheduler._clock,
+        )
+        self.blocked_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self.queued = 0
+        self.queue_time = 0.0
+        self.max_queue_time = 0.0
+
+
+class GraphScheduler:
+    """Gate every Graph request through per-resource rate and concurrency limits.
+
+    Throttled responses pause the whole resource for ``Retry-After`` (or an
+    exponential backoff with jitter when Graph gives none) and are retried up
+    to ``max_retries`` times before the last response is handed back. Gateway
+    timeouts of idempotent requests are retried the same number of times after
+    a backoff of their own, without pausing the resource or lowering its limit.
+    """
+
+    def __init__(
+        self,
+        rate: float = 20.0,
+        burst: float = 40.0,
+        max_concurrency: int = 16,
+        min_concurrency: int = 1,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._sleep = sleep
+        self._resources: dict[str, _ResourceState] = {}
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given retry attempt"""
+        delay = min(self.max_delay, self.base_delay * 2.0**attempt)
+        return delay * (0.5 + random.random() / 2)
+
+    async def execute(
+        self, resource: str, send: Callable[[], Awaitable[Any]], idempotent: bool = False
+    ) -> Any:
+        """Run ``send`` under the resource's limits, retrying throttled responses and,
+        when ``idempotent``, transient ones
+        """
+        state = self._resources.get(resource)
+        if state is None:
+            state = self._resources[resource] = _ResourceState(self)
+
+        attempt = 0
+        while True:
+            queued_at = self._clock()
+            state.queued += 1
+            try:
+                while (pause := state.blocked_until - self._clock()) > 0:
+                    await self._sleep(pause)
+                await state.bucket.acquire()
+                await state.concurrency.acquire()
+            finally:
+                state.queued -= 1
+            waited = self._clock() - queued_at
+            state.queue_time += waited
+            state.max_queue_time = max(state.max_queue_time, waited)
+
+            state.requests += 1
+            throttled = False
+            try:
+                response = await send()
+                throttled = response.status_code in THROTTLE_STATUSES
+            finally:
+                await state.concurrency.release(throttled)
+
+            transient = idempotent and response.status_code in TRANSIENT_STATUSES
+            if not throttled and not transient:
+                return response
+
+            delay = retry_after_seconds(response.headers)
+            if delay is None:
+                delay = self.backoff(attempt)
+            if throttled:
+                state.throttled += 1
+                state.blocked_until = max(state.blocked_until, self._clock() + delay)
+            if attempt >= self.max_retries:
+                return response
+            attempt += 1
+            state.retries += 1
+            if hasattr(response, "aclose"):
+                await response.aclose()
+            if transient:
+                await self._sleep(delay)
+
+    def stats(self) -> dict:
+        """Per-resource throttling and queueing statistics"""
+        now = self._clock()
+        return {
+            resource: {
+                "requests": state.requests,
+                "throttled": state.throttled,
+                "retries": state.retries,
+                "in_flight": state.concurrency.in_flight,
+                "queued": state.queued,
+                "concurrency_limit": round(state.concurrency.limit, 2),
+                "avg_queue_seconds": round(state.queue_time / state.requests, 4)
+                if state.requests
+                else 0.0,
+                "max_queue_seconds": round(state.max_queue_time, 4),
+                "paused_for_seconds": round(max(0.0, state.blocked_until - now), 3),
+            }
+            for resource, state in sorted(self._resources.items())
+        }
@@ -2,257 +2,577 @@
 MCP Server for Microsoft 365 Teams Integration
 """
 import asyncio
+import functools
+import importlib.util
+import inspect
+import itertools
+import json
+import logging
+import math
 import os
-from typing import Any, Optional
-import mcp.types as types
+import secrets
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Callable, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Optional
+from weakref import WeakKeyDictionary
+
+from mcp import types
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
-from msgraph import GraphServiceClient
-from msgraph.generated.users.users_request_builder import UsersRequestBuilder
-from msgraph.generated.teams.teams_request_builder import TeamsRequestBuilder
-from msgraph.generated.me.me_request_builder import MeRequestBuilder
-from azure.identity import ClientSecretCredential
-import json
+
+from .batching import BatchCoalescer
+from .cache import MISSING, TTLCache
+from .config import Settings
+from .directory import Directory, looks_like_id, not_found, unique
+from .encoding import BYTES_PER_TOKEN, ResponseEncoder
+from .fanout import FanOut
+from .http_transport import serve_http
+from .index import MessageIndex
+from .metrics import Metrics, serve_prometheus
+from .notifications import NotificationReceiver, parse_resource
+from .outbox import Outbox
+from .pagination import MAX_MESSAGES_PAGE_SIZE, decode_cursor, encode_cursor, iter_pages
+from .projection import CHANNEL_FIELDS, MESSAGE_FIELDS, TEAM_FIELDS, project, trim
+from .scheduler import GraphScheduler
+from .sync import DeltaStore, decode_change_cursor
+from .tenants import DEFAULT_TENANT, Tenant, TenantConfig, TenantPool, load_tenants, tenant_path
+from .tools import TOOLS
+from .users import UserDirectory, mail_filter
+
+# msgraph, kiota and azure-identity are slow to import; they load on first Graph use
+if TYPE_CHECKING:
+    import httpx
+    from kiota_abstractions.request_information import RequestInformation
+
+logger = logging.getLogger(__name__)
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+# members/add accepts at most 200 members per call
+MEMBERS_ADD_CHUNK_SIZE = 200
+# getPresencesByUserId accepts at most 650 IDs per call
+PRESENCE_CHUNK_SIZE = 650
+# Shortest wait between token refresh attempts, in seconds
+TOKEN_RETRY_DELAY = 30.0
+# Largest $top Graph accepts when listing users
+DIRECTORY_USERS_PAGE_SIZE = 999
+# Longest the outbox sender sleeps before looking for due retries, and seconds between
+# deletions of delivered messages past their retention
+OUTBOX_POLL_INTERVAL = 1.0
+OUTBOX_PRUNE_INTERVAL = 3600.0
+# Seconds between subscription checks; subscriptions expiring within two checks are renewed
+SUBSCRIPTION_CHECK_INTERVAL = 300.0
+
+# Modules the Graph client is built from, imported in a worker thread on first use
+GRAPH_SDK_MODULES = (
+    "azure.identity",
+    "kiota_authentication_azure.azure_identity_authentication_provider",
+    "kiota_http.middleware",
+    "msgraph",
+    "msgraph_core",
+)
+
+# Graph error codes of a deltaLink it no longer accepts; the channel needs a full resync
+SYNC_STATE_LOST = {"syncStateNotFound", "syncStateInvalid", "resyncRequired"}
+
+# Tenant of the tool call being served; unset outside tool calls, meaning the default tenant
+_current_tenant: ContextVar[Tenant | None] = ContextVar("m365_tenant", default=None)
+
+
+def _error_status(error: Exception) -> int | None:
+    """HTTP status of a failed Graph call, whether it was sent alone or in a $batch"""
+    status = getattr(error, "response_status_code", None)
+    return status if status is not None else getattr(error, "status", None)
+
+
+def _error_code(error: Exception) -> str | None:
+    """Graph error code (e.g. syncStateNotFound) of a failed call, if it has one"""
+    main = getattr(error, "error", None)
+    if main is not None:
+        return getattr(main, "code", None)
+    body = getattr(error, "body", None)
+    return (body.get("error") or {}).get("code") if isinstance(body, dict) else None
+
+
+def _import_modules(names: tuple[str, ...]) -> None:
+    for name in names:
+        importlib.import_module(name)
+
+
+def _never_posted(error: Exception) -> bool:
+    """Whether a failed POST surely changed nothing: Graph refused it with a client error,
+    or it never got a connection to Graph
+    """
+    import httpx
+
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return True
+    status = _error_status(error)
+    return status is not None and 400 <= status < 500
+
+
+@dataclass(frozen=True)
+class ToolSpec:
+    """A tool definition and the handler that serves it"""
+
+    tool: types.Tool
+    # Receives the call arguments; may return a result or an awaitable of one
+    handler: Callable[[dict], Any]
+    needs_client: bool = True
+    # The handler returns already-encoded text
+    encoded: bool = False
+    # The tool changes Graph state, so names must match a target exactly, never by guess
+    writes: bool = False
+
+
+class _TenantAttribute:
+    """Server attribute that reads and writes the current tenant's"""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = self.name or name
+
+    def __get__(self, server: Optional["M365TeamsServer"], owner: type) -> Any:
+        return self if server is None else getattr(server.tenant, self.name)
+
+    def __set__(self, server: "M365TeamsServer", value: Any) -> None:
+        setattr(server.tenant, self.name, value)
 
 
 class M365TeamsServer:
-    def __init__(self):
+    # Per-tenant state, resolved against the tenant of the tool call being served
+    client = _TenantAttribute()
+    http_client = _TenantAttribute()
+    credential = _TenantAttribute()
+    _client_lock = _TenantAttribute("client_lock")
+    cache = _TenantAttribute()
+    presence_cache = _TenantAttribute()
+    users = _TenantAttribute()
+    scheduler = _TenantAttribute()
+    batcher = _TenantAttribute()
+    index = _TenantAttribute()
+    delta = _TenantAttribute()
+    directory = _TenantAttribute()
+    reads = _TenantAttribute()
+    outbox = _TenantAttribute()
+    list_users = _TenantAttribute()
+
+    def __init__(self, settings: Settings | None = None):
         self.app = Server("mcp-m365-teams")
-        self.client: Optional[GraphServiceClient] = None
+        self.settings = settings or Settings.from_env()
+        self._background: dict[str, asyncio.Task] = {}
+        self._closing: set[asyncio.Task] = set()
+        self._serving = False
+        self._session_tenants: WeakKeyDictionary[Any, str] = WeakKeyDictionary()
+        self._session_limits: WeakKeyDictionary = WeakKeyDictionary()
+        self._session_numbers: WeakKeyDictionary[Any, int] = WeakKeyDictionary()
+        self._next_session_number = itertools.count(1)
+        self._sync_locks: dict[tuple[str, str], asyncio.Lock] = {}
+        self.notifications: NotificationReceiver | None = (
+            NotificationReceiver(
+                self.settings.notification_client_state or secrets.token_urlsafe(32),
+                self._apply_notification,
+                self._handle_lifecycle,
+            )
+            if self.settings.notification_port
+            else None
+        )
+        # Default-tenant subscriptions by resource: {"id": ..., "expires": epoch seconds}
+        self.subscriptions: dict[str, dict] = {}
+        self._pending_syncs: set[tuple[str, str, str]] = set()
+        budgets = [
+            budget
+            for budget in (
+                self.settings.response_max_bytes,
+                self.settings.response_max_tokens * BYTES_PER_TOKEN,
+            )
+            if budget
+        ]
+        self.encoder = ResponseEncoder(
+            compact=self.settings.response_compact,
+            fast=self.settings.fast_json,
+            max_bytes=min(budgets) if budgets else None,
+            excerpt_chars=self.settings.message_excerpt_chars or None,
+        )
+        self.metrics = Metrics(tracing=self.settings.otel_tracing)
+        self.tenants = TenantPool(
+            self._new_tenant,
+            load_tenants(self.settings.tenants_path) if self.settings.tenants_path else {},
+            max_size=self.settings.tenant_pool_size,
+            on_evict=self._evict_tenant,
+        )
         self._setup_handlers()
+
+    @property
+    def tenant(self) -> Tenant:
+        """The tenant of the tool call being served, else the default tenant"""
+        return _current_tenant.get() or self.tenants.default
+
+    def _new_tenant(self, name: str, config: TenantConfig | None) -> Tenant:
+        """Caches, throttle budget and local stores for one tenant"""
+        settings = self.settings
+        index_path, sync_path = settings.index_path, settings.sync_path
+        directory_path, outbox_path = settings.directory_path, settings.outbox_path
+        if config:
+            index_path = tenant_path(index_path, config)
+            sync_path = tenant_path(sync_path, config)
+            directory_path = tenant_path(directory_path, config)
+            outbox_path = tenant_path(outbox_path, config)
+        return Tenant(
+            name=name,
+            config=config,
+            cache=TTLCache(
+                max_size=settings.directory_cache_size,
+                ttl=settings.directory_cache_ttl,
+            ),
+            presence_cache=TTLCache(
+                max_size=settings.presence_cache_size,
+                ttl=settings.presence_cache_ttl,
+            ),
+            users=UserDirectory(
+                self._lookup_users,
+                max_size=settings.user_cache_size,
+                ttl=settings.user_cache_ttl,
+                negative_ttl=settings.user_cache_negative_ttl,
+            ),
+            scheduler=GraphScheduler(
+                rate=settings.graph_rate,
+                burst=settings.graph_burst,
+                max_concurrency=settings.graph_max_concurrency,
+                max_retries=settings.graph_max_retries,
+            ),
+            batcher=(
+                BatchCoalescer(self._post_batch, window=settings.batch_window)
+                if settings.graph_batching
+                else None
+            ),
+            index=MessageIndex(index_path) if index_path else None,
+            delta=DeltaStore(sync_path or ":memory:", max_changes=settings.sync_max_changes),
+            directory=Directory(directory_path),
+            outbox=(
+                Outbox(outbox_path, max_depth=settings.outbox_max_depth) if outbox_path else None
+            ),
+        )
+
+    def _evict_tenant(self, tenant: Tenant) -> None:
+        """Stop an evicted tenant's background loops and close its connections and stores"""
+        for loop in (self._token_refresh_loop, self._directory_refresh_loop, self._outbox_loop):
+            task = self._background.pop(self._tenant_task_name(loop, tenant), None)
+            if task:
+                task.cancel()
+        if tenant.http_client:
+            closing = asyncio.ensure_future(tenant.http_client.aclose())
+            self._closing.add(closing)
+            closing.add_done_callback(self._closing.discard)
+        if tenant.credential:
+            tenant.credential.close()
+        tenant.close()
+
+    @contextmanager
+    def _use_tenant(self, name: str) -> Iterator[Tenant]:
+        """Make the named tenant current, holding it in the pool until the block exits"""
+        tenant = self.tenants.acquire(name)
+        token = _current_tenant.set(tenant)
+        try:
+            yield tenant
+        finally:
+            _current_tenant.reset(token)
+            self.tenants.release(tenant)
+
+    def _session(self) -> Any:
+        """The MCP session of the request being served, if any"""
+        try:
+            return self.app.request_context.session
+        except LookupError:
+            return None
+
+    @asynccontextmanager
+    async def _session_slot(self) -> AsyncIterator[None]:
+        """Wait for one of the calling session's tool-call slots"""
+        session = self._session()
+        if session is None or not self.settings.session_max_concurrency:
+            yield
+            return
+        limit = self._session_limits.get(session)
+        if limit is None:
+            limit = self._session_limits[session] = asyncio.Semaphore(
+                self.settings.session_max_concurrency
+            )
+        async with limit:
+            yield
+
+    def _tenant_name(self, arguments: dict) -> str:
+        """Tenant named by the call, else the one its session selected, else the default"""
+        tenant: str | None = arguments.get("tenant")
+        if tenant:
+            return tenant
+        session = self._session()
+        if session is None:
+            return DEFAULT_TENANT
+        return self._session_tenants.get(session, DEFAULT_TENANT)
+
+    def _continuation_scope(self) -> tuple[str, int]:
+        """Tenant and session a truncated result belongs to; 0 stands for no session"""
+        session = self._session()
+        if session is None:
+            return self.tenant.name, 0
+        number = self._session_numbers.get(session)
+        if number is None:
+            number = self._session_numbers[session] = next(self._next_session_number)
+        return self.tenant.name, number
+
+    def _select_tenant(self, name: str | None) -> dict:
+        """Bind the calling session to a tenant; without a name, report the current one"""
+        session = self._session()
+        if name:
+            if session is None:
+                raise ValueError("No MCP session to bind the tenant to")
+            self._session_tenants[session] = name
+        return {"tenant": self._tenant_name({}), **self.tenants.stats()}
         
-    def _setup_handlers(self):
+    def _setup_handlers(self) -> None:
         """Setup MCP protocol handlers"""
+        self.tools = self._build_registry()
+        tool_list: list[types.Tool] = [spec.tool for spec in self.tools.values()]
         
         @self.app.list_tools()
         async def list_tools() -> list[types.Tool]:
             """List available Microsoft Teams tools"""
-            return [
-                types.Tool(
-                    name="list_teams",
-                    description="List all teams the user is a member of",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {},
-                    },
-                ),
-                types.Tool(
-                    name="get_team_channels",
-                    description="Get all channels in a specific team",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "team_id": {
-                                "type": "string",
-                                "description": "The ID of the team",
-                            },
-                        },
-                        "required": ["team_id"],
-                    },
-                ),
-                types.Tool(
-                    name="send_channel_message",
-                    description="Send a message to a Teams channel",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "team_id": {
-                                "type": "string",
-                                "description": "The ID of the team",
-                            },
-                            "channel_id": {
-                                "type": "string",
-                                "description": "The ID of the channel",
-                            },
-                            "message": {
-                                "type": "string",
-                                "description": "The message content",
-                            },
-                        },
-                        "required": ["team_id", "channel_id", "message"],
-                    },
-                ),
-                types.Tool(
-                    name="get_channel_messages",
-                    description="Get recent messages from a Teams channel",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "team_id": {
-                                "type": "string",
-                                "description": "The ID of the team",
-                            },
-                            "channel_id": {
-                                "type": "string",
-                                "description": "The ID of the channel",
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Maximum number of messages to retrieve (default: 10)",
-                                "default": 10,
-                            },
-                        },
-                        "required": ["team_id", "channel_id"],
-                    },
-                ),
-                types.Tool(
-                    name="create_team",
-                    description="Create a new Microsoft Team",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "display_name": {
-                                "type": "string",
-                                "description": "The name of the team",
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "Description of the team",
-                            },
-                        },
-                        "required": ["display_name"],
-                    },
-                ),
-                types.Tool(
-                    name="add_team_member",
-                    description="Add a member to a team",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "team_id": {
-                                "type": "string",
-                                "description": "The ID of the team",
-                            },
-                            "user_email": {
-                                "type": "string",
-                                "description": "Email address of the user to add",
-                            },
-                            "role": {
-                                "type": "string",
-                                "description": "Role: 'owner' or 'member' (default: member)",
-                                "default": "member",
-                            },
-                        },
-                        "required": ["team_id", "user_email"],
-                    },
-                ),
-                types.Tool(
-                    name="create_channel",
-                    description="Create a new channel in a team",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "team_id": {
-                                "type": "string",
-                                "description": "The ID of the team",
-                            },
-                            "display_name": {
-                                "type": "string",
-                                "description": "The name of the channel",
-                            },
-                            "description": {
-                                "type": "string",
-                                "description": "Description of the channel",
-                            },
-                        },
-                        "required": ["team_id", "display_name"],
-                    },
-                ),
-                types.Tool(
-                    name="get_user_presence",
-                    description="Get presence information for a user",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "user_email": {
-                                "type": "string",
-                                "description": "Email address of the user",
-                            },
-                        },
-                        "required": ["user_email"],
-                    },
-                ),
-                types.Tool(
-                    name="search_messages",
-                    description="Search for messages across all teams",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Search query",
-                            },
-                            "limit": {
-                                "type": "integer",
-                                "description": "Maximum number of results (default: 10)",
-                                "default": 10,
-                            },
-                        },
-                        "required": ["query"],
-                    },
-                ),
-            ]
+            return tool_list
         
         @self.app.call_tool()
         async def call_tool(name: str, arguments: Any) -> list[types.TextContent]:
             """Handle tool execution"""
             try:
-                if not self.client:
-                    await self._initialize_client()
-                
-                if name == "list_teams":
-                    result = await self._list_teams()
-                elif name == "get_team_channels":
-                    result = await self._get_team_channels(arguments["team_id"])
-                elif name == "send_channel_message":
-                    result = await self._send_channel_message(
-                        arguments["team_id"],
-                        arguments["channel_id"],
-                        arguments["message"]
-                    )
-                elif name == "get_channel_messages":
-                    result = await self._get_channel_messages(
-                        arguments["team_id"],
-                        arguments["channel_id"],
-                        arguments.get("limit", 10)
-                    )
-                elif name == "create_team":
-                    result = await self._create_team(
-                        arguments["display_name"],
-                        arguments.get("description", "")
-                    )
-                elif name == "add_team_member":
-                    result = await self._add_team_member(
-                        arguments["team_id"],
-                        arguments["user_email"],
-                        arguments.get("role", "member")
-                    )
-                elif name == "create_channel":
-                    result = await self._create_channel(
-                        arguments["team_id"],
-                        arguments["display_name"],
-                        arguments.get("description", "")
-                    )
-                elif name == "get_user_presence":
-                    result = await self._get_user_presence(arguments["user_email"])
-                elif name == "search_messages":
-                    result = await self._search_messages(
-                        arguments["query"],
-                        arguments.get("limit", 10)
-                    )
-                else:
+                spec = self.tools.get(name)
+                if spec is None:
                     raise ValueError(f"Unknown tool: {name}")
+                arguments = arguments or {}
                 
-                return [types.TextContent(type="text", text=json.dumps(result, indent=2))]
+                async with self._session_slot():
+                    with (
+                        self._use_tenant(self._tenant_name(arguments)),
+                        self.metrics.tool_call(name),
+                    ):
+                        if spec.needs_client:
+                            await self._ensure_client()
+                            arguments = await self._resolve_names(arguments, exact=spec.writes)
+                        result = spec.handler(arguments)
+                        if inspect.isawaitable(result):
+                            result = await result
+                        text = (
+                            result
+                            if spec.encoded
+                            else self.encoder.encode(result, self._continuation_scope())
+                        )
+                return [types.TextContent(type="text", text=text)]
             
             except Exception as e:
-                return [types.TextContent(type="text", text=f"Error: {str(e)}")]
+                return [types.TextContent(type="text", text=f"Error: {e!s}")]
     
-    async def _initialize_client(self):
+    def _build_registry(self) -> dict[str, ToolSpec]:
+        """Pair every tool definition with its handler"""
+        handlers: dict[str, Callable[[dict], Any]] = {
+            "list_teams": lambda args: self._list_teams(args.get("fields")),
+            "get_team_channels": lambda args: self._get_team_channels(
+                args["team_id"], args.get("fields")
+            ),
+            "send_channel_message": lambda args: (
+                self._queue_channel_message(
+                    args["team_id"],
+                    args["channel_id"],
+                    args["message"],
+                    args.get("idempotency_key"),
+                )
+                if self.outbox
+                else self._send_channel_message(
+                    args["team_id"], args["channel_id"], args["message"]
+                )
+            ),
+            "broadcast_channel_message": lambda args: self._broadcast_channel_message(
+                args["channels"], args["message"]
+            ),
+            "get_channel_messages": lambda args: self._get_channel_messages(
+                args["team_id"],
+                args["channel_id"],
+                args.get("limit", 10),
+                args.get("cursor"),
+                args.get("fields"),
+            ),
+            "get_channel_changes": lambda args: self._get_channel_changes(
+                args["team_id"], args["channel_id"], args.get("cursor"), args.get("limit", 50)
+            ),
+            "create_team": lambda args: self._create_team(
+                args["display_name"], args.get("description", "")
+            ),
+            "add_team_member": lambda args: self._add_team_member(
+                args["team_id"], args["user_email"], args.get("role", "member")
+            ),
+            "add_team_members": lambda args: self._add_team_members(
+                args["team_id"], args["members"]
+            ),
+            "create_channel": lambda args: self._create_channel(
+                args["team_id"], args["display_name"], args.get("description", "")
+            ),
+            "get_user_presence": lambda args: self._get_user_presence(args["user_email"]),
+            "get_users_presence": lambda args: self._get_users_presence(args["users"]),
+            "search_messages": lambda args: self._search_messages(
+                args["query"],
+                args.get("limit", 10),
+                args.get("timeout_seconds"),
+                team_id=args.get("team_id"),
+                channel_id=args.get("channel_id"),
+                author=args.get("author"),
+                since=args.get("since"),
+                until=args.get("until"),
+            ),
+            "refresh_index": lambda args: self._refresh_index(args.get("team_id")),
+            "get_index_status": lambda args: self._get_index_status(),
+            "lookup_directory": lambda args: self._lookup_directory(
+                args["name"], args.get("kind"), args.get("team_id")
+            ),
+            "get_outbox_status": lambda args: self._get_outbox_status(
+                args.get("outbox_id"), args.get("idempotency_key")
+            ),
+            "get_cache_stats": lambda args: {
+                "directory": self.cache.stats(),
+                "users": self.users.cache.stats(),
+                "presence": self.presence_cache.stats(),
+                "reads": self.reads.stats(),
+            },
+            "invalidate_cache": lambda args: self._invalidate_cache(
+                args.get("scope", "all"), args.get("team_id")
+            ),
+            "get_continuation": lambda args: self.encoder.resume(
+                args["continuation"], self._continuation_scope()
+            ),
+            "get_throttle_stats": lambda args: {"resources": self.scheduler.stats()},
+            "get_metrics": lambda args: (
+                self.metrics.prometheus()
+                if args.get("format") == "prometheus"
+                else self.encoder.encode(self.metrics.snapshot(), self._continuation_scope())
+            ),
+            "select_tenant": lambda args: self._select_tenant(args.get("tenant")),
+        }
+        # These only report or drop local state, so they work before Graph is reachable
+        local = {
+            "get_index_status",
+            "lookup_directory",
+            "get_outbox_status",
+            "get_cache_stats",
+            "invalidate_cache",
+            "get_continuation",
+            "get_throttle_stats",
+            "get_metrics",
+            "select_tenant",
+        }
+        writes = {
+            "send_channel_message",
+            "broadcast_channel_message",
+            "create_team",
+            "add_team_member",
+            "add_team_members",
+            "create_channel",
+        }
+        return {
+            tool.name: ToolSpec(
+                tool,
+                handlers[tool.name],
+                needs_client=tool.name not in local,
+                encoded=tool.name in ("get_continuation", "get_metrics"),
+                writes=tool.name in writes,
+            )
+            for tool in TOOLS
+        }
+
+    async def _ensure_client(self) -> None:
+        """Initialize the Graph client once, however many calls race for it"""
+        if self.client:
+            return
+        async with self._client_lock:
+            if self.client:
+                return
+            await self._initialize_client()
+        if self._serving:
+            loops = [self._token_refresh_loop, self._directory_refresh_loop]
+            if self.outbox:
+                loops.append(self._outbox_loop)
+            for loop in loops:
+                self._start_background(loop, self._tenant_task_name(loop, self.tenant))
+
+    def _tenant_task_name(self, loop: Any, tenant: Tenant) -> str:
+        """Background task name of a tenant's copy of a per-tenant loop"""
+        name = loop.__name__
+        return name if tenant.config is None else f"{name}:{tenant.name}"
+
+    async def _refresh_token(self) -> float:
+        """Fetch an access token into the credential's cache; returns its expiry (epoch).
+
+        The Graph client's auth provider asks for CAE tokens, which azure-identity caches
+        apart from the others, so this must ask for one too.
+        """
+        token = await asyncio.to_thread(self.credential.get_token, GRAPH_SCOPE, enable_cae=True)
+        expires_on: int = token.expires_on
+        return expires_on
+
+    async def _token_refresh_loop(self) -> None:
+        """Keep a fresh access token cached so tool calls never wait on Azure AD"""
+        while True:
+            try:
+                await self._ensure_client()
+                expires_on = await self._refresh_token()
+                delay = expires_on - time.time() - self.settings.token_refresh_margin
+            except ValueError:
+                logger.warning("Graph client is not configured; skipping token refresh")
+                return
+            except Exception:
+                logger.exception("Access token refresh failed")
+                delay = TOKEN_RETRY_DELAY
+            await asyncio.sleep(max(TOKEN_RETRY_DELAY, delay))
+
+    async def _warm_up(self) -> None:
+        """Initialize the Graph client ahead of the first tool call"""
+        try:
+            await self._ensure_client()
+        except Exception:
+            logger.warning("Eager Graph client initialization failed", exc_info=True)
+
+    def _start_background(self, loop: Any, name: str | None = None) -> None:
+        """Start a named background loop unless it is already running.
+
+        The task inherits the current tenant, so per-tenant loops need their own ``name``.
+        """
+        name = name or loop.__name__
+        task = self._background.get(name)
+        if task is None or task.done():
+            self._background[name] = asyncio.create_task(loop())
+
+    async def _initialize_client(self) -> None:
         """Initialize Microsoft Graph client"""
-        tenant_id = os.getenv("M365_TENANT_ID")
-        client_id = os.getenv("M365_CLIENT_ID")
-        client_secret = os.getenv("M365_CLIENT_SECRET")
+        # Importing the SDK takes hundreds of milliseconds; keep the event loop answering
+        # MCP requests meanwhile
+        await asyncio.to_thread(_import_modules, GRAPH_SDK_MODULES)
+        from azure.identity import ClientSecretCredential
+        from kiota_authentication_azure.azure_identity_authentication_provider import (
+            AzureIdentityAuthenticationProvider,
+        )
+        from msgraph import GraphRequestAdapter, GraphServiceClient
+
+        config = self.tenant.config
+        if config:
+            tenant_id, client_id, client_secret = (
+                config.tenant_id, config.client_id, config.client_secret
+            )
+        else:
+            tenant_id = os.getenv("M365_TENANT_ID")
+            client_id = os.getenv("M365_CLIENT_ID")
+            client_secret = os.getenv("M365_CLIENT_SECRET")
         
         if not all([tenant_id, client_id, client_secret]):
             raise ValueError(
@@ -266,77 +586,591 @@ class M365TeamsServer:
             client_secret=client_secret
         )
         
-        self.client = GraphServiceClient(credential)
+        self.credential = credential
+        auth_provider = AzureIdentityAuthenticationProvider(credential, scopes=[GRAPH_SCOPE])
+        self.http_client = self._build_http_client()
+        self.client = GraphServiceClient(
+            request_adapter=GraphRequestAdapter(auth_provider, self.http_client)
+        )
+
+    def _build_http_client(self, base_url: str = GRAPH_BASE_URL) -> "httpx.AsyncClient":
+        """httpx client with the configured pool, HTTP/2, timeouts and middleware"""
+        import httpx
+        from msgraph_core import GraphClientFactory
+
+        settings = self.settings
+        http2 = settings.http2 and importlib.util.find_spec("h2") is not None
+        if settings.http2 and not http2:
+            logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(
+                settings.http_read_timeout, connect=settings.http_connect_timeout
+            ),
+            headers={
+                "Accept-Encoding": "gzip, deflate" if settings.http_compression else "identity"
+            },
+        )
+        graph_client: httpx.AsyncClient = GraphClientFactory.create_with_custom_middleware(
+            self._graph_middleware(), client=client
+        )
+        return graph_client
+
+    def _graph_middleware(self) -> list:
+        """Kiota middleware pipeline with the throttling scheduler in place of RetryHandler"""
+        from kiota_http.kiota_client_factory import KiotaClientFactory
+        from kiota_http.middleware import RetryHandler
+        from msgraph_core.middleware import GraphTelemetryHandler
+
+        from .middleware import MetricsMiddleware, SchedulerMiddleware
+
+        middleware = [
+            handler
+            for handler in KiotaClientFactory.get_default_middleware(None)
+            if not isinstance(handler, RetryHandler)
+        ]
+        middleware.append(GraphTelemetryHandler())
+        middleware.append(SchedulerMiddleware(self.scheduler))
+        # Innermost, so each retry of a throttled request is timed on its own
+        middleware.append(MetricsMiddleware(self.metrics))
+        return middleware
+
+    async def _post_batch(self, payload: dict) -> dict:
+        """POST a JSON $batch payload through the Graph client's request adapter"""
+        from kiota_abstractions.method import Method
+        from kiota_abstractions.request_information import RequestInformation
+
+        adapter = self.client.request_adapter
+        request_info = RequestInformation(
+            Method.POST, "{+baseurl}/$batch", {"baseurl": adapter.base_url.rstrip("/")}
+        )
+        request_info.headers.try_add("Accept", "application/json")
+        request_info.set_stream_content(json.dumps(payload).encode(), "application/json")
+
+        content = await adapter.send_primitive_async(request_info, "bytes", None)
+        return json.loads(content) if content else {}
+
+    async def _graph_get(
+        self, builder: Any, factory: Any, request_configuration: Any = None
+    ) -> Any:
+        """GET through a request builder, coalesced into $batch calls when enabled.
+
+        Concurrent GETs of the same URL share one request and one parsed result, so
+        callers must not mutate what they get back.
+        """
+        request_info = builder.to_get_request_information(request_configuration)
+        request_info.path_parameters["baseurl"] = self.client.request_adapter.base_url.rstrip("/")
+
+        async def get() -> Any:
+            if not self.batcher:
+                return await builder.get(request_configuration=request_configuration)
+            return await self._send_batched(request_info, factory)
+
+        if not self.settings.single_flight:
+            return await get()
+        return await self.reads.do(request_info.url, get)
+
+    async def _graph_post(self, builder: Any, body: Any, factory: Any) -> Any:
+        """POST through a request builder, coalesced into $batch calls when enabled"""
+        if not self.batcher:
+            return await builder.post(body)
+
+        request_info = builder.to_post_request_information(body)
+        return await self._send_batched(request_info, factory)
+
+    async def _send_batched(self, request_info: "RequestInformation", factory: Any) -> Any:
+        """Queue an SDK request as a $batch sub-request and parse its response"""
+        from kiota_serialization_json.json_parse_node_factory import JsonParseNodeFactory
+
+        base_url = self.client.request_adapter.base_url.rstrip("/")
+        request_info.path_parameters["baseurl"] = base_url
+        body = json.loads(request_info.content) if request_info.content else None
+        response = await self.batcher.request(
+            request_info.http_method.value, request_info.url[len(base_url):], body
+        )
+        if response is None:
+            return None
+
+        parse_node = JsonParseNodeFactory().get_root_parse_node(
+            "application/json", json.dumps(response).encode()
+        )
+        return parse_node.get_object_value(factory)
+
+    async def _lookup_users(self, emails: list[str]) -> dict[str, str]:
+        """Resolve a chunk of email addresses to user IDs from the directory snapshot, asking
+        Graph in one request for the ones it does not know
+        """
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.user_collection_response import UserCollectionResponse
+        from msgraph.generated.users.users_request_builder import UsersRequestBuilder
+
+        result = {}
+        for email in emails:
+            user = self.directory.user_by_mail(email)
+            if user:
+                result[email] = user["id"]
+        emails = [email for email in emails if email not in result]
+        if not emails:
+            return result
+
+        query = UsersRequestBuilder.UsersRequestBuilderGetQueryParameters(
+            filter=mail_filter(emails),
+            select=["id", "mail"],
+        )
+        users = await self._graph_get(
+            self.client.users,
+            UserCollectionResponse,
+            RequestConfiguration(query_parameters=query),
+        )
+
+        if users and users.value:
+            for user in users.value:
+                if user.mail:
+                    result[user.mail.lower()] = user.id
+        return result
     
-    async def _list_teams(self) -> dict:
+    async def _resolve_user_id(self, user_email: str) -> str:
+        """Resolve an email address to a user ID through the shared user cache"""
+        if looks_like_id(user_email):
+            return user_email
+        user_id: str | None = await self.users.resolve(user_email)
+        if user_id is None:
+            raise ValueError(f"User not found: {user_email}")
+        return user_id
+
+    async def _resolve_names(self, arguments: dict, exact: bool = False) -> dict:
+        """Tool arguments with team, channel and user names replaced by IDs or emails.
+
+        With ``exact`` (tools that change something), a name must be a target's full
+        display name; prefixes and near spellings fail with the candidates listed.
+        """
+        resolved = dict(arguments)
+        if resolved.get("team_id"):
+            resolved["team_id"] = await self._resolve_team(resolved["team_id"], exact)
+        if resolved.get("channel_id"):
+            resolved["channel_id"] = await self._resolve_channel(
+                resolved.get("team_id"), resolved["channel_id"], exact
+            )
+        if resolved.get("channels"):
+            targets = []
+            for target in resolved["channels"]:
+                team_id = await self._resolve_team(target["team_id"], exact)
+                channel_id = await self._resolve_channel(team_id, target["channel_id"], exact)
+                targets.append({**target, "team_id": team_id, "channel_id": channel_id})
+            resolved["channels"] = targets
+        if resolved.get("user_email"):
+            resolved["user_email"] = self._resolve_user(resolved["user_email"], exact)
+        if resolved.get("users"):
+            resolved["users"] = [self._resolve_user(user, exact) for user in resolved["users"]]
+        if resolved.get("members"):
+            resolved["members"] = [
+                {**member, "user": self._resolve_user(member["user"], exact)}
+                for member in resolved["members"]
+            ]
+        return resolved
+
+    async def _resolve_team(self, team: str, exact: bool = False) -> str:
+        """ID of the team with this ID or display name"""
+        if looks_like_id(team) or self.directory.team_by_id(team):
+            return team
+        matches = self.directory.find_team(team)
+        found = unique("team", team, matches, exact)
+        if found is None:
+            # Not in the directory yet: read the team list, usually from the cache
+            self.directory.set_teams((await self._list_teams())["teams"])
+            if self.directory.team_by_id(team):
+                return team
+            matches = self.directory.find_team(team)
+            found = unique("team", team, matches, exact)
+        if found is None:
+            raise not_found("team", team, matches)
+        return found["id"]
+
+    async def _resolve_channel(
+        self, team_id: str | None, channel: str, exact: bool = False
+    ) -> str:
+        """ID of the channel with this ID or display name, in one team or any known team"""
+        if looks_like_id(channel) or self.directory.channel_by_id(channel, team_id):
+            return channel
+        matches = self.directory.find_channel(channel, team_id)
+        found = unique("channel", channel, matches, exact)
+        if found is None and team_id:
+            channels = (await self._get_team_channels(team_id))["channels"]
+            self.directory.set_channels(team_id, channels)
+            if self.directory.channel_by_id(channel, team_id):
+                return channel
+            matches = self.directory.find_channel(channel, team_id)
+            found = unique("channel", channel, matches, exact)
+        if found is None:
+            hint = "" if team_id else "; pass team_id to look it up in Graph"
+            raise not_found("channel", channel, matches, hint)
+        return found["id"]
+
+    def _resolve_user(self, user: str, exact: bool = False) -> str:
+        """Email address, else ID, of the user with this email, ID or display name"""
+        if "@" in user or looks_like_id(user) or self.directory.user_by_id(user):
+            return user
+        matches = self.directory.find_user(user)
+        found = unique("user", user, matches, exact)
+        if found is None:
+            raise not_found("user", user, matches, " in the directory snapshot")
+        return found.get("mail") or found["id"]
+
+    def _lookup_directory(
+        self, name: str, kind: str | None = None, team_id: str | None = None
+    ) -> dict:
+        """Teams, channels and users whose name matches, from the local directory"""
+        if kind not in (None, "team", "channel", "user"):
+            raise ValueError(f"Unknown directory kind: {kind}")
+
+        matches = []
+        if kind in (None, "team"):
+            matches += [{"kind": "team", **team} for team in self.directory.find_team(name)]
+        if kind in (None, "channel"):
+            matches += [
+                {"kind": "channel", **channel}
+                for channel in self.directory.find_channel(name, team_id)
+            ]
+        if kind in (None, "user"):
+            matches += [{"kind": "user", **user} for user in self.directory.find_user(name)]
+        return {"matches": matches, "count": len(matches), "directory": self.directory.status()}
+
+    async def _list_teams(self, fields: list[str] | None = None) -> dict:
         """List all teams"""
-        teams = await self.client.me.joined_teams.get()
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.team_collection_response import TeamCollectionResponse
+        from msgraph.generated.users.item.joined_teams.joined_teams_request_builder import (
+            JoinedTeamsRequestBuilder,
+        )
         
-        result = []
-        if teams and teams.value:
-            for team in teams.value:
-                result.append({
-                    "id": team.id,
-                    "display_name": team.display_name,
-                    "description": team.description,
-                })
+        fields, _ = project(TEAM_FIELDS, fields)
+        result = self.cache.get(("teams",))
+        if result is MISSING:
+            _, select = project(TEAM_FIELDS)
+            query = JoinedTeamsRequestBuilder.JoinedTeamsRequestBuilderGetQueryParameters(
+                select=select
+            )
+            teams = await self._graph_get(
+                self.client.me.joined_teams,
+                TeamCollectionResponse,
+                RequestConfiguration(query_parameters=query),
+            )
+
+            result = []
+            if teams and teams.value:
+                for team in teams.value:
+                    result.append({
+                        "id": team.id,
+                        "display_name": team.display_name,
+                        "description": team.description,
+                    })
+            self.cache.set(("teams",), result)
+            self.directory.set_teams(result)
         
+        result = [trim(team, fields) for team in result]
         return {"teams": result, "count": len(result)}
     
-    async def _get_team_channels(self, team_id: str) -> dict:
+    async def _get_team_channels(self, team_id: str, fields: list[str] | None = None) -> dict:
         """Get channels in a team"""
-        channels = await self.client.teams.by_team_id(team_id).channels.get()
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.channel_collection_response import (
+            ChannelCollectionResponse,
+        )
+        from msgraph.generated.teams.item.channels.channels_request_builder import (
+            ChannelsRequestBuilder,
+        )
         
-        result = []
-        if channels and channels.value:
-            for channel in channels.value:
-                result.append({
-                    "id": channel.id,
-                    "display_name": channel.display_name,
-                    "description": channel.description,
-                    "email": channel.email,
-                })
+        fields, _ = project(CHANNEL_FIELDS, fields)
+        result = self.cache.get(("channels", team_id))
+        if result is MISSING:
+            _, select = project(CHANNEL_FIELDS)
+            query = ChannelsRequestBuilder.ChannelsRequestBuilderGetQueryParameters(select=select)
+            channels = await self._graph_get(
+                self.client.teams.by_team_id(team_id).channels,
+                ChannelCollectionResponse,
+                RequestConfiguration(query_parameters=query),
+            )
+
+            result = []
+            if channels and channels.value:
+                for channel in channels.value:
+                    result.append({
+                        "id": channel.id,
+                        "display_name": channel.display_name,
+                        "description": channel.description,
+                        "email": channel.email,
+                    })
+            self.cache.set(("channels", team_id), result)
+            self.directory.set_channels(team_id, result)
         
+        result = [trim(channel, fields) for channel in result]
         return {"channels": result, "count": len(result)}
     
     async def _send_channel_message(self, team_id: str, channel_id: str, message: str) -> dict:
         """Send a message to a channel"""
+        from msgraph.generated.models.body_type import BodyType
         from msgraph.generated.models.chat_message import ChatMessage
         from msgraph.generated.models.item_body import ItemBody
-        from msgraph.generated.models.body_type import BodyType
         
         chat_message = ChatMessage()
         chat_message.body = ItemBody()
         chat_message.body.content = message
         chat_message.body.content_type = BodyType.Text
         
-        result = await self.client.teams.by_team_id(team_id).channels.by_channel_id(
-            channel_id
-        ).messages.post(chat_message)
+        result = await self._graph_post(
+            self.client.teams.by_team_id(team_id).channels.by_channel_id(channel_id).messages,
+            chat_message,
+            ChatMessage,
+        )
         
         return {
             "success": True,
             "message_id": result.id,
-            "created_at": result.created_date_time.isoformat() if result.created_date_time else None,
+            "created_at": (
+                result.created_date_time.isoformat() if result.created_date_time else None
+            ),
         }
     
-    async def _get_channel_messages(self, team_id: str, channel_id: str, limit: int) -> dict:
-        """Get messages from a channel"""
-        messages = await self.client.teams.by_team_id(team_id).channels.by_channel_id(
-            channel_id
-        ).messages.get()
+    async def _queue_channel_message(
+        self, team_id: str, channel_id: str, message: str, idempotency_key: str | None = None
+    ) -> dict:
+        """Queue a message for the background sender; a known key returns its entry instead"""
+        entry, created = await asyncio.to_thread(
+            self.outbox.enqueue, team_id, channel_id, message, idempotency_key
+        )
+        self.outbox.ready.set()
+        return {
+            "success": True,
+            "queued": created,
+            "outbox_id": entry["id"],
+            "idempotency_key": entry["idempotency_key"],
+            "status": entry["status"],
+            "message_id": entry["message_id"],
+        }
+
+    async def _get_outbox_status(
+        self, outbox_id: str | None = None, idempotency_key: str | None = None
+    ) -> dict:
+        """Queue depth, and the delivery status of one queued message if asked for"""
+        if not self.outbox:
+            raise ValueError("Outbox is disabled; set M365_OUTBOX_PATH to enable it")
+
+        status: dict[str, Any] = {"outbox": await asyncio.to_thread(self.outbox.stats)}
+        if outbox_id or idempotency_key:
+            entry = await asyncio.to_thread(self.outbox.get, outbox_id, idempotency_key)
+            if entry is None:
+                raise ValueError(f"No outbox entry {outbox_id or idempotency_key!r}")
+            status["entry"] = entry
+        return status
+
+    async def _deliver(self, entry: dict) -> None:
+        """Post one outbox entry, then record it as sent, to be retried, failed or unknown"""
+        try:
+            await self._ensure_client()
+            sent = await self._send_channel_message(
+                entry["team_id"], entry["channel_id"], entry["message"]
+            )
+        except Exception as e:  # noqa: BLE001 - recorded on the outbox entry
+            if not _never_posted(e):
+                # A timeout or server error can come after Graph posted the message, and
+                # posting it again could deliver it twice
+                await asyncio.to_thread(self.outbox.mark_unknown, entry["id"], str(e))
+                return
+            # Other client errors (bad IDs, missing permissions) will not succeed on retry
+            retryable = _error_status(e) in (None, 408, 429)
+            if not retryable or entry["attempts"] + 1 >= self.settings.outbox_max_attempts:
+                await asyncio.to_thread(self.outbox.mark_failed, entry["id"], str(e))
+            else:
+                retry_at = time.time() + self.scheduler.backoff(entry["attempts"])
+                await asyncio.to_thread(self.outbox.mark_retry, entry["id"], str(e), retry_at)
+        else:
+            await asyncio.to_thread(self.outbox.mark_sent, entry["id"], sent["message_id"])
+
+    def _iter_channel_messages(
+        self,
+        team_id: str,
+        channel_id: str,
+        page_size: int,
+        url: str | None = None,
+    ) -> AsyncGenerator[tuple[list, str | None, str | None], None]:
+        """Lazily page through a channel's messages, starting at ``url`` if given"""
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.chat_message_collection_response import (
+            ChatMessageCollectionResponse,
+        )
+        from msgraph.generated.teams.item.channels.item.messages.messages_request_builder import (
+            MessagesRequestBuilder,
+        )
+
+        builder = self.client.teams.by_team_id(team_id).channels.by_channel_id(channel_id).messages
+
+        async def fetch(page_url: str | None) -> Any:
+            if page_url:
+                return await self._graph_get(
+                    builder.with_url(page_url), ChatMessageCollectionResponse
+                )
+            query = MessagesRequestBuilder.MessagesRequestBuilderGetQueryParameters(top=page_size)
+            return await self._graph_get(
+                builder,
+                ChatMessageCollectionResponse,
+                RequestConfiguration(query_parameters=query),
+            )
+
+        return iter_pages(fetch, url)
+
+    async def _get_channel_messages(
+        self,
+        team_id: str,
+        channel_id: str,
+        limit: int,
+        cursor: str | None = None,
+        fields: list[str] | None = None,
+    ) -> dict:
+        """Get messages from a channel, one page at a time"""
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        # Graph ignores $select on channel messages, so fields are only trimmed locally
+        fields, _ = project(MESSAGE_FIELDS, fields)
+        base_url = self.client.request_adapter.base_url
+        url, skip = decode_cursor(cursor, base_url) if cursor else (None, 0)
+        page_size = min(limit, MAX_MESSAGES_PAGE_SIZE)
         
-        result = []
-        if messages and messages.value:
-            for msg in messages.value[:limit]:
-                result.append({
-                    "id": msg.id,
-                    "content": msg.body.content if msg.body else None,
-                    "from": msg.from_property.user.display_name if msg.from_property and msg.from_property.user else None,
-                    "created_at": msg.created_date_time.isoformat() if msg.created_date_time else None,
-                })
+        result: list[dict] = []
+        next_cursor = None
+        pages = self._iter_channel_messages(team_id, channel_id, page_size, url)
+        async for items, page_url, next_link in pages:
+            for position in range(skip, len(items)):
+                if len(result) == limit:
+                    if page_url is None:
+                        page_url = self._first_page_url(team_id, channel_id, page_size)
+                    next_cursor = encode_cursor(page_url, position)
+                    break
+                result.append(trim(self._message_record(items[position]), fields))
+            skip = 0
+            if next_cursor or len(result) == limit:
+                if not next_cursor and next_link:
+                    next_cursor = encode_cursor(next_link)
+                break
+        await pages.aclose()
+
+        return {"messages": result, "count": len(result), "next_cursor": next_cursor}
+
+    @staticmethod
+    def _message_record(msg: Any) -> dict:
+        """Serialize an SDK chat message into the tools' message shape"""
+        return {
+            "id": msg.id,
+            "content": msg.body.content if msg.body else None,
+            "from": msg.from_.user.display_name if msg.from_ and msg.from_.user else None,
+            "created_at": msg.created_date_time.isoformat() if msg.created_date_time else None,
+        }
+
+    async def _sync_channel(self, team: dict, channel: dict) -> dict:
+        """Pull a channel's message changes since its stored deltaLink into the change log"""
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.teams.item.channels.item.messages.delta.delta_get_response import (
+            DeltaGetResponse,
+        )
+        from msgraph.generated.teams.item.channels.item.messages.delta.delta_request_builder import (
+            DeltaRequestBuilder,
+        )
+
+        key = (team["id"], channel["id"])
+        lock = self._sync_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            builder = (
+                self.client.teams.by_team_id(team["id"])
+                .channels.by_channel_id(channel["id"])
+                .messages.delta
+            )
+            url = await asyncio.to_thread(self.delta.delta_link, *key)
+
+            upserted: list[dict] = []
+            deleted: list[str] = []
+            resync = False
+            while True:
+                try:
+                    if url:
+                        page = await self._graph_get(builder.with_url(url), DeltaGetResponse)
+                    else:
+                        query = DeltaRequestBuilder.DeltaRequestBuilderGetQueryParameters(
+                            top=self.settings.index_page_size
+                        )
+                        page = await self._graph_get(
+                            builder, DeltaGetResponse, RequestConfiguration(query_parameters=query)
+                        )
+                except Exception as e:
+                    lost = _error_status(e) == 410 or _error_code(e) in SYNC_STATE_LOST
+                    if not url or resync or not lost:
+                        raise
+                    # The stored deltaLink expired: start over with a full sync
+                    logger.warning("Delta state of channel %s expired; resyncing", channel["id"])
+                    url, resync = None, True
+                    upserted, deleted = [], []
+                    continue
+                for msg in (page.value if page else None) or []:
+                    if msg.deleted_date_time:
+                        deleted.append(msg.id)
+                    else:
+                        upserted.append(self._message_record(msg))
+                url = page.odata_next_link if page else None
+                if not url:
+                    break
+
+            changes = [{"id": m["id"], "change": "upserted", "message": m} for m in upserted]
+            changes += [{"id": message_id, "change": "deleted"} for message_id in deleted]
+            delta_link = page.odata_delta_link if page else None
+            await asyncio.to_thread(
+                self.delta.record, team["id"], channel["id"], changes, delta_link, resync
+            )
+
+            added = 0
+            if self.index:
+                added = await asyncio.to_thread(self.index.upsert_messages, team, channel, upserted)
+                if deleted:
+                    await asyncio.to_thread(
+                        self.index.delete_messages, team["id"], channel["id"], deleted
+                    )
+
+            return {
+                "upserted": len(upserted),
+                "deleted": len(deleted),
+                "indexed": added,
+                "resynced": resync,
+            }
+
+    async def _get_channel_changes(
+        self, team_id: str, channel_id: str, cursor: str | None = None, limit: int = 50
+    ) -> dict:
+        """Sync a channel, then return its changes recorded after ``cursor``"""
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        after = decode_change_cursor(cursor) if cursor else 0
+        await self._sync_channel({"id": team_id}, {"id": channel_id})
+        return await asyncio.to_thread(
+            self.delta.changes_since, team_id, channel_id, after, int(limit)
+        )
+
+    def _first_page_url(self, team_id: str, channel_id: str, page_size: int) -> str:
+        """Absolute URL of the first page of a channel's messages"""
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.teams.item.channels.item.messages.messages_request_builder import (
+            MessagesRequestBuilder,
+        )
         
-        return {"messages": result, "count": len(result)}
+        builder = self.client.teams.by_team_id(team_id).channels.by_channel_id(channel_id).messages
+        query = MessagesRequestBuilder.MessagesRequestBuilderGetQueryParameters(top=page_size)
+        request_info = builder.to_get_request_information(
+            RequestConfiguration(query_parameters=query)
+        )
+        request_info.path_parameters["baseurl"] = self.client.request_adapter.base_url.rstrip("/")
+        return request_info.url
     
     async def _create_team(self, display_name: str, description: str) -> dict:
         """Create a new team"""
@@ -347,6 +1181,8 @@ class M365TeamsServer:
         team.description = description
         
         result = await self.client.teams.post(team)
+        # Team creation completes asynchronously; re-read the list on next use
+        self.cache.invalidate(lambda key: key == ("teams",))
         
         return {
             "success": True,
@@ -358,12 +1194,7 @@ class M365TeamsServer:
         """Add a member to a team"""
         from msgraph.generated.models.aad_user_conversation_member import AadUserConversationMember
         
-        # First get user ID from email
-        users = await self.client.users.get(filter=f"mail eq '{user_email}'")
-        if not users or not users.value:
-            raise ValueError(f"User not found: {user_email}")
-        
-        user_id = users.value[0].id
+        user_id = await self._resolve_user_id(user_email)
         
         member = AadUserConversationMember()
         member.roles = ["owner"] if role == "owner" else []
@@ -378,6 +1209,100 @@ class M365TeamsServer:
             "member_id": result.id,
         }
     
+    async def _add_team_members(self, team_id: str, members: list[dict]) -> dict:
+        """Add many members to a team with the members/add bulk action"""
+        from msgraph.generated.models.aad_user_conversation_member import AadUserConversationMember
+        from msgraph.generated.teams.item.members.add.add_post_request_body import (
+            AddPostRequestBody,
+        )
+
+        emails = [m["user"] for m in members if "@" in m["user"]]
+        user_ids = await self.users.resolve_many(emails) if emails else {}
+
+        results = []
+        pending = []
+        for member in members:
+            user_id = user_ids.get(member["user"]) if "@" in member["user"] else member["user"]
+            role = member.get("role", "member")
+            if user_id is None:
+                results.append({**member, "status": "failed", "error": "User not found"})
+            else:
+                pending.append((member, user_id, role))
+
+        async def add_chunk(chunk: list[tuple[dict, str, str]]) -> list[dict]:
+            body = AddPostRequestBody()
+            body.values = []
+            for _, user_id, role in chunk:
+                conversation_member = AadUserConversationMember()
+                conversation_member.roles = ["owner"] if role == "owner" else []
+                conversation_member.additional_data = {
+                    "user@odata.bind": f"https://graph.microsoft.com/v1.0/users('{user_id}')"
+                }
+                body.values.append(conversation_member)
+
+            try:
+                response = await self.client.teams.by_team_id(team_id).members.add.post(body)
+            except Exception as e:  # noqa: BLE001 - reported per member
+                return [{**m, "status": "failed", "error": str(e)} for m, _, _ in chunk]
+
+            errors = {}
+            for part in (response.value if response else None) or []:
+                if part.error:
+                    errors[part.user_id] = part.error.message or part.error.code
+            return [
+                {**m, "status": "failed", "error": errors[uid]}
+                if uid in errors
+                else {**m, "status": "added"}
+                for m, uid, _ in chunk
+            ]
+
+        chunks = [
+            pending[start : start + MEMBERS_ADD_CHUNK_SIZE]
+            for start in range(0, len(pending), MEMBERS_ADD_CHUNK_SIZE)
+        ]
+        for chunk_results in await asyncio.gather(*(add_chunk(c) for c in chunks)):
+            results.extend(chunk_results)
+
+        failed = [
+            {"user": r["user"], "role": r.get("role", "member"), "error": r["error"]}
+            for r in results
+            if r["status"] == "failed"
+        ]
+        return {
+            "team_id": team_id,
+            "added": len(results) - len(failed),
+            "failed": failed,
+            "results": results,
+        }
+
+    async def _broadcast_channel_message(self, channels: list[dict], message: str) -> dict:
+        """Post the same message to many channels under a concurrency limit"""
+        fan_out = FanOut(concurrency=self.settings.broadcast_concurrency)
+
+        async def post(target: dict) -> None:
+            try:
+                sent = await self._send_channel_message(
+                    target["team_id"], target["channel_id"], message
+                )
+                fan_out.emit({**target, "status": "sent", "message_id": sent["message_id"]})
+            except Exception as e:  # noqa: BLE001 - reported per channel
+                fan_out.emit({**target, "status": "failed", "error": str(e)})
+
+        for target in channels:
+            fan_out.submit(post, target)
+        outcome = await fan_out.run()
+
+        failed = [
+            {"team_id": r["team_id"], "channel_id": r["channel_id"], "error": r["error"]}
+            for r in outcome.items
+            if r["status"] == "failed"
+        ]
+        return {
+            "sent": len(outcome.items) - len(failed),
+            "failed": failed,
+            "results": outcome.items,
+        }
+
     async def _create_channel(self, team_id: str, display_name: str, description: str) -> dict:
         """Create a new channel"""
         from msgraph.generated.models.channel import Channel
@@ -388,6 +1313,17 @@ class M365TeamsServer:
         
         result = await self.client.teams.by_team_id(team_id).channels.post(channel)
         
+        channels = self.cache.get(("channels", team_id))
+        if channels is not MISSING:
+            channels = [*channels, {
+                "id": result.id,
+                "display_name": result.display_name,
+                "description": result.description,
+                "email": result.email,
+            }]
+            self.cache.set(("channels", team_id), channels)
+            self.directory.set_channels(team_id, channels)
+
         return {
             "success": True,
             "channel_id": result.id,
@@ -396,58 +1332,568 @@ class M365TeamsServer:
     
     async def _get_user_presence(self, user_email: str) -> dict:
         """Get user presence information"""
-        # First get user ID from email
-        users = await self.client.users.get(filter=f"mail eq '{user_email}'")
-        if not users or not users.value:
-            raise ValueError(f"User not found: {user_email}")
+        user_id = await self._resolve_user_id(user_email)
         
-        user_id = users.value[0].id
+        presence = self.presence_cache.get(user_id)
+        if presence is MISSING or presence is None:
+            result = await self.client.users.by_user_id(user_id).presence.get()
+            presence = {"availability": result.availability, "activity": result.activity}
+            self.presence_cache.set(user_id, presence)
         
-        presence = await self.client.users.by_user_id(user_id).presence.get()
+        return {"user_email": user_email, **presence}
+
+    async def _get_users_presence(self, users: list[str]) -> dict:
+        """Get presence for many users, given as email addresses or user IDs"""
+        emails = [user for user in users if "@" in user]
+        user_ids = await self.users.resolve_many(emails) if emails else {}
+        for user in users:
+            if "@" not in user:
+                user_ids[user] = user
         
-        return {
-            "user_email": user_email,
-            "availability": presence.availability,
-            "activity": presence.activity,
-        }
+        wanted = list(dict.fromkeys(uid for uid in user_ids.values() if uid))
+        presences = {}
+        missing = []
+        for user_id in wanted:
+            cached = self.presence_cache.get(user_id)
+            if cached is MISSING:
+                missing.append(user_id)
+            else:
+                presences[user_id] = cached
+
+        chunks = [
+            missing[start : start + PRESENCE_CHUNK_SIZE]
+            for start in range(0, len(missing), PRESENCE_CHUNK_SIZE)
+        ]
+        for fetched in await asyncio.gather(*(self._fetch_presences(c) for c in chunks)):
+            presences.update(fetched)
+
+        result = {}
+        not_found = []
+        for user in users:
+            presence = presences.get(user_ids.get(user))
+            if presence is None:
+                not_found.append(user)
+            else:
+                result[user] = presence
+        return {"presence": result, "count": len(result), "not_found": not_found}
+
+    async def _fetch_presences(self, user_ids: list[str]) -> dict:
+        """Read presence for up to 650 users in one getPresencesByUserId call"""
+        from msgraph.generated.communications.get_presences_by_user_id import (
+            get_presences_by_user_id_post_request_body as request_body,
+        )
+
+        body = request_body.GetPresencesByUserIdPostRequestBody()
+        body.ids = user_ids
+        response = await self.client.communications.get_presences_by_user_id.post(body)
+
+        found = {}
+        if response and response.value:
+            for presence in response.value:
+                found[presence.id] = {
+                    "availability": presence.availability,
+                    "activity": presence.activity,
+                }
+        for user_id in user_ids:
+            # Unknown IDs are remembered too, so polling them does not hit Graph
+            self.presence_cache.set(user_id, found.get(user_id))
+        return found
     
-    async def _search_messages(self, query: str, limit: int) -> dict:
+    async def _search_messages(
+        self,
+        query: str,
+        limit: int,
+        timeout: float | None = None,
+        team_id: str | None = None,
+        channel_id: str | None = None,
+        author: str | None = None,
+        since: str | None = None,
+        until: str | None = None,
+    ) -> dict:
         """Search for messages across teams"""
-        # Note: This is a simplified implementation
-        # Full text search requires Microsoft Search API
+        if limit < 1:
+            raise ValueError(f"limit must be at least 1, got {limit}")
+        # The index only answers once it holds every channel; before that, search live
+        if self.index and await asyncio.to_thread(self.index.completed_at):
+            messages = await asyncio.to_thread(
+                self.index.search,
+                query,
+                limit,
+                team_id=team_id,
+                channel_id=channel_id,
+                author=author,
+                since=since,
+                until=until,
+            )
+            return {
+                "messages": messages,
+                "count": len(messages),
+                "partial": False,
+                "source": "index",
+            }
+
+        # Without an index, scan the first page of each channel live
         teams = await self._list_teams()
-        
-        all_messages = []
+        needle = query.lower()
+
+        def matches(msg: dict) -> bool:
+            created_at = msg.get("created_at") or ""
+            return (
+                needle in (msg.get("content", "") or "").lower()
+                and (not author or (msg.get("from") or "").lower() == author.lower())
+                and (not since or created_at >= since)
+                and (not until or created_at < until)
+            )
+
+        fan_out = FanOut(
+            concurrency=self.settings.search_concurrency,
+            limit=limit,
+            timeout=timeout if timeout is not None else self.settings.search_timeout,
+        )
+
+        async def search_channel(team: dict, channel: dict) -> None:
+            messages = await self._get_channel_messages(team["id"], channel["id"], limit)
+            for msg in messages.get("messages", []):
+                if matches(msg):
+                    msg["team_name"] = team["display_name"]
+                    msg["channel_name"] = channel["display_name"]
+                    if not fan_out.emit(msg):
+                        return
+
+        async def search_team(team: dict) -> None:
+            channels = await self._get_team_channels(team["id"])
+            for channel in channels.get("channels", []):
+                if not channel_id or channel["id"] == channel_id:
+                    fan_out.submit(search_channel, team, channel)
+
         for team in teams.get("teams", []):
+            if not team_id or team["id"] == team_id:
+                fan_out.submit(search_team, team)
+
+        outcome = await fan_out.run()
+
+        result = {
+            "messages": outcome.items,
+            "count": len(outcome.items),
+            "partial": outcome.partial,
+            "source": "live",
+        }
+        if outcome.errors:
+            result["errors"] = outcome.errors
+        return result
+
+    async def _refresh_index(self, team_id: str | None = None) -> dict:
+        """Pull new and changed messages of every channel into the local index"""
+        if not self.index:
+            raise ValueError("Message index is disabled; set M365_INDEX_PATH to enable it")
+
+        teams = await self._list_teams()
+        fan_out = FanOut(concurrency=self.settings.search_concurrency)
+        added = 0
+
+        async def refresh_channel(team: dict, channel: dict) -> None:
+            nonlocal added
+            synced = await self._sync_channel(team, channel)
+            added += synced["indexed"]
+            fan_out.emit(channel["id"])
+
+        async def refresh_team(team: dict) -> None:
             channels = await self._get_team_channels(team["id"])
             for channel in channels.get("channels", []):
-                messages = await self._get_channel_messages(
-                    team["id"], 
-                    channel["id"], 
-                    limit
-                )
-                for msg in messages.get("messages", []):
-                    if query.lower() in (msg.get("content", "") or "").lower():
-                        msg["team_name"] = team["display_name"]
-                        msg["channel_name"] = channel["display_name"]
-                        all_messages.append(msg)
-        
-        return {
-            "messages": all_messages[:limit],
-            "count": len(all_messages[:limit]),
+                fan_out.submit(refresh_channel, team, channel)
+
+        for team in teams.get("teams", []):
+            if not team_id or team["id"] == team_id:
+                fan_out.submit(refresh_team, team)
+
+        outcome = await fan_out.run()
+        if not team_id and not outcome.errors and not outcome.partial:
+            await asyncio.to_thread(self.index.mark_complete)
+
+        result: dict[str, Any] = {
+            "channels_refreshed": len(outcome.items),
+            "messages_added": added,
+            "partial": outcome.partial,
         }
+        if outcome.errors:
+            result["errors"] = outcome.errors
+        return result
+
+    async def _list_directory_users(self, limit: int) -> list[dict]:
+        """Up to ``limit`` users of the tenant, read in pages of 999"""
+        from kiota_abstractions.base_request_configuration import RequestConfiguration
+        from msgraph.generated.models.user_collection_response import UserCollectionResponse
+        from msgraph.generated.users.users_request_builder import UsersRequestBuilder
+
+        builder = self.client.users
+
+        async def fetch(page_url: str | None) -> Any:
+            if page_url:
+                return await self._graph_get(builder.with_url(page_url), UserCollectionResponse)
+            query = UsersRequestBuilder.UsersRequestBuilderGetQueryParameters(
+                top=DIRECTORY_USERS_PAGE_SIZE,
+                select=["id", "displayName", "mail", "userPrincipalName"],
+            )
+            return await self._graph_get(
+                builder, UserCollectionResponse, RequestConfiguration(query_parameters=query)
+            )
+
+        users: list[dict] = []
+        pages = iter_pages(fetch)
+        async for items, _, _ in pages:
+            for user in items:
+                users.append({
+                    "id": user.id,
+                    "display_name": user.display_name,
+                    "mail": user.mail,
+                    "user_principal_name": user.user_principal_name,
+                })
+            if len(users) >= limit:
+                break
+        await pages.aclose()
+        return users[:limit]
+
+    async def _refresh_directory(self) -> dict:
+        """Re-read every team and channel, and users if enabled, into the directory and save
+        its snapshot
+        """
+        self.cache.invalidate(lambda key: key[0] in ("teams", "channels"))
+        teams = (await self._list_teams())["teams"]
+        fan_out = FanOut(concurrency=self.settings.search_concurrency)
+        channels: dict[str, list[dict]] = {}
+
+        async def read_channels(team: dict) -> None:
+            channels[team["id"]] = (await self._get_team_channels(team["id"]))["channels"]
+            fan_out.emit(team["id"])
+
+        for team in teams:
+            fan_out.submit(read_channels, team)
+        outcome = await fan_out.run()
+        for team in teams:
+            # Keep what the last snapshot knew about teams whose channels could not be read
+            if team["id"] not in channels and team["id"] in self.directory.channels:
+                channels[team["id"]] = self.directory.channels[team["id"]]
+
+        users = None
+        if self.settings.directory_max_users and self.list_users:
+            try:
+                users = await self._list_directory_users(self.settings.directory_max_users)
+            except Exception as e:
+                if _error_status(e) != 403:
+                    raise
+                # Missing User.Read.All will not fix itself before the next refresh
+                logger.warning("Not allowed to list users; leaving them out of the directory")
+                self.list_users = False
+        self.directory.replace(teams, channels, users)
+        await asyncio.to_thread(self.directory.save)
+
+        result: dict = self.directory.status()
+        if outcome.errors:
+            result["errors"] = outcome.errors
+        return result
+
+    def _invalidate_cache(self, scope: str = "all", team_id: str | None = None) -> dict:
+        """Drop cached directory entries"""
+        if scope not in ("all", "teams", "channels", "users"):
+            raise ValueError(f"Unknown cache scope: {scope}")
+
+        dropped = 0
+        if scope in ("all", "teams"):
+            dropped += self.cache.invalidate(lambda key: key[0] == "teams")
+        if scope in ("all", "channels"):
+            dropped += self.cache.invalidate(
+                lambda key: key[0] == "channels" and (not team_id or key[1] == team_id)
+            )
+        if scope in ("all", "users"):
+            dropped += len(self.users)
+            self.users.invalidate()
+
+        return {"success": True, "scope": scope, "invalidated": dropped}
+
+    async def _get_index_status(self) -> dict:
+        """Report local index freshness"""
+        status: dict[str, Any] = {"enabled": bool(self.index)}
+        if self.index:
+            status.update(await asyncio.to_thread(self.index.status))
+        status["sync"] = await asyncio.to_thread(self.delta.status)
+        if self.notifications:
+            status["notifications"] = {
+                **self.notifications.stats,
+                "subscriptions": len(self.subscriptions),
+            }
+        return status
+
+    def _tenant_for_id(self, tenant_id: str | None) -> str:
+        """Name of the configured tenant with this Azure AD tenant id, else the default"""
+        for name, config in self.tenants.configs.items():
+            if config.tenant_id == tenant_id:
+                return name
+        return DEFAULT_TENANT
+
+    async def _apply_notification(self, notification: dict) -> None:
+        """Invalidate or resync whatever a change notification touched"""
+        with self._use_tenant(self._tenant_for_id(notification.get("tenantId"))):
+            target = parse_resource(notification.get("resource", ""))
+            team_id, channel_id = target["team_id"], target["channel_id"]
+            if not team_id:
+                return
+            if target["message_id"]:
+                await self._sync_notified_channel(team_id, channel_id)
+            elif channel_id:
+                self._invalidate_cache("channels", team_id)
+            else:
+                self._invalidate_cache("teams")
+                self._invalidate_cache("channels", team_id)
+
+    async def _sync_notified_channel(self, team_id: str, channel_id: str) -> None:
+        """Delta-sync a channel a message notification named, if anything local tracks it.
+
+        Notifications arriving before a queued sync starts are folded into it.
+        """
+        key = (self.tenant.name, team_id, channel_id)
+        if key in self._pending_syncs:
+            return
+        # Claimed before the first await so a concurrent notification cannot queue a second sync
+        self._pending_syncs.add(key)
+        try:
+            tracked = await asyncio.to_thread(self.delta.delta_link, team_id, channel_id)
+            if not self.index and not tracked:
+                return
+            await self._ensure_client()
+            # Wait out a sync already running; this one starts once the channel is free
+            async with self._sync_locks.setdefault((team_id, channel_id), asyncio.Lock()):
+                pass
+        finally:
+            self._pending_syncs.discard(key)
+        await self._sync_channel({"id": team_id}, {"id": channel_id})
+
+    async def _handle_lifecycle(self, notification: dict) -> None:
+        """Renew, forget or resync after a subscription lifecycle event"""
+        event = notification["lifecycleEvent"]
+        subscription_id = notification.get("subscriptionId")
+        resource = next(
+            (r for r, sub in self.subscriptions.items() if sub["id"] == subscription_id), None
+        )
+        if event == "reauthorizationRequired" and resource:
+            await self._ensure_client()
+            await self._renew_subscription(resource)
+        elif event == "subscriptionRemoved" and resource:
+            # Recreated by the next subscription check
+            del self.subscriptions[resource]
+        elif event == "missed":
+            self._invalidate_cache("teams")
+            self._invalidate_cache("channels")
+            if self.index:
+                await self._ensure_client()
+                await self._refresh_index()
+
+    def _subscription_expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(minutes=self.settings.subscription_minutes)
+
+    async def _create_subscription(self, resource: str) -> None:
+        from msgraph.generated.models.subscription import Subscription
+
+        if self.notifications is None:
+            raise ValueError("Change notifications are disabled; set M365_NOTIFICATION_PORT")
+        expires = self._subscription_expiry()
+        result = await self.client.subscriptions.post(
+            Subscription(
+                change_type="created,updated,deleted",
+                notification_url=self.settings.notification_url,
+                lifecycle_notification_url=self.settings.notification_url,
+                resource=resource,
+                expiration_date_time=expires,
+                client_state=self.notifications.client_state,
+            )
+        )
+        self.subscriptions[resource] = {"id": result.id, "expires": expires.timestamp()}
+
+    async def _renew_subscription(self, resource: str) -> None:
+        from msgraph.generated.models.subscription import Subscription
+
+        expires = self._subscription_expiry()
+        subscription = self.subscriptions[resource]
+        await self.client.subscriptions.by_subscription_id(subscription["id"]).patch(
+            Subscription(expiration_date_time=expires)
+        )
+        subscription["expires"] = expires.timestamp()
+
+    async def _sync_subscriptions(self) -> None:
+        """Subscribe to channel and message changes of every team and renew expiring ones"""
+        teams = await self._list_teams()
+        wanted = set()
+        for team in teams.get("teams", []):
+            wanted.add(f"/teams/{team['id']}/channels")
+            wanted.add(f"/teams/{team['id']}/channels/getAllMessages")
+
+        renew_before = time.time() + 2 * SUBSCRIPTION_CHECK_INTERVAL
+        for resource in sorted(wanted | set(self.subscriptions)):
+            try:
+                subscription = self.subscriptions.get(resource)
+                if subscription is None:
+                    await self._create_subscription(resource)
+                elif resource not in wanted:
+                    del self.subscriptions[resource]
+                    await self.client.subscriptions.by_subscription_id(subscription["id"]).delete()
+                elif subscription["expires"] < renew_before:
+                    await self._renew_subscription(resource)
+            except Exception:
+                logger.exception("Could not maintain the subscription to %s", resource)
+
+    async def _subscription_loop(self) -> None:
+        """Keep change-notification subscriptions alive"""
+        while True:
+            try:
+                await self._ensure_client()
+                await self._sync_subscriptions()
+            except Exception:
+                logger.exception("Subscription check failed")
+            await asyncio.sleep(SUBSCRIPTION_CHECK_INTERVAL)
+
+    async def _serve_notifications(self) -> None:
+        """Receive Graph change notifications"""
+        if self.notifications is None:
+            return
+        try:
+            await self.notifications.serve(
+                self.settings.notification_host, self.settings.notification_port
+            )
+        except OSError:
+            logger.exception("Could not start the notification receiver")
+
+    async def _index_refresh_loop(self) -> None:
+        """Periodically refresh the local index in the background"""
+        while True:
+            try:
+                await self._ensure_client()
+                await self._refresh_index()
+            except Exception:
+                logger.exception("Background index refresh failed")
+            await asyncio.sleep(self.settings.index_refresh_interval)
+
+    async def _directory_refresh_loop(self) -> None:
+        """Load the directory snapshot for a warm start, then re-read it periodically"""
+        interval = self.settings.directory_refresh_interval
+        if await asyncio.to_thread(self.directory.load):
+            # Serve the snapshot's teams and channels until the first refresh replaces them
+            self.cache.set(("teams",), self.directory.teams)
+            for team_id, channels in self.directory.channels.items():
+                self.cache.set(("channels", team_id), channels)
+        if interval <= 0:
+            return
+        age = self.directory.age()
+        if age is not None and age < interval:
+            await asyncio.sleep(interval - age)
+        while True:
+            try:
+                await self._ensure_client()
+                await self._refresh_directory()
+            except Exception:
+                logger.exception("Directory refresh failed")
+            await asyncio.sleep(interval)
+
+    async def _outbox_loop(self) -> None:
+        """Deliver queued messages: in queue order within a channel, to at most
+        outbox_concurrency channels at once and at most one post per channel every
+        outbox_channel_interval seconds
+        """
+        outbox = self.outbox
+        await asyncio.to_thread(outbox.recover)
+        busy: set[tuple[str, str]] = set()
+        last_post: dict[tuple[str, str], float] = {}
+        senders: set[asyncio.Task] = set()
+        pruned_at = 0.0
+
+        def finished(task: asyncio.Task, channel: tuple[str, str]) -> None:
+            senders.discard(task)
+            busy.discard(channel)
+            last_post[channel] = time.time()
+            outbox.ready.set()
+
+        try:
+            while True:
+                now = time.time()
+                if now - pruned_at >= OUTBOX_PRUNE_INTERVAL:
+                    await asyncio.to_thread(outbox.prune, self.settings.outbox_retention)
+                    pruned_at = now
+                interval = self.settings.outbox_channel_interval
+                for channel, posted_at in list(last_post.items()):
+                    if now - posted_at >= interval:
+                        del last_post[channel]
+
+                outbox.ready.clear()
+                entries = await asyncio.to_thread(
+                    outbox.claim,
+                    now,
+                    self.settings.outbox_concurrency - len(busy),
+                    busy | set(last_post),
+                )
+                for entry in entries:
+                    channel = (entry["team_id"], entry["channel_id"])
+                    busy.add(channel)
+                    task = asyncio.create_task(self._deliver(entry))
+                    senders.add(task)
+                    task.add_done_callback(functools.partial(finished, channel=channel))
+
+                try:
+                    await asyncio.wait_for(
+                        outbox.ready.wait(), min(OUTBOX_POLL_INTERVAL, interval or math.inf)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for task in senders:
+                task.cancel()
+            await asyncio.gather(*senders, return_exceptions=True)
+
+    async def _serve_metrics(self) -> None:
+        """Expose metrics for Prometheus scraping"""
+        try:
+            await serve_prometheus(
+                self.metrics, self.settings.metrics_host, self.settings.metrics_port
+            )
+        except OSError:
+            logger.exception("Could not start the metrics endpoint")
     
-    async def run(self):
+    async def run(self) -> None:
         """Run the MCP server"""
-        async with stdio_server() as (read_stream, write_stream):
-            await self.app.run(
-                read_stream,
-                write_stream,
-                self.app.create_initialization_options()
-            )
+        self._serving = True
+        if self.settings.eager_init and self.settings.token_refresh_margin > 0:
+            # Initializes the client and fetches the first token while the client connects
+            self._start_background(self._token_refresh_loop)
+        elif self.settings.eager_init:
+            self._start_background(self._warm_up)
+        if self.index and self.settings.index_refresh_interval > 0:
+            self._start_background(self._index_refresh_loop)
+        if self.settings.metrics_port:
+            self._start_background(self._serve_metrics)
+        if self.outbox:
+            # Delivers what earlier runs left queued, even before the first tool call
+            self._start_background(self._outbox_loop)
+        if self.notifications:
+            self._start_background(self._serve_notifications)
+            if self.settings.notification_url:
+                self._start_background(self._subscription_loop)
+        try:
+            if self.settings.transport == "http":
+                # Sessions share this process's tenants, caches and throttle scheduler
+                await serve_http(self.app, self.settings)
+            else:
+                async with stdio_server() as (read_stream, write_stream):
+                    await self.app.run(
+                        read_stream,
+                        write_stream,
+                        self.app.create_initialization_options()
+                    )
+        finally:
+            self._serving = False
+            for task in self._background.values():
+                task.cancel()
+            await asyncio.gather(*self._background.values(), return_exceptions=True)
+            self._background.clear()
 
 
-async def main():
+async def main() -> None:
     """Main entry point"""
     server = M365TeamsServer()
     await server.run()
@@ -0,0 +1,57 @@
+"""
+Single-flight deduplication of identical concurrent reads
+"""
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; callers arriving while it is in flight
+    share its result or exception.
+
+    The call runs in its own task, so one caller being cancelled does not cancel it for
+    the others; it is cancelled only when every caller waiting on it has gone.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, _Flight] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of ``call()``, or of the identical call already in flight under ``key``"""
+        flight = self._flights.get(key)
+        if flight is None:
+            self.calls += 1
+            flight = self._flights[key] = _Flight(asyncio.ensure_future(call()))
+            flight.task.add_done_callback(lambda _: self._land(key, flight))
+        else:
+            self.shared += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                flight.task.cancel()
+                self._land(key, flight)
+
+    def _land(self, key: Hashable, flight: _Flight) -> None:
+        # Later calls start a fresh flight rather than reuse a finished or abandoned one
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._flights)}
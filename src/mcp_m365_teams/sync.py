@@ -0,0 +1,218 @@
+"""
+Persisted delta-query state and change log for channel messages
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS delta_links (
+    team_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    delta_link TEXT NOT NULL,
+    synced_at TEXT NOT NULL,
+    pruned_through INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, channel_id)
+);
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    team_id TEXT NOT NULL,
+    channel_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    change TEXT NOT NULL,
+    message TEXT,
+    recorded_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_channel ON changes (team_id, channel_id, seq);
+"""
+
+
+def _utcnow() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def decode_change_cursor(cursor: str) -> int:
+    """Parse a change cursor returned by ``DeltaStore.changes_since``"""
+    try:
+        seq = int(cursor)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if seq < 0:
+        raise ValueError("Invalid cursor")
+    return seq
+
+
+class DeltaStore:
+    """SQLite store of per-channel delta links and the changes each sync brought in.
+
+    Every change gets a monotonically increasing sequence number, which callers
+    use as their cursor. At most ``max_changes`` changes are kept per channel;
+    older ones are pruned.
+    """
+
+    def __init__(self, path: str = ":memory:", max_changes: int = 10000):
+        self.path = path
+        self.max_changes = max_changes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the underlying database"""
+        with self._lock:
+            self._conn.close()
+
+    def delta_link(self, team_id: str, channel_id: str) -> str | None:
+        """The deltaLink to resume a channel's sync from, if it was synced before"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT delta_link FROM delta_links WHERE team_id = ? AND channel_id = ?",
+                (team_id, channel_id),
+            ).fetchone()
+        return row["delta_link"] if row else None
+
+    def record(
+        self,
+        team_id: str,
+        channel_id: str,
+        changes: list[dict],
+        delta_link: str | None,
+        resync: bool = False,
+    ) -> int:
+        """Append a sync round's changes and store its deltaLink in one transaction.
+
+        Each change is ``{"id", "change": "upserted" | "deleted", "message"}``.
+        With ``resync`` (a full sync after Graph rejected the stored deltaLink), the
+        channel's old link and changes are dropped and every cursor from before this
+        round is reported as expired. Returns the number of changes recorded.
+        """
+        now = _utcnow()
+        with self._lock, self._conn:
+            if resync:
+                # Sequence number the first change of this round gets
+                last = self._conn.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'changes'"
+                ).fetchone()
+                resynced_from = (last["seq"] if last else 0) + 1
+                for table in ("changes", "delta_links"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE team_id = ? AND channel_id = ?",
+                        (team_id, channel_id),
+                    )
+            self._conn.executemany(
+                """
+                INSERT INTO changes (team_id, channel_id, message_id, change, message, recorded_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        team_id,
+                        channel_id,
+                        change["id"],
+                        change["change"],
+                        json.dumps(change["message"]) if change.get("message") else None,
+                        now,
+                    )
+                    for change in changes
+                ],
+            )
+            if delta_link:
+                self._conn.execute(
+                    """
+                    INSERT INTO delta_links (team_id, channel_id, delta_link, synced_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (team_id, channel_id) DO UPDATE SET
+                        delta_link = excluded.delta_link,
+                        synced_at = excluded.synced_at
+                    """,
+                    (team_id, channel_id, delta_link, now),
+                )
+            if resync:
+                self._conn.execute(
+                    """
+                    UPDATE delta_links SET pruned_through = ?
+                    WHERE team_id = ? AND channel_id = ?
+                    """,
+                    (resynced_from, team_id, channel_id),
+                )
+            cutoff = self._conn.execute(
+                """
+                SELECT seq FROM changes WHERE team_id = ? AND channel_id = ?
+                ORDER BY seq DESC LIMIT 1 OFFSET ?
+                """,
+                (team_id, channel_id, self.max_changes),
+            ).fetchone()
+            if cutoff:
+                self._conn.execute(
+                    "DELETE FROM changes WHERE team_id = ? AND channel_id = ? AND seq <= ?",
+                    (team_id, channel_id, cutoff["seq"]),
+                )
+                self._conn.execute(
+                    """
+                    UPDATE delta_links SET pruned_through = ?
+                    WHERE team_id = ? AND channel_id = ?
+                    """,
+                    (cutoff["seq"], team_id, channel_id),
+                )
+        return len(changes)
+
+    def changes_since(
+        self, team_id: str, channel_id: str, after: int = 0, limit: int = 100
+    ) -> dict:
+        """Changes of a channel with a sequence number above ``after``, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT seq, message_id, change, message, recorded_at FROM changes
+                WHERE team_id = ? AND channel_id = ? AND seq > ?
+                ORDER BY seq LIMIT ?
+                """,
+                (team_id, channel_id, after, limit + 1),
+            ).fetchall()
+            pruned = self._conn.execute(
+                "SELECT pruned_through FROM delta_links WHERE team_id = ? AND channel_id = ?",
+                (team_id, channel_id),
+            ).fetchone()
+
+        changes = [
+            {
+                "id": row["message_id"],
+                "change": row["change"],
+                "message": json.loads(row["message"]) if row["message"] else None,
+                "recorded_at": row["recorded_at"],
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            "changes": changes,
+            "count": len(changes),
+            "cursor": str(rows[:limit][-1]["seq"] if rows else after),
+            "has_more": len(rows) > limit,
+            # Some changes after the cursor were pruned, or the channel was resynced in
+            # full since; the caller should rebuild its state from these changes
+            "cursor_expired": bool(pruned and after < pruned["pruned_through"]),
+        }
+
+    def status(self) -> dict:
+        """Summarize synced channels and change-log size"""
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT COUNT(*) AS channels, MIN(synced_at) AS oldest_sync,
+                       MAX(synced_at) AS newest_sync
+                FROM delta_links
+                """
+            ).fetchone()
+            changes = self._conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+        return {
+            "path": self.path,
+            "channels": row["channels"],
+            "changes": changes,
+            "oldest_sync": row["oldest_sync"],
+            "newest_sync": row["newest_sync"],
+        }
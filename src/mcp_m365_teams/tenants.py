@@ -0,0 +1,171 @@
+"""
+Per-tenant Graph clients, caches and throttle budgets, pooled by tenant and credential
+"""
+import asyncio
+import json
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional
+
+from .batching import BatchCoalescer
+from .cache import TTLCache
+from .directory import Directory
+from .index import MessageIndex
+from .outbox import Outbox
+from .scheduler import GraphScheduler
+from .singleflight import SingleFlight
+from .sync import DeltaStore
+from .users import UserDirectory
+
+if TYPE_CHECKING:
+    import httpx
+    from azure.identity import ClientSecretCredential
+    from msgraph import GraphServiceClient
+
+# Name of the tenant configured through M365_TENANT_ID, M365_CLIENT_ID and M365_CLIENT_SECRET
+DEFAULT_TENANT = "default"
+
+
+@dataclass(frozen=True)
+class TenantConfig:
+    """App registration credentials for one named tenant"""
+
+    name: str
+    tenant_id: str
+    client_id: str
+    client_secret: str = field(repr=False)
+
+    @property
+    def key(self) -> tuple[str, str]:
+        """Pool key: names that share a tenant and app registration share one client"""
+        return (self.tenant_id, self.client_id)
+
+
+def load_tenants(path: str) -> dict[str, TenantConfig]:
+    """Read ``{name: {tenant_id, client_id, client_secret}}`` from a JSON file"""
+    with open(path, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    tenants = {}
+    for name, entry in entries.items():
+        if name == DEFAULT_TENANT:
+            raise ValueError(f"Tenant name {DEFAULT_TENANT!r} is reserved in {path}")
+        missing = [key for key in ("tenant_id", "client_id", "client_secret") if not entry.get(key)]
+        if missing:
+            raise ValueError(f"Tenant {name!r} in {path} is missing {', '.join(missing)}")
+        tenants[name] = TenantConfig(
+            name, entry["tenant_id"], entry["client_id"], entry["client_secret"]
+        )
+    return tenants
+
+
+def tenant_path(path: str | None, config: TenantConfig) -> str | None:
+    """Per-tenant variant of a local store path, one per pool key:
+    'index.db' -> 'index.<tenant_id>.<client_id>.db'
+    """
+    if not path or path == ":memory:":
+        return path
+    file = Path(path)
+    return str(file.with_name(f"{file.stem}.{'.'.join(config.key)}{file.suffix}"))
+
+
+@dataclass(eq=False)
+class Tenant:
+    """Graph client and the caches, throttle budget and stores that belong to one tenant"""
+
+    name: str
+    # None for the default tenant, whose credentials are read from the environment
+    config: TenantConfig | None
+    cache: TTLCache
+    presence_cache: TTLCache
+    users: UserDirectory
+    scheduler: GraphScheduler
+    batcher: BatchCoalescer | None
+    index: MessageIndex | None
+    delta: DeltaStore
+    directory: Directory
+    client: Optional["GraphServiceClient"] = None
+    # The HTTP client under ``client``, closed when the tenant is evicted
+    http_client: Optional["httpx.AsyncClient"] = None
+    credential: Optional["ClientSecretCredential"] = None
+    client_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Identical Graph reads in flight at once share one request
+    reads: SingleFlight = field(default_factory=SingleFlight)
+    outbox: Outbox | None = None
+    # Cleared when Graph refuses to list the tenant's users, so refreshes stop asking
+    list_users: bool = True
+    # Tool calls currently using this tenant; busy tenants are never evicted
+    in_use: int = 0
+
+    def close(self) -> None:
+        """Close the tenant's local stores"""
+        if self.index:
+            self.index.close()
+        if self.outbox:
+            self.outbox.close()
+        self.delta.close()
+
+
+class TenantPool:
+    """Tenants created on first use; beyond ``max_size`` named tenants, the least recently
+    used idle ones are evicted. The default tenant is always kept.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str, TenantConfig | None], Tenant],
+        configs: dict[str, TenantConfig],
+        max_size: int = 8,
+        on_evict: Callable[[Tenant], Any] | None = None,
+    ):
+        self._factory = factory
+        self.configs = configs
+        self.max_size = max_size
+        self._on_evict = on_evict
+        self.default = factory(DEFAULT_TENANT, None)
+        self._tenants: OrderedDict[tuple[str, str], Tenant] = OrderedDict()
+        self.evictions = 0
+
+    @property
+    def names(self) -> list[str]:
+        return [DEFAULT_TENANT, *self.configs]
+
+    def acquire(self, name: str) -> Tenant:
+        """The tenant called ``name``, created if needed and marked in use until released"""
+        if name == DEFAULT_TENANT:
+            tenant = self.default
+        else:
+            config = self.configs.get(name)
+            if config is None:
+                raise ValueError(f"Unknown tenant: {name}")
+            if config.key not in self._tenants:
+                self._tenants[config.key] = self._factory(name, config)
+            tenant = self._tenants[config.key]
+            self._tenants.move_to_end(config.key)
+        tenant.in_use += 1
+        self._evict()
+        return tenant
+
+    def release(self, tenant: Tenant) -> None:
+        tenant.in_use -= 1
+        self._evict()
+
+    def _evict(self) -> None:
+        while len(self._tenants) > self.max_size:
+            key = next((key for key, t in self._tenants.items() if not t.in_use), None)
+            if key is None:
+                return
+            tenant = self._tenants.pop(key)
+            self.evictions += 1
+            if self._on_evict:
+                self._on_evict(tenant)
+
+    def stats(self) -> dict:
+        return {
+            "tenants": self.names,
+            "live": [DEFAULT_TENANT, *(tenant.name for tenant in self._tenants.values())],
+            "max_size": self.max_size,
+            "evictions": self.evictions,
+        }
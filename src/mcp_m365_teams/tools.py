@@ -0,0 +1,499 @@
+"""
+Definitions of the tools the server exposes
+"""
+from mcp import types
+
+# Built once at import; list_tools hands out this list unchanged
+TOOLS: list[types.Tool] = [
+    types.Tool(
+        name="list_teams",
+        description="List all teams the user is a member of",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": (
+                        "Only return these fields (default: id, display_name, description)"
+                    ),
+                },
+            },
+        },
+    ),
+    types.Tool(
+        name="get_team_channels",
+        description="Get all channels in a specific team",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": (
+                        "Only return these fields "
+                        "(default: id, display_name, description, email)"
+                    ),
+                },
+            },
+            "required": ["team_id"],
+        },
+    ),
+    types.Tool(
+        name="send_channel_message",
+        description=(
+            "Send a message to a Teams channel; with the outbox enabled it is queued and "
+            "delivered in the background"
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "channel_id": {
+                    "type": "string",
+                    "description": "ID or display name of the channel",
+                },
+                "message": {
+                    "type": "string",
+                    "description": "The message content",
+                },
+                "idempotency_key": {
+                    "type": "string",
+                    "description": (
+                        "With the outbox enabled, retrying with the same key never posts twice; "
+                        "a key cannot be reused for another message (default: a new key per "
+                        "call); a post that may have landed despite an error is marked "
+                        "unknown instead of being sent again"
+                    ),
+                },
+            },
+            "required": ["team_id", "channel_id", "message"],
+        },
+    ),
+    types.Tool(
+        name="broadcast_channel_message",
+        description="Send the same message to many Teams channels",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "channels": {
+                    "type": "array",
+                    "description": "Target channels; pass a previous call's 'failed' list to retry",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "team_id": {"type": "string"},
+                            "channel_id": {"type": "string"},
+                        },
+                        "required": ["team_id", "channel_id"],
+                    },
+                },
+                "message": {
+                    "type": "string",
+                    "description": "The message content",
+                },
+            },
+            "required": ["channels", "message"],
+        },
+    ),
+    types.Tool(
+        name="get_channel_messages",
+        description="Get recent messages from a Teams channel",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "channel_id": {
+                    "type": "string",
+                    "description": "ID or display name of the channel",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of messages to retrieve (default: 10)",
+                    "minimum": 1,
+                    "default": 10,
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": "next_cursor from a previous call, to continue where it stopped",
+                },
+                "fields": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": (
+                        "Only return these fields (default: id, content, from, created_at)"
+                    ),
+                },
+            },
+            "required": ["team_id", "channel_id"],
+        },
+    ),
+    types.Tool(
+        name="get_channel_changes",
+        description=(
+            "Get messages created, edited or deleted in a channel since a cursor, "
+            "using Graph delta queries. When the result has cursor_expired, changes were "
+            "lost (pruned, or the channel was resynced in full): rebuild from the result"
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "channel_id": {
+                    "type": "string",
+                    "description": "ID or display name of the channel",
+                },
+                "cursor": {
+                    "type": "string",
+                    "description": (
+                        "The 'cursor' of a previous call; omit to start from the beginning"
+                    ),
+                },
+                "limit": {
+                    "type": "number",
+                    "description": "Maximum number of changes to return (default: 50)",
+                    "minimum": 1,
+                    "default": 50,
+                },
+            },
+            "required": ["team_id", "channel_id"],
+        },
+    ),
+    types.Tool(
+        name="create_team",
+        description="Create a new Microsoft Team",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "display_name": {
+                    "type": "string",
+                    "description": "The name of the team",
+                },
+                "description": {
+                    "type": "string",
+                    "description": "Description of the team",
+                },
+            },
+            "required": ["display_name"],
+        },
+    ),
+    types.Tool(
+        name="add_team_member",
+        description="Add a member to a team",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "user_email": {
+                    "type": "string",
+                    "description": "Email address or display name of the user to add",
+                },
+                "role": {
+                    "type": "string",
+                    "description": "Role: 'owner' or 'member' (default: member)",
+                    "default": "member",
+                },
+            },
+            "required": ["team_id", "user_email"],
+        },
+    ),
+    types.Tool(
+        name="add_team_members",
+        description="Add many members to a team in bulk",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "members": {
+                    "type": "array",
+                    "description": "Members to add; pass a previous call's 'failed' list to retry",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "user": {
+                                "type": "string",
+                                "description": "Email address, user ID or display name",
+                            },
+                            "role": {
+                                "type": "string",
+                                "description": "Role: 'owner' or 'member' (default: member)",
+                                "default": "member",
+                            },
+                        },
+                        "required": ["user"],
+                    },
+                },
+            },
+            "required": ["team_id", "members"],
+        },
+    ),
+    types.Tool(
+        name="create_channel",
+        description="Create a new channel in a team",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": "ID or display name of the team",
+                },
+                "display_name": {
+                    "type": "string",
+                    "description": "The name of the channel",
+                },
+                "description": {
+                    "type": "string",
+                    "description": "Description of the channel",
+                },
+            },
+            "required": ["team_id", "display_name"],
+        },
+    ),
+    types.Tool(
+        name="get_user_presence",
+        description="Get presence information for a user",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "user_email": {
+                    "type": "string",
+                    "description": "Email address or display name of the user",
+                },
+            },
+            "required": ["user_email"],
+        },
+    ),
+    types.Tool(
+        name="get_users_presence",
+        description="Get presence information for many users at once",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "users": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Email addresses, user IDs or display names",
+                },
+            },
+            "required": ["users"],
+        },
+    ),
+    types.Tool(
+        name="search_messages",
+        description="Search for messages across all teams",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Maximum number of results (default: 10)",
+                    "minimum": 1,
+                    "default": 10,
+                },
+                "timeout_seconds": {
+                    "type": "number",
+                    "description": "Search deadline; partial results are returned when it passes",
+                },
+                "team_id": {
+                    "type": "string",
+                    "description": "Only search this team (ID or display name)",
+                },
+                "channel_id": {
+                    "type": "string",
+                    "description": "Only search this channel (ID or display name)",
+                },
+                "author": {
+                    "type": "string",
+                    "description": "Only return messages from this display name",
+                },
+                "since": {
+                    "type": "string",
+                    "description": "Only return messages at or after this ISO 8601 time",
+                },
+                "until": {
+                    "type": "string",
+                    "description": "Only return messages before this ISO 8601 time",
+                },
+            },
+            "required": ["query"],
+        },
+    ),
+    types.Tool(
+        name="refresh_index",
+        description="Pull new channel messages into the local search index",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "team_id": {
+                    "type": "string",
+                    "description": (
+                        "Only refresh this team, by ID or display name (default: all teams)"
+                    ),
+                },
+            },
+        },
+    ),
+    types.Tool(
+        name="get_index_status",
+        description="Report size and freshness of the local search index",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        },
+    ),
+    types.Tool(
+        name="lookup_directory",
+        description=(
+            "Find teams, channels and users by name, prefix or near spelling in the local "
+            "directory snapshot, without calling Graph"
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "name": {
+                    "type": "string",
+                    "description": "Display name, prefix of it or email address",
+                },
+                "kind": {
+                    "type": "string",
+                    "enum": ["team", "channel", "user"],
+                    "description": "Only return this kind of entry (default: all kinds)",
+                },
+                "team_id": {
+                    "type": "string",
+                    "description": "Only return channels of this team",
+                },
+            },
+            "required": ["name"],
+        },
+    ),
+    types.Tool(
+        name="get_outbox_status",
+        description="Report outbox queue depth and the delivery status of a queued message",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "outbox_id": {
+                    "type": "string",
+                    "description": "outbox_id returned by send_channel_message",
+                },
+                "idempotency_key": {
+                    "type": "string",
+                    "description": "Look the message up by its idempotency key instead",
+                },
+            },
+        },
+    ),
+    types.Tool(
+        name="get_cache_stats",
+        description="Report hit rates and sizes of the team, channel and user caches",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        },
+    ),
+    types.Tool(
+        name="invalidate_cache",
+        description="Drop cached teams, channels or users so they are re-read",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "scope": {
+                    "type": "string",
+                    "enum": ["all", "teams", "channels", "users"],
+                    "description": "What to invalidate (default: all)",
+                    "default": "all",
+                },
+                "team_id": {
+                    "type": "string",
+                    "description": "With scope 'channels', only this team's channels",
+                },
+            },
+        },
+    ),
+    types.Tool(
+        name="get_continuation",
+        description="Get the next part of a result truncated to fit the response budget",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "continuation": {
+                    "type": "string",
+                    "description": "A previous result's truncated.continuation handle",
+                },
+            },
+            "required": ["continuation"],
+        },
+    ),
+    types.Tool(
+        name="get_throttle_stats",
+        description="Report Graph throttling, retry and queueing statistics",
+        inputSchema={
+            "type": "object",
+            "properties": {},
+        },
+    ),
+    types.Tool(
+        name="get_metrics",
+        description="Report tool and Graph request latency, error, throttling and traffic metrics",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "format": {
+                    "type": "string",
+                    "enum": ["json", "prometheus"],
+                    "description": "Output format (default: json)",
+                    "default": "json",
+                },
+            },
+        },
+    ),
+    types.Tool(
+        name="select_tenant",
+        description=(
+            "Select the tenant later calls in this session use, or list the configured tenants"
+        ),
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "tenant": {
+                    "type": "string",
+                    "description": "Tenant name; omit to report the current selection",
+                },
+            },
+        },
+    ),
+]
+
+# Tools whose results do not depend on the tenant
+UNSCOPED_TOOLS = {"get_continuation", "get_metrics", "select_tenant"}
+
+for _tool in TOOLS:
+    if _tool.name not in UNSCOPED_TOOLS:
+        _tool.inputSchema["properties"]["tenant"] = {
+            "type": "string",
+            "description": "Tenant to act on (default: the session's selected tenant)",
+        }
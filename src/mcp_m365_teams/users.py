@@ -0,0 +1,82 @@
+"""
+Cached email to user-id resolution shared by all user-facing tools
+"""
+import asyncio
+import time
+from collections.abc import Awaitable, Callable, Iterable
+
+from .cache import MISSING, TTLCache
+
+# Graph rejects $filter expressions with more than 15 OR-ed clauses
+LOOKUP_CHUNK_SIZE = 15
+
+Lookup = Callable[[list[str]], Awaitable[dict[str, str]]]
+
+
+def mail_filter(emails: Iterable[str]) -> str:
+    """Build an OData filter matching any of ``emails``"""
+    return " or ".join(f"mail eq '{email.replace(chr(39), chr(39) * 2)}'" for email in emails)
+
+
+class UserDirectory:
+    """LRU/TTL cache in front of a bulk email -> user-id lookup.
+
+    ``lookup`` receives up to ``LOOKUP_CHUNK_SIZE`` lower-cased addresses and
+    returns the ones it found, keyed by lower-cased address. Addresses it does
+    not return are cached as unknown for ``negative_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        lookup: Lookup,
+        max_size: int = 5000,
+        ttl: float = 3600.0,
+        negative_ttl: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._lookup = lookup
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(max_size=max_size, ttl=ttl, clock=clock)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    async def resolve(self, email: str) -> str | None:
+        """Return the user id for ``email``, or None when no such user exists"""
+        return (await self.resolve_many([email]))[email]
+
+    async def resolve_many(self, emails: Iterable[str]) -> dict[str, str | None]:
+        """Resolve many addresses, fetching all cache misses in concurrent bulk lookups"""
+        emails = list(emails)
+        found: dict[str, str | None] = {}
+        missing: list[str] = []
+        for key in dict.fromkeys(email.lower() for email in emails):
+            cached = self.cache.get(key)
+            if cached is MISSING:
+                missing.append(key)
+            else:
+                found[key] = cached
+
+        chunks = [
+            missing[start : start + LOOKUP_CHUNK_SIZE]
+            for start in range(0, len(missing), LOOKUP_CHUNK_SIZE)
+        ]
+        for chunk, result in zip(chunks, await asyncio.gather(*map(self._lookup, chunks))):
+            resolved = {k.lower(): v for k, v in result.items()}
+            for key in chunk:
+                found[key] = resolved.get(key)
+                self.put(key, found[key])
+
+        return {email: found[email.lower()] for email in emails}
+
+    def put(self, email: str, user_id: str | None) -> None:
+        """Cache a resolution; ``user_id`` None records that the user does not exist"""
+        self.cache.set(email.lower(), user_id, None if user_id is not None else self.negative_ttl)
+
+    def invalidate(self, email: str | None = None) -> None:
+        """Drop one address, or the whole cache"""
+        if email is None:
+            self.cache.invalidate()
+        else:
+            key = email.lower()
+            self.cache.invalidate(lambda cached: cached == key)
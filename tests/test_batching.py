@@ -0,0 +1,93 @@
+"""
+Tests for $batch request coalescing
+"""
+import asyncio
+
+import pytest
+
+from mcp_m365_teams.batching import BatchCoalescer, GraphBatchError
+
+
+class FakeGraph:
+    """Answers $batch payloads, optionally throttling some URLs once"""
+
+    def __init__(self, throttle=(), fail=()):
+        self.payloads = []
+        self.throttle = set(throttle)
+        self.fail = set(fail)
+
+    async def send(self, payload):
+        self.payloads.append(payload)
+        responses = []
+        for request in payload["requests"]:
+            url = request["url"]
+            if url in self.throttle:
+                self.throttle.discard(url)
+                responses.append(
+                    {"id": request["id"], "status": 429, "headers": {"Retry-After": "0"}}
+                )
+            elif url in self.fail:
+                body = {"error": {"message": "Not found"}}
+                responses.append({"id": request["id"], "status": 404, "body": body})
+            else:
+                responses.append({"id": request["id"], "status": 200, "body": {"url": url}})
+        return {"responses": list(reversed(responses))}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch():
+    """Test that requests issued together are sent as one $batch call"""
+    graph = FakeGraph()
+    coalescer = BatchCoalescer(graph.send, window=0.01)
+
+    results = await asyncio.gather(*(coalescer.request("GET", f"/teams/{i}") for i in range(5)))
+
+    assert [r["url"] for r in results] == [f"/teams/{i}" for i in range(5)]
+    assert len(graph.payloads) == 1
+    assert coalescer.batches_sent == 1
+
+
+@pytest.mark.asyncio
+async def test_batches_are_split_at_twenty_requests():
+    """Test that more than 20 requests are spread over several batches"""
+    graph = FakeGraph()
+    coalescer = BatchCoalescer(graph.send, window=0.01)
+
+    await asyncio.gather(*(coalescer.request("GET", f"/teams/{i}") for i in range(45)))
+
+    assert [len(p["requests"]) for p in graph.payloads] == [20, 20, 5]
+
+
+@pytest.mark.asyncio
+async def test_dependencies_and_errors():
+    """Test dependsOn wiring and that failures reach only their own caller"""
+    graph = FakeGraph(fail={"/teams/missing"})
+    coalescer = BatchCoalescer(graph.send, window=0.01)
+
+    create = coalescer.enqueue("POST", "/teams", body={"displayName": "X"})
+    follow_up = coalescer.enqueue("GET", "/teams/x", depends_on=create)
+    missing = coalescer.enqueue("GET", "/teams/missing")
+
+    assert (await follow_up)["url"] == "/teams/x"
+    with pytest.raises(GraphBatchError, match="Not found") as error:
+        await missing
+    assert error.value.status == 404
+
+    requests = graph.payloads[0]["requests"]
+    assert requests[0]["headers"]["Content-Type"] == "application/json"
+    assert requests[1]["dependsOn"] == [requests[0]["id"]]
+
+
+@pytest.mark.asyncio
+async def test_throttled_items_are_retried():
+    """Test that a per-item 429 is retried after Retry-After"""
+    graph = FakeGraph(throttle={"/teams/1"})
+    coalescer = BatchCoalescer(graph.send, window=0.01)
+
+    results = await asyncio.gather(
+        coalescer.request("GET", "/teams/1"), coalescer.request("GET", "/teams/2")
+    )
+
+    assert [r["url"] for r in results] == ["/teams/1", "/teams/2"]
+    assert coalescer.retries == 1
+    assert [len(p["requests"]) for p in graph.payloads] == [2, 1]
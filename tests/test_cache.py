@@ -0,0 +1,42 @@
+"""
+Tests for the TTL/LRU cache
+"""
+from mcp_m365_teams.cache import MISSING, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    """Test per-cache and per-entry expiry, and that None is cacheable"""
+    clock = FakeClock()
+    cache = TTLCache(ttl=10, clock=clock)
+    cache.set("a", None)
+    cache.set("b", 1, ttl=30)
+
+    assert cache.get("a") is None
+    clock.now = 10
+    assert cache.get("a") is MISSING
+    assert cache.get("b") == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_lru_eviction_and_invalidation():
+    """Test size bound eviction order and predicate invalidation"""
+    cache = TTLCache(max_size=2)
+    cache.set(("channels", "t1"), [])
+    cache.set(("channels", "t2"), [])
+    cache.get(("channels", "t1"))
+    cache.set(("teams",), [])
+
+    assert cache.get(("channels", "t2")) is MISSING
+    assert cache.stats()["evictions"] == 1
+    assert cache.invalidate(lambda key: key[0] == "channels") == 1
+    assert len(cache) == 1
+    assert cache.invalidate() == 1
@@ -0,0 +1,79 @@
+"""
+Tests for the directory snapshot and name index
+"""
+import pytest
+
+from mcp_m365_teams.directory import Directory, NameIndex, looks_like_id, not_found, unique
+
+TEAM_ID = "6f2b1c2e-8a4d-4b7e-9f1a-0c3d5e7f9a1b"
+
+
+def test_name_index_matches_exact_then_prefix_then_fuzzy():
+    """Test the lookup tiers, including prefixes of later words"""
+    index = NameIndex(
+        (name, {"id": name}) for name in ("Engineering", "Platform Engineering", "Sales", "")
+    )
+
+    assert [r["id"] for r in index.find("  ENGINEERING ")] == ["Engineering"]
+    assert [r["id"] for r in index.find("eng")] == ["Engineering", "Platform Engineering"]
+    assert [r["id"] for r in index.find("Saels")] == ["Sales"]
+    assert index.find("Marketing") == []
+    assert len(index) == 3
+
+
+def test_unique_reports_ambiguous_names():
+    """Test that several matches raise with the candidates listed"""
+    matches = [{"id": "1", "display_name": "General"}, {"id": "2", "display_name": "General"}]
+
+    assert unique("channel", "General", matches[:1]) == matches[0]
+    assert unique("channel", "General", []) is None
+    with pytest.raises(ValueError, match="ambiguous: 'General' \\(1\\), 'General' \\(2\\)"):
+        unique("channel", "General", matches)
+
+
+def test_exact_unique_ignores_prefix_and_fuzzy_matches():
+    """Test that exact resolution only takes full names and lists the near ones"""
+    index = NameIndex((name, {"id": name, "display_name": name}) for name in ("Engineering",))
+
+    assert unique("team", " engineering", index.find(" engineering"), exact=True)["id"] == (
+        "Engineering"
+    )
+    assert unique("team", "eng", index.find("eng"), exact=True) is None
+    assert "did you mean 'Engineering' (Engineering)?" in str(
+        not_found("team", "eng", index.find("eng"))
+    )
+    assert str(not_found("team", "Sales", [])) == "No team named 'Sales'"
+
+
+def test_looks_like_id():
+    assert looks_like_id(TEAM_ID)
+    assert looks_like_id("19:abc@thread.tacv2")
+    assert not looks_like_id("General")
+
+
+def test_snapshot_round_trip(tmp_path):
+    """Test that a saved snapshot loads back with its indexes rebuilt"""
+    path = str(tmp_path / "directory.json.gz")
+    directory = Directory(path, clock=lambda: 1000.0)
+    directory.replace(
+        [{"id": TEAM_ID, "display_name": "Engineering", "description": None}],
+        {TEAM_ID: [{"id": "19:a@thread.tacv2", "display_name": "General"}]},
+        [{"id": "u1", "display_name": "Ada Lovelace", "mail": "Ada@x.com",
+          "user_principal_name": "ada@x.onmicrosoft.com"}],
+    )
+    directory.save()
+
+    loaded = Directory(path, clock=lambda: 1060.0)
+    assert loaded.load()
+    assert loaded.find_team("eng")[0]["id"] == TEAM_ID
+    assert loaded.find_channel("general", TEAM_ID) == [
+        {"id": "19:a@thread.tacv2", "display_name": "General", "team_id": TEAM_ID}
+    ]
+    assert loaded.find_user("lovelace")[0]["id"] == "u1"
+    assert loaded.user_by_mail("ada@X.com")["id"] == "u1"
+    assert loaded.team_by_id(TEAM_ID)["display_name"] == "Engineering"
+    assert loaded.channel_by_id("19:a@thread.tacv2")["team_id"] == TEAM_ID
+    assert loaded.channel_by_id("19:a@thread.tacv2", "other-team") is None
+    assert loaded.user_by_id("u1")["display_name"] == "Ada Lovelace"
+    assert loaded.status()["age_seconds"] == 60.0
+    assert not Directory(str(tmp_path / "missing.json.gz")).load()
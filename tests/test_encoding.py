@@ -0,0 +1,80 @@
+"""
+Tests for tool response encoding
+"""
+import json
+
+import pytest
+
+from mcp_m365_teams.encoding import ResponseEncoder
+
+
+def _messages(count, content="hello"):
+    return [{"id": f"m{i}", "content": content} for i in range(count)]
+
+
+@pytest.mark.parametrize("fast", [True, False])
+def test_compact_and_indented_output(fast):
+    """Test compact output by default and indentation when disabled, with either backend"""
+    result = {"teams": [{"id": "t1", "display_name": "Café"}]}
+
+    compact = ResponseEncoder(fast=fast).encode(result)
+    indented = ResponseEncoder(compact=False, fast=fast).encode(result)
+
+    assert compact == '{"teams":[{"id":"t1","display_name":"Café"}]}'
+    assert "\n  " in indented
+    assert json.loads(indented) == result
+
+
+def test_long_message_bodies_are_excerpted():
+    """Test that nested message contents are cut to the excerpt length"""
+    encoder = ResponseEncoder(excerpt_chars=5)
+    result = {"changes": [{"id": "1", "message": {"content": "0123456789"}}]}
+
+    message = json.loads(encoder.encode(result))["changes"][0]["message"]
+
+    assert message == {"content": "01234…", "content_truncated": True}
+    assert result["changes"][0]["message"]["content"] == "0123456789"
+
+
+def test_oversized_result_is_split_deterministically_with_continuation():
+    """Test byte budget, stable truncation and resuming through continuation handles"""
+    result = {"messages": _messages(200), "count": 200}
+    encoder = ResponseEncoder(max_bytes=1000)
+
+    text = encoder.encode(result)
+    assert len(text.encode()) <= 1000
+    assert encoder.encode(result) == text
+
+    seen = []
+    page = json.loads(text)
+    while True:
+        seen.extend(m["id"] for m in page["messages"])
+        if "truncated" not in page:
+            break
+        page = json.loads(encoder.resume(page["truncated"]["continuation"]))
+
+    assert seen == [f"m{i}" for i in range(200)]
+    with pytest.raises(ValueError, match="Unknown or expired continuation"):
+        encoder.resume("missing")
+
+
+def test_continuations_resume_only_in_their_scope():
+    """Test that a remainder stored for one scope cannot be read from another"""
+    encoder = ResponseEncoder(max_bytes=1000)
+    result = {"messages": _messages(200)}
+
+    handle = json.loads(encoder.encode(result, ("a", 1)))["truncated"]["continuation"]
+    assert json.loads(encoder.encode(result, ("b", 1)))["truncated"]["continuation"] == handle
+
+    for scope in (None, ("a", 2), ("c", 1)):
+        with pytest.raises(ValueError, match="Unknown or expired continuation"):
+            encoder.resume(handle, scope)
+    assert json.loads(encoder.resume(handle, ("a", 1)))["messages"][0]["id"] != "m0"
+
+
+def test_result_without_splittable_field_is_returned_whole():
+    """Test that results with nothing to split ignore the budget rather than break JSON"""
+    encoder = ResponseEncoder(max_bytes=10)
+    result = {"message_id": "x" * 50}
+
+    assert json.loads(encoder.encode(result)) == result
@@ -0,0 +1,130 @@
+"""
+Tests for the resumable channel history export
+"""
+import json
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from kiota_abstractions.authentication import AnonymousAuthenticationProvider
+from msgraph import GraphRequestAdapter, GraphServiceClient
+from msgraph.generated.models.body_type import BodyType
+from msgraph.generated.models.chat_message import ChatMessage
+from msgraph.generated.models.item_body import ItemBody
+from msgraph.generated.teams.item.channels.item.messages.messages_request_builder import (
+    MessagesRequestBuilder,
+)
+
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.export import ChannelExporter, message_row
+from mcp_m365_teams.server import M365TeamsServer
+
+TEAM = "6f2b1c2e-8a4d-4b7e-9f1a-0c3d5e7f9a1b"
+CHANNEL = "19:general@thread.tacv2"
+NEXT_LINK = (
+    f"https://graph.microsoft.com/v1.0/teams/{TEAM}/channels/{CHANNEL}/messages?$skiptoken=2"
+)
+
+
+def chat_message(message_id, replies=(), reply_to_id=None):
+    return ChatMessage(
+        id=message_id,
+        reply_to_id=reply_to_id,
+        body=ItemBody(content=f"message {message_id}", content_type=BodyType.Text),
+        created_date_time=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        replies=list(replies),
+    )
+
+
+@pytest.fixture
+def server():
+    server = M365TeamsServer(Settings(eager_init=False))
+    server.client = GraphServiceClient(
+        request_adapter=GraphRequestAdapter(AnonymousAuthenticationProvider())
+    )
+    server._list_teams = AsyncMock(return_value={"teams": [{"id": TEAM}]})
+    server._get_team_channels = AsyncMock(
+        return_value={"channels": [{"id": CHANNEL, "display_name": "General"}]}
+    )
+    return server
+
+
+def test_message_row_flattens_sdk_messages():
+    row = message_row(chat_message("2", reply_to_id="1"), TEAM, CHANNEL)
+
+    assert row["reply_to_id"] == "1"
+    assert row["content_type"] == "text"
+    assert row["created_at"] == "2024-01-01T00:00:00+00:00"
+    assert row["from"] is None
+
+
+@pytest.mark.asyncio
+async def test_export_resumes_from_the_last_complete_part(server, tmp_path):
+    """Test that a run failing mid-channel resumes after the part it completed"""
+    failing = True
+
+    async def get(self, request_configuration=None):
+        nonlocal failing
+        if "request-raw-url" not in self.path_parameters:
+            assert request_configuration.query_parameters.expand == ["replies"]
+            first = chat_message("1", replies=[chat_message("1a", reply_to_id="1")])
+            return Mock(value=[first], odata_next_link=NEXT_LINK)
+        if failing:
+            failing = False
+            raise RuntimeError("connection reset")
+        return Mock(value=[chat_message("2")], odata_next_link=None)
+
+    with patch.object(MessagesRequestBuilder, "get", get):
+        exporter = ChannelExporter(server, str(tmp_path), rows_per_file=1)
+        first = await exporter.run()
+        resumed = await ChannelExporter(server, str(tmp_path), rows_per_file=1).run(
+            channels=["general"]
+        )
+        again = await ChannelExporter(server, str(tmp_path)).run()
+
+    folder = tmp_path / TEAM / "19_general@thread.tacv2"
+    lines = [
+        json.loads(line)
+        for part in sorted(folder.iterdir())
+        for line in part.read_text().splitlines()
+    ]
+    checkpoint = json.loads((tmp_path / "checkpoint.json").read_text())
+
+    assert "connection reset" in first["errors"][0]
+    assert [row["id"] for row in lines] == ["1", "1a", "2"]
+    assert sorted(p.name for p in folder.iterdir()) == ["part-00000.jsonl", "part-00001.jsonl"]
+    assert checkpoint["channels"][f"{TEAM}/{CHANNEL}"] == {
+        "parts": 2, "messages": 3, "next_link": None, "done": True, "offset": 0, "part_rows": 0
+    }
+    assert resumed["messages"] == 1 and resumed["channels_done"] == 1
+    assert again["channels_skipped"] == 1 and again["messages"] == 0
+
+
+@pytest.mark.asyncio
+async def test_jsonl_export_resumes_mid_part_from_the_last_page(server, tmp_path):
+    """Test that JSONL progress is checkpointed per page, so a resume appends to the part"""
+    requests = []
+
+    async def get(self, request_configuration=None):
+        requests.append(self.path_parameters.get("request-raw-url"))
+        if "request-raw-url" not in self.path_parameters:
+            return Mock(value=[chat_message("1"), chat_message("2")], odata_next_link=NEXT_LINK)
+        if len(requests) == 2:
+            raise RuntimeError("connection reset")
+        return Mock(value=[chat_message("3")], odata_next_link=None)
+
+    with patch.object(MessagesRequestBuilder, "get", get):
+        first = await ChannelExporter(server, str(tmp_path)).run()
+        folder = tmp_path / TEAM / "19_general@thread.tacv2"
+        # A page written after the last checkpoint is cut off on resume
+        partial = folder / "part-00000.jsonl.tmp"
+        partial.write_bytes(partial.read_bytes() + b'{"id":"lost"}\n')
+        resumed = await ChannelExporter(server, str(tmp_path)).run()
+
+    assert "connection reset" in first["errors"][0]
+    assert requests == [None, NEXT_LINK, NEXT_LINK]
+    assert resumed["messages"] == 1
+    assert sorted(p.name for p in folder.iterdir()) == ["part-00000.jsonl"]
+    lines = (folder / "part-00000.jsonl").read_text().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["1", "2", "3"]
+    assert resumed["bytes"] == len(lines[2]) + 1
@@ -0,0 +1,103 @@
+"""
+Tests for the bounded async fan-out engine
+"""
+import asyncio
+
+import pytest
+
+from mcp_m365_teams.fanout import FanOut
+
+
+@pytest.mark.asyncio
+async def test_fan_out_respects_concurrency_limit():
+    """Test that no more than `concurrency` jobs run at once"""
+    fan_out = FanOut(concurrency=3)
+    running = 0
+    peak = 0
+
+    async def job(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        fan_out.emit(i)
+
+    for i in range(10):
+        fan_out.submit(job, i)
+
+    result = await fan_out.run()
+
+    assert peak == 3
+    assert sorted(result.items) == list(range(10))
+    assert result.partial is False
+
+
+@pytest.mark.asyncio
+async def test_fan_out_stops_early_and_cancels_outstanding_jobs():
+    """Test that reaching the limit cancels jobs that are still running"""
+    fan_out = FanOut(concurrency=10, limit=2)
+    cancelled = []
+
+    async def fast(i):
+        fan_out.emit(i)
+
+    async def slow(i):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(i)
+            raise
+
+    fan_out.submit(slow, "a")
+    fan_out.submit(slow, "b")
+    for i in range(5):
+        fan_out.submit(fast, i)
+
+    result = await asyncio.wait_for(fan_out.run(), 1)
+
+    assert len(result.items) == 2
+    assert sorted(cancelled) == ["a", "b"]
+    assert result.partial is False
+
+
+@pytest.mark.asyncio
+async def test_fan_out_returns_partial_results_on_deadline():
+    """Test that a deadline returns what was found so far"""
+    fan_out = FanOut(concurrency=4, timeout=0.05)
+
+    async def job(delay):
+        await asyncio.sleep(delay)
+        fan_out.emit(delay)
+
+    fan_out.submit(job, 0)
+    fan_out.submit(job, 10)
+
+    result = await fan_out.run()
+
+    assert result.items == [0]
+    assert result.timed_out is True
+    assert result.partial is True
+
+
+@pytest.mark.asyncio
+async def test_fan_out_nested_jobs_and_errors():
+    """Test that jobs can submit children and failures are collected"""
+    fan_out = FanOut(concurrency=2)
+
+    async def child(i):
+        if i == 1:
+            raise RuntimeError("channel forbidden")
+        fan_out.emit(i)
+
+    async def parent():
+        for i in range(3):
+            fan_out.submit(child, i)
+
+    fan_out.submit(parent)
+
+    result = await fan_out.run()
+
+    assert sorted(result.items) == [0, 2]
+    assert result.errors == ["channel forbidden"]
+    assert result.partial is True
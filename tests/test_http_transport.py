@@ -0,0 +1,75 @@
+"""
+Tests for the streamable HTTP transport
+"""
+import asyncio
+import socket
+from unittest.mock import Mock, patch
+
+import httpx
+import pytest
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.http_transport import serve_http
+from mcp_m365_teams.server import M365TeamsServer
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_sessions_share_one_server():
+    """Test that several HTTP sessions are served at once against shared caches"""
+    port = free_port()
+    server = M365TeamsServer(Settings(listen_port=port, eager_init=False))
+    server.cache.set(("teams",), [])
+    serving = asyncio.create_task(serve_http(server.app, server.settings))
+    url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                if (await client.get(f"{url}/healthz")).status_code == 200:
+                    break
+            except httpx.ConnectError:
+                await asyncio.sleep(0.05)
+
+    async def session() -> str:
+        async with (
+            streamable_http_client(f"{url}/mcp") as (read_stream, write_stream, _),
+            ClientSession(read_stream, write_stream) as mcp_session,
+        ):
+            await mcp_session.initialize()
+            result = await mcp_session.call_tool("get_cache_stats", {})
+            return result.content[0].text
+
+    try:
+        results = await asyncio.gather(*(session() for _ in range(3)))
+    finally:
+        serving.cancel()
+        await asyncio.gather(serving, return_exceptions=True)
+
+    assert all('"directory":{"size":1' in text for text in results)
+
+
+@pytest.mark.asyncio
+async def test_session_concurrency_is_limited():
+    """Test that one session runs at most session_max_concurrency tool calls at once"""
+    server = M365TeamsServer(Settings(session_max_concurrency=2, eager_init=False))
+    running = peak = 0
+
+    async def call():
+        nonlocal running, peak
+        async with server._session_slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    with patch.object(server, "_session", return_value=Mock()):
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    assert peak == 2
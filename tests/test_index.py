@@ -0,0 +1,103 @@
+"""
+Tests for the local message index
+"""
+import time
+
+import pytest
+
+from mcp_m365_teams.index import MessageIndex
+
+TEAM = {"id": "team1", "display_name": "Engineering"}
+GENERAL = {"id": "channel1", "display_name": "General"}
+RANDOM = {"id": "channel2", "display_name": "Random"}
+
+
+@pytest.fixture
+def index(tmp_path):
+    """Create an index backed by a temporary file"""
+    index = MessageIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def _message(msg_id, content, author="Ada", created_at="2024-01-01T10:00:00+00:00"):
+    return {"id": msg_id, "content": content, "from": author, "created_at": created_at}
+
+
+def test_search_ranks_and_filters(index):
+    """Test that search honours ranking and team/channel/author/date filters"""
+    index.upsert_messages(
+        TEAM,
+        GENERAL,
+        [
+            _message("1", "deploy done, deploy verified", created_at="2024-01-02T00:00:00+00:00"),
+            _message("2", "lunch then deploy", author="Grace"),
+        ],
+    )
+    index.upsert_messages(TEAM, RANDOM, [_message("3", "nothing to see")])
+
+    results = index.search("deploy")
+    assert [r["id"] for r in results] == ["1", "2"]
+    assert results[0]["team_name"] == "Engineering"
+    assert results[0]["channel_name"] == "General"
+
+    assert [r["id"] for r in index.search("deploy", author="grace")] == ["2"]
+    assert [r["id"] for r in index.search("deploy", since="2024-01-02")] == ["1"]
+    assert [r["id"] for r in index.search("deploy", until="2024-01-02")] == ["2"]
+    assert index.search("deploy", channel_id="channel2") == []
+    assert index.search('"') == []
+
+
+def test_upsert_is_incremental_and_tracks_edits(index):
+    """Test that re-indexing only counts new messages and picks up edits"""
+    assert index.upsert_messages(TEAM, GENERAL, [_message("1", "first draft")]) == 1
+    assert (
+        index.upsert_messages(
+            TEAM, GENERAL, [_message("1", "final version"), _message("2", "another")]
+        )
+        == 1
+    )
+
+    assert index.search("draft") == []
+    assert [r["id"] for r in index.search("final")] == ["1"]
+
+
+def test_status_reports_freshness(index):
+    """Test index status before and after a sync"""
+    assert index.completed_at() is None
+    assert index.status()["channels"] == 0
+
+    index.upsert_messages(TEAM, GENERAL, [_message("1", "hello")])
+    status = index.status()
+
+    # One synced channel does not make the index complete
+    assert status["complete"] is False
+    assert status["messages"] == 1
+    assert status["channels"] == 1
+    assert status["newest_message"] == "2024-01-01T10:00:00+00:00"
+    assert status["staleness_seconds"] >= 0
+
+    index.mark_complete()
+    assert index.status()["complete"] is True
+    assert index.completed_at() is not None
+
+
+def test_search_latency_on_large_index(index):
+    """Test that a ranked search over many messages stays well under 100ms"""
+    words = ["deploy", "release", "incident", "lunch", "review", "budget"]
+    for channel in range(20):
+        index.upsert_messages(
+            TEAM,
+            {"id": f"c{channel}", "display_name": f"Channel {channel}"},
+            [
+                _message(f"{channel}-{i}", f"{words[i % 6]} note {i} {words[(i // 6) % 6]}")
+                for i in range(1000)
+            ],
+        )
+
+    start = time.perf_counter()
+    results = index.search("incident review", limit=20, team_id="team1")
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == 20
+    assert elapsed < 0.1
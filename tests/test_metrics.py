@@ -0,0 +1,87 @@
+"""
+Tests for tool and Graph request metrics
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from mcp_m365_teams.metrics import Histogram, Metrics, endpoint_for, prometheus_handler
+from mcp_m365_teams.middleware import MetricsMiddleware, SchedulerMiddleware
+from mcp_m365_teams.scheduler import GraphScheduler
+
+
+def test_endpoint_for_templates_ids():
+    """Test that item ids are replaced so endpoints form a small label set"""
+    assert endpoint_for("/v1.0/teams/abc/channels/19:x/messages") == (
+        "/teams/{id}/channels/{id}/messages"
+    )
+    assert endpoint_for("/v1.0/teams/abc/channels/c/messages/delta()") == (
+        "/teams/{id}/channels/{id}/messages/delta()"
+    )
+    assert endpoint_for("/v1.0/$batch") == "/$batch"
+
+
+def test_histogram_quantiles():
+    """Test bucketed quantiles, including values beyond the last bucket"""
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == 1.0
+    assert histogram.snapshot()["count"] == 4
+
+
+def test_tool_call_counts_errors_and_in_flight():
+    """Test calls, per-type errors and the in-flight gauge of a tool series"""
+    metrics = Metrics()
+
+    with metrics.tool_call("list_teams") as series:
+        assert series.in_flight == 1
+    with pytest.raises(ValueError), metrics.tool_call("list_teams"):
+        raise ValueError("boom")
+
+    snapshot = metrics.snapshot()["tools"]["list_teams"]
+    assert snapshot["calls"] == 2
+    assert snapshot["errors"] == {"ValueError": 1}
+    assert snapshot["in_flight"] == 0
+    assert snapshot["latency"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_middleware_records_each_attempt_and_serves_prometheus():
+    """Test per-attempt Graph metrics behind the scheduler and the /metrics endpoint"""
+    metrics = Metrics()
+    scheduler = GraphScheduler(base_delay=0)
+    pipeline = SchedulerMiddleware(scheduler)
+    pipeline.next = MetricsMiddleware(metrics)
+    statuses = [429, 200]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(
+            statuses.pop(0), headers={"Retry-After": "0"}, content=b'{"value":[]}'
+        )
+    )
+    request = httpx.Request("GET", "https://graph.microsoft.com/v1.0/teams/t1/channels")
+
+    response = await pipeline.send(request, transport)
+
+    assert response.status_code == 200
+    series = metrics.snapshot()["graph"]["GET /teams/{id}/channels"]
+    assert series["calls"] == 2
+    assert series["throttled"] == 1
+    assert series["errors"] == {"429": 1}
+    assert series["bytes_received"] == 24
+
+    server = await asyncio.start_server(prometheus_handler(metrics), "127.0.0.1", 0)
+    async with server:
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        text = (await reader.read()).decode()
+        writer.close()
+
+    assert text.startswith("HTTP/1.1 200 OK")
+    assert 'm365_graph_calls_total{endpoint="GET /teams/{id}/channels"} 2' in text
+    assert 'm365_graph_duration_seconds_count{endpoint="GET /teams/{id}/channels"} 2' in text
@@ -0,0 +1,143 @@
+"""
+Tests for the Graph change-notification receiver
+"""
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+
+import httpx
+import pytest
+
+from mcp_m365_teams.cache import MISSING
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.notifications import NotificationReceiver, parse_resource
+from mcp_m365_teams.server import M365TeamsServer
+
+CHANNEL = "19:abc@thread.tacv2"
+
+# Payloads as Graph posts them, for notifications without resource data
+MESSAGE_CREATED = {
+    "value": [
+        {
+            "subscriptionId": "sub-messages",
+            "subscriptionExpirationDateTime": "2024-01-01T11:00:00Z",
+            "changeType": "created",
+            "resource": f"teams('team-1')/channels('{CHANNEL}')/messages('1700000000000')",
+            "resourceData": {
+                "id": "1700000000000",
+                "@odata.type": "#Microsoft.Graph.chatMessage",
+                "@odata.id": f"teams('team-1')/channels('{CHANNEL}')/messages('1700000000000')",
+            },
+            "clientState": "secret",
+            "tenantId": "tenant-1",
+        }
+    ]
+}
+CHANNEL_UPDATED = {
+    "value": [
+        {
+            "subscriptionId": "sub-channels",
+            "changeType": "updated",
+            "resource": f"teams('team-1')/channels('{CHANNEL}')",
+            "clientState": "secret",
+            "tenantId": "tenant-1",
+        },
+        {
+            "subscriptionId": "sub-channels",
+            "changeType": "deleted",
+            "resource": f"teams('team-2')/channels('{CHANNEL}')",
+            "clientState": "forged",
+            "tenantId": "tenant-1",
+        },
+    ]
+}
+REAUTHORIZATION_REQUIRED = {
+    "value": [
+        {
+            "subscriptionId": "sub-messages",
+            "lifecycleEvent": "reauthorizationRequired",
+            "clientState": "secret",
+            "tenantId": "tenant-1",
+        }
+    ]
+}
+
+
+def test_parse_resource_forms():
+    """Test both the key-segment and path forms of notification resources"""
+    assert parse_resource(f"teams('t1')/channels('{CHANNEL}')/messages('m1')") == {
+        "team_id": "t1",
+        "channel_id": CHANNEL,
+        "message_id": "m1",
+    }
+    assert parse_resource("/teams/t1/channels") == {
+        "team_id": "t1",
+        "channel_id": None,
+        "message_id": None,
+    }
+    assert parse_resource("users/u1")["team_id"] is None
+
+
+@pytest.mark.asyncio
+async def test_receiver_validates_and_verifies_client_state():
+    """Test the handshake echo and that forged clientState values are dropped"""
+    on_change = AsyncMock()
+    receiver = NotificationReceiver("secret", on_change)
+    server = await asyncio.start_server(receiver.handle, "127.0.0.1", 0)
+    async with server:
+        url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/notify"
+        async with httpx.AsyncClient() as client:
+            handshake = await client.post(url, params={"validationToken": "token a+b"})
+            posted = await client.post(url, content=json.dumps(CHANNEL_UPDATED))
+            malformed = await client.post(url, content=b"{")
+        await receiver.drain()
+
+    assert handshake.status_code == 200
+    assert handshake.text == "token a+b"
+    assert posted.status_code == 202
+    assert malformed.status_code == 400
+    on_change.assert_awaited_once()
+    assert on_change.await_args.args[0]["changeType"] == "updated"
+    assert receiver.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_notifications_invalidate_caches_and_resync_channels():
+    """Test that recorded notifications drop cached channels and delta-sync tracked channels"""
+    server = M365TeamsServer(
+        Settings(notification_port=8443, notification_client_state="secret", eager_init=False)
+    )
+    server.client = MagicMock()
+    server.cache.set(("channels", "team-1"), [{"id": CHANNEL}])
+    server.delta.record("team-1", CHANNEL, [], "https://graph.microsoft.com/delta?token=1")
+    server._sync_channel = AsyncMock(return_value={"upserted": 1, "deleted": 0, "indexed": 0})
+    server.subscriptions["/teams/team-1/channels/getAllMessages"] = {
+        "id": "sub-messages",
+        "expires": 0,
+    }
+    server._renew_subscription = AsyncMock()
+    receiver = server.notifications
+
+    for payload in (CHANNEL_UPDATED, MESSAGE_CREATED, REAUTHORIZATION_REQUIRED):
+        status, _ = receiver.respond("POST", "/notify", json.dumps(payload).encode())
+        assert status == "202 Accepted"
+    await receiver.drain()
+
+    assert server.cache.get(("channels", "team-1")) is MISSING
+    server._sync_channel.assert_awaited_once_with({"id": "team-1"}, {"id": CHANNEL})
+    server._renew_subscription.assert_awaited_once_with("/teams/team-1/channels/getAllMessages")
+    assert (await server._get_index_status())["notifications"]["lifecycle"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_notifications_for_a_channel_sync_it_once():
+    """Test that notifications racing past the pending check still queue a single sync"""
+    server = M365TeamsServer(Settings(eager_init=False))
+    server.client = MagicMock()
+    server.delta.record("team-1", CHANNEL, [], "https://graph.microsoft.com/delta?token=1")
+    server._sync_channel = AsyncMock(return_value={"upserted": 1, "deleted": 0, "indexed": 0})
+
+    await asyncio.gather(*(server._sync_notified_channel("team-1", CHANNEL) for _ in range(3)))
+
+    server._sync_channel.assert_awaited_once_with({"id": "team-1"}, {"id": CHANNEL})
+    assert not server._pending_syncs
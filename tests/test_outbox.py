@@ -0,0 +1,63 @@
+"""
+Tests for the durable message outbox
+"""
+import pytest
+
+from mcp_m365_teams.outbox import IdempotencyConflict, Outbox, OutboxFull
+
+
+def test_enqueue_is_idempotent_per_key():
+    """Test that a repeated key returns the original entry instead of queueing again"""
+    outbox = Outbox()
+    first, created = outbox.enqueue("t1", "c1", "hello", "key-1")
+    again, created_again = outbox.enqueue("t1", "c1", "hello", "key-1")
+
+    assert created and not created_again
+    assert again["id"] == first["id"]
+    assert "message" not in again
+    assert outbox.stats()["depth"] == 1
+    for team_id, channel_id, message in (("t1", "c1", "bye"), ("t1", "c2", "hello")):
+        with pytest.raises(IdempotencyConflict, match="key-1"):
+            outbox.enqueue(team_id, channel_id, message, "key-1")
+    assert outbox.stats()["depth"] == 1
+
+
+def test_claim_keeps_channel_order():
+    """Test that only the oldest undelivered message of each channel is handed out"""
+    outbox = Outbox()
+    first, _ = outbox.enqueue("t1", "c1", "first")
+    outbox.enqueue("t1", "c1", "second")
+    other, _ = outbox.enqueue("t1", "c2", "other")
+
+    claimed = outbox.claim(now=0, limit=10, skip=set())
+    assert [entry["message"] for entry in claimed] == ["first", "other"]
+    assert outbox.claim(now=0, limit=10, skip=set()) == []
+
+    outbox.mark_retry(first["id"], "throttled", at=100)
+    outbox.mark_sent(other["id"], "m1")
+    assert outbox.claim(now=50, limit=10, skip=set()) == []
+    assert [e["message"] for e in outbox.claim(now=100, limit=10, skip=set())] == ["first"]
+
+    outbox.mark_failed(first["id"], "forbidden")
+    assert [e["message"] for e in outbox.claim(now=100, limit=10, skip=set())] == ["second"]
+    assert outbox.get(first["id"])["attempts"] == 2
+
+
+def test_backpressure_and_recovery(tmp_path):
+    """Test the depth bound and that in-flight entries are not sent again after a restart"""
+    path = str(tmp_path / "outbox.db")
+    outbox = Outbox(path, max_depth=2)
+    outbox.enqueue("t1", "c1", "a")
+    outbox.enqueue("t1", "c2", "b")
+    with pytest.raises(OutboxFull):
+        outbox.enqueue("t1", "c3", "c")
+    outbox.claim(now=0, limit=1, skip={("t1", "c2")})
+    outbox.close()
+
+    reopened = Outbox(path, max_depth=2)
+    assert reopened.stats()["sending"] == 1
+    assert reopened.recover() == 1
+    stats = reopened.stats()
+    assert (stats["queued"], stats["sending"], stats["unknown"]) == (1, 0, 1)
+    assert stats["depth"] == 1
+    assert [e["message"] for e in reopened.claim(now=0, limit=10, skip=set())] == ["b"]
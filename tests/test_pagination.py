@@ -0,0 +1,52 @@
+"""
+Tests for paging helpers and continuation cursors
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from mcp_m365_teams.pagination import decode_cursor, encode_cursor, iter_pages
+
+BASE_URL = "https://graph.microsoft.com/v1.0"
+
+
+def test_cursor_round_trip():
+    """Test that a cursor decodes to the page URL and offset it was built from"""
+    url = f"{BASE_URL}/teams/t1/channels/c1/messages?$skiptoken=abc"
+
+    assert decode_cursor(encode_cursor(url, 7), BASE_URL) == (url, 7)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor!",
+        encode_cursor("https://evil.example.com/v1.0/teams"),
+        encode_cursor(f"{BASE_URL}/teams", skip=-1),
+    ],
+)
+def test_decode_cursor_rejects_invalid_input(cursor):
+    """Test that malformed cursors and non-Graph URLs are refused"""
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, BASE_URL)
+
+
+@pytest.mark.asyncio
+async def test_iter_pages_fetches_lazily():
+    """Test that the next page is only requested when the caller asks for it"""
+    pages = {
+        None: SimpleNamespace(value=[1, 2], odata_next_link="page2"),
+        "page2": SimpleNamespace(value=[3], odata_next_link=None),
+    }
+    requested = []
+
+    async def fetch(url):
+        requested.append(url)
+        return pages[url]
+
+    iterator = iter_pages(fetch)
+    assert await iterator.__anext__() == ([1, 2], None, "page2")
+    assert requested == [None]
+
+    assert [page async for page in iterator] == [([3], "page2", None)]
+    assert requested == [None, "page2"]
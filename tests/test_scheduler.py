@@ -0,0 +1,150 @@
+"""
+Tests for the throttling-aware Graph request scheduler
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from mcp_m365_teams.middleware import SchedulerMiddleware
+from mcp_m365_teams.scheduler import (
+    AdaptiveConcurrency,
+    GraphScheduler,
+    TokenBucket,
+    resource_for,
+)
+
+
+class FakeTime:
+    """Clock whose sleep advances time instantly"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+def test_resource_for():
+    """Test that requests are bucketed by their top-level Graph resource"""
+    assert resource_for("/v1.0/teams/t1/channels") == "teams"
+    assert resource_for("/beta/users/u1/presence") == "users"
+    assert resource_for("/v1.0/$batch") == "$batch"
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    """Test that tokens beyond the burst are spaced out at the configured rate"""
+    fake = FakeTime()
+    bucket = TokenBucket(rate=10, burst=2, clock=fake.clock, sleep=fake.sleep)
+
+    for _ in range(4):
+        await bucket.acquire()
+
+    assert fake.now == pytest.approx(0.2)
+
+
+@pytest.mark.asyncio
+async def test_adaptive_concurrency_is_aimd():
+    """Test additive increase on success and one multiplicative decrease per cooldown"""
+    fake = FakeTime()
+    limiter = AdaptiveConcurrency(initial=8, maximum=16, cooldown=1.0, clock=fake.clock)
+
+    for _ in range(2):
+        await limiter.acquire()
+        await limiter.release(throttled=True)
+    assert limiter.limit == 4
+
+    for _ in range(4):
+        await limiter.acquire()
+        await limiter.release(throttled=False)
+    assert limiter.limit == pytest.approx(5, abs=0.1)
+
+    fake.now = 5
+    await limiter.acquire()
+    await limiter.release(throttled=True)
+    assert limiter.limit == pytest.approx(2.5, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_honours_retry_after_and_reports_stats():
+    """Test that a 429 pauses the resource for Retry-After and is retried"""
+    fake = FakeTime()
+    scheduler = GraphScheduler(clock=fake.clock, sleep=fake.sleep)
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "3"}),
+        httpx.Response(200, json={"value": []}),
+    ]
+
+    async def send():
+        return responses.pop(0)
+
+    response = await scheduler.execute("teams", send)
+
+    assert response.status_code == 200
+    assert fake.now == pytest.approx(3)
+    stats = scheduler.stats()["teams"]
+    assert stats["requests"] == 2
+    assert stats["throttled"] == 1
+    assert stats["retries"] == 1
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_gives_up_after_max_retries():
+    """Test that the last throttled response is returned once retries run out"""
+    fake = FakeTime()
+    scheduler = GraphScheduler(max_retries=2, base_delay=1, clock=fake.clock, sleep=fake.sleep)
+
+    async def send():
+        return httpx.Response(503)
+
+    response = await scheduler.execute("users", send)
+
+    assert response.status_code == 503
+    assert scheduler.stats()["users"]["requests"] == 3
+    assert 1.5 <= fake.now <= 3.0
+
+
+@pytest.mark.asyncio
+async def test_middleware_retries_through_transport():
+    """Test that the Kiota middleware routes requests through the scheduler"""
+    fake = FakeTime()
+    scheduler = GraphScheduler(clock=fake.clock, sleep=fake.sleep)
+    statuses = [429, 200]
+    transport = httpx.MockTransport(lambda request: httpx.Response(statuses.pop(0)))
+    request = httpx.Request("GET", "https://graph.microsoft.com/v1.0/teams/t1/channels")
+
+    response = await SchedulerMiddleware(scheduler).send(request, transport)
+
+    assert response.status_code == 200
+    assert scheduler.stats()["teams"]["throttled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_gateway_timeouts_retry_only_idempotent_requests():
+    """Test that a 504 is retried for reads without being treated as throttling"""
+    fake = FakeTime()
+    scheduler = GraphScheduler(max_concurrency=8, base_delay=1, clock=fake.clock, sleep=fake.sleep)
+    statuses = [504, 504, 200, 504]
+    transport = httpx.MockTransport(lambda request: httpx.Response(statuses.pop(0)))
+    middleware = SchedulerMiddleware(scheduler)
+
+    read = httpx.Request("GET", "https://graph.microsoft.com/v1.0/teams/t1/channels")
+    assert (await middleware.send(read, transport)).status_code == 200
+    post = httpx.Request("POST", "https://graph.microsoft.com/v1.0/teams/t1/channels")
+    assert (await middleware.send(post, transport)).status_code == 504
+
+    stats = scheduler.stats()["teams"]
+    assert stats["requests"] == 4
+    assert stats["retries"] == 2
+    assert stats["throttled"] == 0
+    assert stats["paused_for_seconds"] == 0
+    assert stats["concurrency_limit"] >= 8
+    assert len(fake.sleeps) == 2
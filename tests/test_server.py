@@ -1,11 +1,37 @@
 """
 Tests for MCP M365 Teams Server
 """
+import asyncio
+import json
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, Mock, patch
+from urllib.parse import parse_qs, urlparse
+
+import httpx
 import pytest
-from unittest.mock import Mock, AsyncMock, patch
+from azure.core.credentials import AccessToken
+from kiota_abstractions.authentication import AnonymousAuthenticationProvider
+from kiota_http.middleware import RetryHandler
+from mcp import types
+from msgraph import GraphRequestAdapter, GraphServiceClient
+
+from mcp_m365_teams.config import Settings
+from mcp_m365_teams.middleware import MetricsMiddleware, SchedulerMiddleware
 from mcp_m365_teams.server import M365TeamsServer
 
 
+def delta_message(message_id, content=None, author=None, deleted=False):
+    """Build an SDK-like chat message as returned by messages/delta"""
+    return Mock(
+        id=message_id,
+        body=Mock(content=content),
+        from_=Mock(user=Mock(display_name=author)),
+        created_date_time=None,
+        deleted_date_time="2024-01-01T00:00:00Z" if deleted else None,
+    )
+
+
 @pytest.fixture
 def server():
     """Create a test server instance"""
@@ -22,11 +48,12 @@ async def test_server_initialization(server):
 @pytest.mark.asyncio
 async def test_list_tools(server):
     """Test that tools are properly registered"""
-    # Get the list_tools handler
-    tools = await server.app._tool_manager.list_tools()
+    # Call the registered list_tools handler the way the MCP session does
+    handler = server.app.request_handlers[types.ListToolsRequest]
+    response = await handler(types.ListToolsRequest(method="tools/list"))
     
     # Check that expected tools are present
-    tool_names = [tool.name for tool in tools]
+    tool_names = [tool.name for tool in response.root.tools]
     
     assert "list_teams" in tool_names
     assert "get_team_channels" in tool_names
@@ -39,6 +66,130 @@ async def test_list_tools(server):
     assert "search_messages" in tool_names
 
 
+@pytest.mark.asyncio
+async def test_call_tool_dispatches_through_registry(server):
+    """Test registry dispatch: local tools skip Graph initialization, unknown tools error"""
+    handler = server.app.request_handlers[types.CallToolRequest]
+
+    async def call(name, arguments):
+        request = types.CallToolRequest(
+            method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments)
+        )
+        return (await handler(request)).root.content[0].text
+
+    with patch.dict("os.environ", {}, clear=True):
+        stats = await call("get_throttle_stats", {})
+        missing = await call("list_teams", {})
+
+    assert stats == '{"resources":{}}'
+    assert "Missing required environment variables" in missing
+    assert "Unknown tool" in await call("no_such_tool", {})
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_against_the_selected_tenant(tmp_path):
+    """Test per-call and per-session tenant selection with separate clients and caches"""
+    path = tmp_path / "tenants.json"
+    path.write_text('{"contoso": {"tenant_id": "t", "client_id": "c", "client_secret": "s"}}')
+    server = M365TeamsServer(Settings(tenants_path=str(path), eager_init=False))
+    handler = server.app.request_handlers[types.CallToolRequest]
+
+    async def call(name, arguments):
+        request = types.CallToolRequest(
+            method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments)
+        )
+        return (await handler(request)).root.content[0].text
+
+    def client_with_team(name):
+        client = MagicMock()
+        client.me.joined_teams.get = AsyncMock(
+            return_value=Mock(value=[Mock(id=name, display_name=name, description="")])
+        )
+        return client
+
+    contoso = server.tenants.acquire("contoso")
+    server.tenants.release(contoso)
+    server.client = client_with_team("default-team")
+    contoso.client = client_with_team("contoso-team")
+
+    assert "default-team" in await call("list_teams", {})
+    assert "contoso-team" in await call("list_teams", {"tenant": "contoso"})
+    assert contoso.cache is not server.cache
+    assert "Unknown tenant" in await call("list_teams", {"tenant": "nope"})
+
+    session = Mock()
+    with patch.object(server, "_session", return_value=session):
+        assert '"tenant":"contoso"' in await call("select_tenant", {"tenant": "contoso"})
+        assert "contoso-team" in await call("list_teams", {})
+
+
+@pytest.mark.asyncio
+async def test_continuations_resume_only_in_the_tenant_and_session_that_made_them(tmp_path):
+    """Test that a truncated result's handle is private to its tenant and session"""
+    path = tmp_path / "tenants.json"
+    path.write_text('{"contoso": {"tenant_id": "t", "client_id": "c", "client_secret": "s"}}')
+    server = M365TeamsServer(
+        Settings(tenants_path=str(path), response_max_bytes=400, eager_init=False)
+    )
+    handler = server.app.request_handlers[types.CallToolRequest]
+
+    async def call(name, arguments):
+        request = types.CallToolRequest(
+            method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments)
+        )
+        return (await handler(request)).root.content[0].text
+
+    server.client = MagicMock()
+    server.client.me.joined_teams.get = AsyncMock(
+        return_value=Mock(
+            value=[
+                Mock(id=f"team-{i}", display_name=f"Team {i}", description="") for i in range(20)
+            ]
+        )
+    )
+    first, second = Mock(), Mock()
+    with patch.object(server, "_session", return_value=first):
+        handle = json.loads(await call("list_teams", {}))["truncated"]["continuation"]
+        await call("select_tenant", {"tenant": "contoso"})
+        assert "Unknown or expired continuation" in await call(
+            "get_continuation", {"continuation": handle}
+        )
+        await call("select_tenant", {"tenant": "default"})
+        assert "team-" in await call("get_continuation", {"continuation": handle})
+    with patch.object(server, "_session", return_value=second):
+        assert "Unknown or expired continuation" in await call(
+            "get_continuation", {"continuation": handle}
+        )
+
+
+@pytest.mark.asyncio
+async def test_app_registrations_of_one_tenant_keep_separate_stores(tmp_path):
+    """Test that stores follow the pool key and that eviction closes the HTTP client"""
+    path = tmp_path / "tenants.json"
+    path.write_text(
+        '{"a": {"tenant_id": "t", "client_id": "app1", "client_secret": "s"},'
+        ' "b": {"tenant_id": "t", "client_id": "app2", "client_secret": "s"}}'
+    )
+    server = M365TeamsServer(
+        Settings(
+            tenants_path=str(path),
+            outbox_path=str(tmp_path / "outbox.db"),
+            tenant_pool_size=1,
+            eager_init=False,
+        )
+    )
+    first = server.tenants.acquire("a")
+    first.http_client = Mock(aclose=AsyncMock())
+    server.tenants.release(first)
+    second = server.tenants.acquire("b")
+    server.tenants.release(second)
+    await asyncio.sleep(0)
+
+    assert first.outbox.path != second.outbox.path
+    assert first.outbox.path == str(tmp_path / "outbox.t.app1.db")
+    first.http_client.aclose.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_initialize_client_missing_env_vars(server):
     """Test that client initialization fails with missing env vars"""
@@ -47,17 +198,103 @@ async def test_initialize_client_missing_env_vars(server):
             await server._initialize_client()
 
 
+@pytest.mark.asyncio
+async def test_initialize_client_imports_the_sdk_off_the_event_loop(server):
+    """Test that the slow Graph SDK imports run in a worker thread, not on the event loop"""
+    threads = []
+    with patch.dict("os.environ", {}, clear=True), patch(
+        "mcp_m365_teams.server._import_modules",
+        side_effect=lambda names: threads.append(threading.current_thread()),
+    ), pytest.raises(ValueError):
+        await server._initialize_client()
+    assert threads and threads[0] is not threading.main_thread()
+
+
+@pytest.mark.asyncio
+async def test_initialize_client_installs_scheduler_middleware(server):
+    """Test that Graph requests are routed through the throttling scheduler and metrics"""
+    env = {"M365_TENANT_ID": "tenant", "M365_CLIENT_ID": "client", "M365_CLIENT_SECRET": "secret"}
+    with patch.dict("os.environ", env):
+        await server._initialize_client()
+
+    middleware = server._graph_middleware()
+    assert isinstance(middleware[-2], SchedulerMiddleware)
+    assert isinstance(middleware[-1], MetricsMiddleware)
+    assert not any(isinstance(handler, RetryHandler) for handler in middleware)
+    assert server.client.request_adapter is not None
+
+
+def test_http_client_uses_transport_settings():
+    """Test that pool limits, timeouts and compression reach the Graph HTTP client"""
+    server = M365TeamsServer(
+        Settings(
+            http_max_connections=7,
+            http_connect_timeout=2.0,
+            http_read_timeout=20.0,
+            http_compression=False,
+            eager_init=False,
+        )
+    )
+
+    client = server._build_http_client("http://127.0.0.1:9/v1.0")
+
+    assert str(client.base_url) == "http://127.0.0.1:9/v1.0/"
+    assert client.headers["Accept-Encoding"] == "identity"
+    assert client.timeout.connect == 2.0
+    assert client.timeout.read == 20.0
+    assert client._transport.transport._pool._max_connections == 7
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_calls_initialize_client_once(server):
+    """Test that racing tool calls share a single client initialization"""
+
+    async def initialize():
+        await asyncio.sleep(0.01)
+        server.client = MagicMock()
+
+    server._initialize_client = AsyncMock(side_effect=initialize)
+
+    await asyncio.gather(*(server._ensure_client() for _ in range(10)))
+
+    assert server._initialize_client.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_token_refresh_loop_refreshes_before_expiry(server):
+    """Test that the next token refresh is scheduled ahead of expiry"""
+    server.client = MagicMock()
+    server.credential = Mock()
+    server.credential.get_token.return_value = AccessToken("token", int(time.time()) + 3600)
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        raise asyncio.CancelledError
+
+    with (
+        patch("mcp_m365_teams.server.asyncio.sleep", fake_sleep),
+        pytest.raises(asyncio.CancelledError),
+    ):
+        await server._token_refresh_loop()
+
+    server.credential.get_token.assert_called_once_with(
+        "https://graph.microsoft.com/.default", enable_cae=True
+    )
+    assert 3600 - 240 - 5 <= delays[0] <= 3600 - 240
+
+
 @pytest.mark.asyncio
 async def test_list_teams(server):
     """Test listing teams"""
     # Mock the Graph client
-    mock_client = AsyncMock()
+    mock_client = MagicMock()
     mock_teams_response = Mock()
     mock_teams_response.value = [
         Mock(id="team1", display_name="Team 1", description="Description 1"),
         Mock(id="team2", display_name="Team 2", description="Description 2"),
     ]
-    mock_client.me.joined_teams.get.return_value = mock_teams_response
+    mock_client.me.joined_teams.get = AsyncMock(return_value=mock_teams_response)
     
     server.client = mock_client
     
@@ -72,10 +309,10 @@ async def test_list_teams(server):
 @pytest.mark.asyncio
 async def test_list_teams_empty(server):
     """Test listing teams when user has no teams"""
-    mock_client = AsyncMock()
+    mock_client = MagicMock()
     mock_teams_response = Mock()
     mock_teams_response.value = []
-    mock_client.me.joined_teams.get.return_value = mock_teams_response
+    mock_client.me.joined_teams.get = AsyncMock(return_value=mock_teams_response)
     
     server.client = mock_client
     
@@ -88,7 +325,7 @@ async def test_list_teams_empty(server):
 @pytest.mark.asyncio
 async def test_get_team_channels(server):
     """Test getting channels for a team"""
-    mock_client = AsyncMock()
+    mock_client = MagicMock()
     mock_channels_response = Mock()
     mock_channels_response.value = [
         Mock(
@@ -98,7 +335,9 @@ async def test_get_team_channels(server):
             email="general@team.com"
         ),
     ]
-    mock_client.teams.by_team_id.return_value.channels.get.return_value = mock_channels_response
+    mock_client.teams.by_team_id.return_value.channels.get = AsyncMock(
+        return_value=mock_channels_response
+    )
     
     server.client = mock_client
     
@@ -109,15 +348,79 @@ async def test_get_team_channels(server):
     assert result["channels"][0]["display_name"] == "General"
 
 
+@pytest.mark.asyncio
+async def test_read_tools_select_only_requested_fields(server):
+    """Test that fields are pushed down as $select and trimmed from results"""
+    mock_client = MagicMock()
+    channels = mock_client.teams.by_team_id.return_value.channels
+    channels.get = AsyncMock(
+        return_value=Mock(
+            value=[Mock(id="channel1", display_name="General", description="d", email="e")]
+        )
+    )
+    server.client = mock_client
+
+    result = await server._get_team_channels("team1", ["display_name"])
+
+    assert result["channels"] == [{"display_name": "General"}]
+    config = channels.get.await_args.kwargs["request_configuration"]
+    assert config.query_parameters.select == ["id", "displayName", "description", "email"]
+
+    with pytest.raises(ValueError, match="Unknown field"):
+        await server._get_team_channels("team1", ["members"])
+
+
+@pytest.mark.asyncio
+async def test_teams_and_channels_are_cached_with_write_through(server):
+    """Test read-through caching and invalidation by create_team / create_channel"""
+    mock_client = MagicMock()
+    mock_client.me.joined_teams.get = AsyncMock(
+        return_value=Mock(value=[Mock(id="team1", display_name="Team 1", description="")])
+    )
+    channels = mock_client.teams.by_team_id.return_value.channels
+    channels.get = AsyncMock(
+        return_value=Mock(
+            value=[Mock(id="channel1", display_name="General", description="", email=None)]
+        )
+    )
+    channels.post = AsyncMock(
+        return_value=Mock(id="channel2", display_name="Ops", description="d", email=None)
+    )
+    mock_client.teams.post = AsyncMock(return_value=Mock(id=None, display_name="Team 2"))
+    server.client = mock_client
+
+    await server._list_teams()
+    await server._list_teams(["id"])
+    await server._get_team_channels("team1")
+    assert mock_client.me.joined_teams.get.await_count == 1
+
+    await server._create_channel("team1", "Ops", "d")
+    result = await server._get_team_channels("team1", ["id"])
+    assert result["channels"] == [{"id": "channel1"}, {"id": "channel2"}]
+    assert channels.get.await_count == 1
+
+    await server._create_team("Team 2", "")
+    await server._list_teams()
+    assert mock_client.me.joined_teams.get.await_count == 2
+
+    invalidated = server._invalidate_cache("channels", "team1")
+    assert invalidated["invalidated"] == 1
+    await server._get_team_channels("team1")
+    assert channels.get.await_count == 2
+    assert server.cache.stats()["hits"] == 3
+
+
 @pytest.mark.asyncio
 async def test_send_channel_message(server):
     """Test sending a message to a channel"""
-    mock_client = AsyncMock()
+    mock_client = MagicMock()
     mock_message_response = Mock()
     mock_message_response.id = "message123"
     mock_message_response.created_date_time = None
     
-    mock_client.teams.by_team_id.return_value.channels.by_channel_id.return_value.messages.post.return_value = mock_message_response
+    mock_client.teams.by_team_id.return_value.channels.by_channel_id.return_value.messages.post = (
+        AsyncMock(return_value=mock_message_response)
+    )
     
     server.client = mock_client
     
@@ -127,5 +430,664 @@ async def test_send_channel_message(server):
     assert result["message_id"] == "message123"
 
 
+@pytest.mark.asyncio
+async def test_search_messages_fans_out_across_channels(server):
+    """Test that search visits every channel and stops at the limit"""
+    server._list_teams = AsyncMock(
+        return_value={"teams": [{"id": "team1", "display_name": "Team 1"}]}
+    )
+    server._get_team_channels = AsyncMock(
+        return_value={
+            "channels": [
+                {"id": "channel1", "display_name": "General"},
+                {"id": "channel2", "display_name": "Random"},
+            ]
+        }
+    )
+
+    async def get_messages(team_id, channel_id, limit):
+        return {
+            "messages": [
+                {"id": f"{channel_id}-1", "content": "Deploy finished"},
+                {"id": f"{channel_id}-2", "content": "lunch?"},
+            ]
+        }
+
+    server._get_channel_messages = AsyncMock(side_effect=get_messages)
+
+    result = await server._search_messages("deploy", 10)
+
+    assert result["count"] == 2
+    assert result["partial"] is False
+    assert {m["channel_name"] for m in result["messages"]} == {"General", "Random"}
+
+    limited = await server._search_messages("deploy", 1)
+
+    assert limited["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_search_messages_uses_index_once_complete(tmp_path):
+    """Test that search reads the local index only after a refresh covered every channel"""
+    server = M365TeamsServer(Settings(index_path=str(tmp_path / "index.db")))
+    server._list_teams = AsyncMock(
+        return_value={"teams": [{"id": "team1", "display_name": "Team 1"}]}
+    )
+    server._get_team_channels = AsyncMock(
+        return_value={"channels": [{"id": "channel1", "display_name": "General"}]}
+    )
+    server.client = MagicMock()
+    messages = server.client.teams.by_team_id.return_value.channels.by_channel_id.return_value
+    messages.messages.delta.get = AsyncMock(
+        return_value=Mock(
+            value=[delta_message("1", "Deploy finished", "Ada")],
+            odata_next_link=None,
+            odata_delta_link="https://graph.microsoft.com/v1.0/delta?$deltatoken=1",
+        )
+    )
+    messages.messages.delta.with_url.return_value.get = messages.messages.delta.get
+
+    # A refresh of one team leaves the rest unindexed, so search stays live
+    refreshed = await server._refresh_index("team1")
+    assert refreshed["messages_added"] == 1
+    server._get_channel_messages = AsyncMock(return_value={"messages": []})
+    assert (await server._search_messages("deploy", 10))["source"] == "live"
+
+    refreshed = await server._refresh_index()
+    assert refreshed["channels_refreshed"] == 1
+
+    server._get_channel_messages = AsyncMock()
+    result = await server._search_messages("deploy", 10)
+
+    assert result["source"] == "index"
+    assert result["messages"][0]["channel_name"] == "General"
+    server._get_channel_messages.assert_not_called()
+
+    status = await server._get_index_status()
+    assert status["enabled"] is True
+    assert status["complete"] is True
+    assert status["messages"] == 1
+
+
+@pytest.mark.asyncio
+async def test_user_lookups_share_directory_cache(server):
+    """Test that add_team_member and get_user_presence resolve each email once"""
+    mock_client = MagicMock()
+    mock_client.users.get = AsyncMock(
+        return_value=Mock(value=[Mock(id="user1", mail="Ada@Contoso.com")])
+    )
+    mock_client.users.by_user_id.return_value.presence.get = AsyncMock(
+        return_value=Mock(availability="Available", activity="Available")
+    )
+    mock_client.teams.by_team_id.return_value.members.post = AsyncMock(
+        return_value=Mock(id="member1")
+    )
+    server.client = mock_client
+
+    presence = await server._get_user_presence("ada@contoso.com")
+    added = await server._add_team_member("team1", "ada@contoso.com", "member")
+
+    assert presence["availability"] == "Available"
+    assert added["member_id"] == "member1"
+    assert mock_client.users.get.await_count == 1
+    mock_client.users.by_user_id.assert_called_with("user1")
+
+
+@pytest.mark.asyncio
+async def test_get_users_presence_resolves_and_chunks_in_bulk(server):
+    """Test bulk presence: one user lookup, 650-ID chunks and a short-TTL cache"""
+    emails = [f"user{i}@contoso.com" for i in range(3)]
+    ids = [f"id-{i}" for i in range(700)]
+    mock_client = MagicMock()
+    mock_client.users.get = AsyncMock(
+        return_value=Mock(value=[Mock(id=f"id-{i}", mail=email) for i, email in enumerate(emails)])
+    )
+
+    async def get_presences(body):
+        return Mock(
+            value=[
+                Mock(id=uid, availability="Available", activity="InACall")
+                for uid in body.ids
+                if uid != "id-699"
+            ]
+        )
+
+    presences = mock_client.communications.get_presences_by_user_id
+    presences.post = AsyncMock(side_effect=get_presences)
+    server.client = mock_client
+
+    result = await server._get_users_presence(emails + ids[3:])
+
+    assert result["count"] == 699
+    assert result["not_found"] == ["id-699"]
+    assert result["presence"]["user1@contoso.com"] == {
+        "availability": "Available",
+        "activity": "InACall",
+    }
+    assert mock_client.users.get.await_count == 1
+    assert sorted(len(call.args[0].ids) for call in presences.post.await_args_list) == [50, 650]
+
+    await server._get_users_presence(["user0@contoso.com", "id-699"])
+    assert presences.post.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_user_is_negatively_cached(server):
+    """Test that a missing user raises and is not looked up again"""
+    mock_client = MagicMock()
+    mock_client.users.get = AsyncMock(return_value=Mock(value=[]))
+    server.client = mock_client
+
+    for _ in range(2):
+        with pytest.raises(ValueError, match="User not found"):
+            await server._get_user_presence("ghost@contoso.com")
+
+    assert mock_client.users.get.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_search_messages_coalesces_graph_reads_into_batches():
+    """Test that the search fan-out sends channel and message reads through $batch"""
+    server = M365TeamsServer(Settings(graph_batching=True))
+    server.client = GraphServiceClient(
+        request_adapter=GraphRequestAdapter(AnonymousAuthenticationProvider())
+    )
+    server._list_teams = AsyncMock(
+        return_value={"teams": [{"id": f"team{i}", "display_name": f"Team {i}"} for i in range(3)]}
+    )
+    payloads = []
+
+    async def post_batch(payload):
+        payloads.append(payload)
+        responses = []
+        for request in payload["requests"]:
+            if urlparse(request["url"]).path.endswith("/channels"):
+                body = {"value": [{"id": f"c{i}", "displayName": f"C{i}"} for i in range(5)]}
+            else:
+                body = {"value": [{"id": "m1", "body": {"content": "deploy done"}}]}
+            responses.append({"id": request["id"], "status": 200, "body": body})
+        return {"responses": responses}
+
+    server.batcher._send = post_batch
+
+    result = await server._search_messages("deploy", 100)
+
+    assert result["count"] == 15
+    assert sum(len(p["requests"]) for p in payloads) == 18
+    assert len(payloads) <= 3
+    assert payloads[0]["requests"][0]["url"].startswith("/teams/team")
+
+
+@pytest.mark.asyncio
+async def test_tools_accept_team_channel_and_user_names():
+    """Test that names in tool arguments resolve locally, reading the team list on a miss"""
+    server = M365TeamsServer(Settings(eager_init=False))
+    server.client = MagicMock()
+    team_id = "6f2b1c2e-8a4d-4b7e-9f1a-0c3d5e7f9a1b"
+    server.directory.set_channels(
+        team_id, [{"id": "19:a@thread.tacv2", "display_name": "General"}]
+    )
+    server.directory.set_users([
+        {"id": "u1", "display_name": "Ada Lovelace", "mail": "ada@x.com",
+         "user_principal_name": None},
+    ])
+    server._list_teams = AsyncMock(
+        return_value={"teams": [{"id": team_id, "display_name": "Engineering"}]}
+    )
+
+    resolved = await server._resolve_names({
+        "team_id": "engineering",
+        "channel_id": "Genral",
+        "members": [{"user": "ada lovelace"}, {"user": "bob@x.com"}],
+    })
+
+    assert resolved == {
+        "team_id": team_id,
+        "channel_id": "19:a@thread.tacv2",
+        "members": [{"user": "ada@x.com"}, {"user": "bob@x.com"}],
+    }
+    server._list_teams.assert_awaited_once()
+    assert await server._lookup_users(["ada@x.com"]) == {"ada@x.com": "u1"}
+    with pytest.raises(ValueError, match="No team named 'Marketing'"):
+        await server._resolve_names({"team_id": "Marketing"})
+
+
+@pytest.mark.asyncio
+async def test_write_tools_need_exact_names():
+    """Test that tools changing Graph state never act on a prefix or near-spelling match"""
+    server = M365TeamsServer(Settings(eager_init=False))
+    server.client = MagicMock()
+    team_id = "6f2b1c2e-8a4d-4b7e-9f1a-0c3d5e7f9a1b"
+    server.directory.set_teams([{"id": team_id, "display_name": "Engineering"}])
+    channels = [{"id": "19:a@thread.tacv2", "display_name": "General announcements"}]
+    server.directory.set_channels(team_id, channels)
+    server.directory.set_users([
+        {"id": "u1", "display_name": "John Smith", "mail": "john@contoso.com",
+         "user_principal_name": None},
+    ])
+    server._list_teams = AsyncMock(
+        return_value={"teams": [{"id": team_id, "display_name": "Engineering"}]}
+    )
+    server._get_team_channels = AsyncMock(return_value={"channels": channels})
+    server._add_team_member = AsyncMock()
+
+    assert server.tools["add_team_member"].writes
+    assert not server.tools["get_channel_messages"].writes
+    # IDs the directory knows are taken as they are, whatever their shape
+    server.directory.set_teams([
+        {"id": team_id, "display_name": "Engineering"}, {"id": "team-4", "display_name": "Ops"}
+    ])
+    resolved = await server._resolve_names(
+        {"team_id": "team-4", "user_email": "u1"}, exact=True
+    )
+    assert resolved == {"team_id": "team-4", "user_email": "u1"}
+    with pytest.raises(ValueError, match="No team named exactly 'eng'; did you mean 'Engin"):
+        await server._resolve_names({"team_id": "eng"}, exact=True)
+    with pytest.raises(ValueError, match="did you mean 'General announcements'"):
+        await server._resolve_names({"team_id": team_id, "channel_id": "gen"}, exact=True)
+    result = await server.app.request_handlers[types.CallToolRequest](
+        types.CallToolRequest(
+            method="tools/call",
+            params=types.CallToolRequestParams(
+                name="add_team_member",
+                arguments={"team_id": "Engineering", "user_email": "Jon Smyth"},
+            ),
+        )
+    )
+    assert "No user named exactly 'Jon Smyth'; did you mean 'John Smith'" in (
+        result.root.content[0].text
+    )
+    server._add_team_member.assert_not_awaited()
+
+    # Read tools still take the closest match
+    resolved = await server._resolve_names({"team_id": "eng", "user_email": "Jon Smyth"})
+    assert resolved == {"team_id": team_id, "user_email": "john@contoso.com"}
+
+
+@pytest.mark.asyncio
+async def test_directory_snapshot_warm_starts_the_team_list(tmp_path):
+    """Test that a saved snapshot serves list_teams without a Graph call after a restart"""
+    path = str(tmp_path / "directory.json.gz")
+    first = M365TeamsServer(Settings(directory_path=path, eager_init=False))
+    first.directory.replace([{"id": "t1", "display_name": "Engineering", "description": None}], {})
+    first.directory.save()
+
+    server = M365TeamsServer(
+        Settings(directory_path=path, directory_refresh_interval=0, eager_init=False)
+    )
+    server.client = MagicMock()
+    await server._directory_refresh_loop()
+
+    assert (await server._list_teams())["teams"][0]["display_name"] == "Engineering"
+    server.client.me.joined_teams.get.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_directory_refresh_lists_users_only_while_allowed():
+    """Test that users are read only when enabled, and not again after Graph refuses"""
+    from mcp_m365_teams.batching import GraphBatchError
+
+    server = M365TeamsServer(Settings(eager_init=False))
+    server._list_teams = AsyncMock(return_value={"teams": [{"id": "t1", "display_name": "Eng"}]})
+    server._get_team_channels = AsyncMock(return_value={"channels": []})
+    server._list_directory_users = AsyncMock(side_effect=GraphBatchError(403, None))
+
+    await server._refresh_directory()
+    server._list_directory_users.assert_not_awaited()
+
+    server.settings.directory_max_users = 100
+    for _ in range(2):
+        status = await server._refresh_directory()
+        assert status["teams"] == 1
+    server._list_directory_users.assert_awaited_once_with(100)
+    assert not server.list_users
+
+
+@pytest.mark.asyncio
+async def test_outbox_queues_and_delivers_in_channel_order():
+    """Test queued sends: idempotent keys, in-order delivery per channel and retries"""
+    server = M365TeamsServer(
+        Settings(outbox_path=":memory:", outbox_channel_interval=0, eager_init=False)
+    )
+    server.client = MagicMock()
+    server.scheduler.backoff = lambda attempt: 0.0
+    channel = "19:a@thread.tacv2"
+    posted = []
+
+    async def send(team_id, channel_id, message):
+        if message == "first" and "first" not in posted:
+            posted.append("first")
+            raise httpx.ConnectError("connection refused")
+        posted.append(message)
+        return {"success": True, "message_id": f"m-{message}", "created_at": None}
+
+    server._send_channel_message = AsyncMock(side_effect=send)
+    queued = await server._queue_channel_message("t1", channel, "first", "key-1")
+    duplicate = await server._queue_channel_message("t1", channel, "first", "key-1")
+    await server._queue_channel_message("t1", channel, "second")
+
+    loop = asyncio.create_task(server._outbox_loop())
+    for _ in range(100):
+        if (await server._get_outbox_status())["outbox"]["sent"] == 2:
+            break
+        await asyncio.sleep(0.01)
+    loop.cancel()
+    await asyncio.gather(loop, return_exceptions=True)
+
+    status = await server._get_outbox_status(idempotency_key="key-1")
+    assert queued["queued"] and not duplicate["queued"]
+    assert duplicate["outbox_id"] == queued["outbox_id"]
+    assert posted == ["first", "first", "second"]
+    assert status["entry"]["status"] == "sent"
+    assert status["entry"]["message_id"] == "m-first"
+    assert status["entry"]["attempts"] == 2
+    assert status["outbox"]["depth"] == 0
+
+
+@pytest.mark.asyncio
+async def test_outbox_fails_permanent_errors_at_once():
+    """Test that a 4xx fails the entry on its first attempt, sent alone or in a $batch"""
+    from mcp_m365_teams.batching import GraphBatchError
+
+    server = M365TeamsServer(Settings(outbox_path=":memory:", eager_init=False))
+    server.client = MagicMock()
+    not_found = Exception("Not found")
+    not_found.response_status_code = 404
+    for error in (GraphBatchError(403, None), not_found):
+        server._send_channel_message = AsyncMock(side_effect=error)
+        queued = await server._queue_channel_message("t1", "19:a@thread.tacv2", "hello")
+        entry = server.outbox.claim(now=time.time(), limit=1, skip=set())[0]
+        await server._deliver(entry)
+
+        status = await server._get_outbox_status(queued["outbox_id"])
+        assert status["entry"]["status"] == "failed"
+        assert status["entry"]["attempts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_outbox_never_reposts_a_send_that_may_have_landed():
+    """Test that a post failing after Graph delivered it is marked unknown, not sent twice"""
+    from mcp_m365_teams.batching import GraphBatchError
+
+    server = M365TeamsServer(
+        Settings(outbox_path=":memory:", outbox_channel_interval=0, eager_init=False)
+    )
+    server.client = MagicMock()
+    server.scheduler.backoff = lambda attempt: 0.0
+    posted = []
+
+    async def send(team_id, channel_id, message):
+        # Graph posts the message, but the response never makes it back
+        posted.append(message)
+        raise httpx.ReadTimeout("timed out") if message == "hello" else GraphBatchError(504, None)
+
+    server._send_channel_message = AsyncMock(side_effect=send)
+    first = await server._queue_channel_message("t1", "19:a@thread.tacv2", "hello", "key-1")
+    second = await server._queue_channel_message("t1", "19:b@thread.tacv2", "bye", "key-2")
+
+    loop = asyncio.create_task(server._outbox_loop())
+    for _ in range(100):
+        if (await server._get_outbox_status())["outbox"]["unknown"] == 2:
+            break
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.05)
+    loop.cancel()
+    await asyncio.gather(loop, return_exceptions=True)
+
+    assert sorted(posted) == ["bye", "hello"]
+    again = await server._queue_channel_message("t1", "19:a@thread.tacv2", "hello", "key-1")
+    assert not again["queued"]
+    for queued in (first, second):
+        entry = (await server._get_outbox_status(queued["outbox_id"]))["entry"]
+        assert (entry["status"], entry["attempts"]) == ("unknown", 1)
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_reads_share_one_graph_request():
+    """Test that concurrent cache misses for the same URL send one Graph request"""
+    from msgraph.generated.users.item.joined_teams.joined_teams_request_builder import (
+        JoinedTeamsRequestBuilder,
+    )
+
+    server = M365TeamsServer(Settings(graph_batching=False))
+    server.client = GraphServiceClient(
+        request_adapter=GraphRequestAdapter(AnonymousAuthenticationProvider())
+    )
+    requests = 0
+
+    async def get(self, request_configuration=None):
+        nonlocal requests
+        requests += 1
+        await asyncio.sleep(0.01)
+        return Mock(value=[Mock(id="team1", display_name="Team 1", description=None)])
+
+    with patch.object(JoinedTeamsRequestBuilder, "get", get):
+        results = await asyncio.gather(*(server._list_teams() for _ in range(5)))
+
+    assert requests == 1
+    assert all(result["count"] == 1 for result in results)
+    assert server.reads.stats() == {"calls": 1, "shared": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_get_channel_messages_pages_with_top_and_cursor():
+    """Test $top pushdown, nextLink paging beyond one page and cursor continuation"""
+    server = M365TeamsServer(Settings(graph_batching=True))
+    server.client = GraphServiceClient(
+        request_adapter=GraphRequestAdapter(AnonymousAuthenticationProvider())
+    )
+    base_url = server.client.request_adapter.base_url.rstrip("/")
+    history = [{"id": f"m{i}", "body": {"content": f"message {i}"}} for i in range(120)]
+    requested = []
+
+    async def post_batch(payload):
+        responses = []
+        for request in payload["requests"]:
+            requested.append(request["url"])
+            query = parse_qs(urlparse(request["url"]).query)
+            top = int(query["$top"][0])
+            start = int(query.get("$skiptoken", ["0"])[0])
+            body = {"value": history[start : start + top]}
+            if start + top < len(history):
+                path = urlparse(request["url"]).path
+                body["@odata.nextLink"] = f"{base_url}{path}?$top={top}&$skiptoken={start + top}"
+            responses.append({"id": request["id"], "status": 200, "body": body})
+        return {"responses": responses}
+
+    server.batcher._send = post_batch
+
+    first = await server._get_channel_messages("team1", "channel1", 5, fields=["id"])
+    assert first["messages"] == [{"id": f"m{i}"} for i in range(5)]
+    assert "%24top=5" in requested[0]
+    # Graph does not honour $select on channel messages; fields are trimmed locally
+    assert "select" not in requested[0]
+
+    deep = await server._get_channel_messages("team1", "channel1", 70)
+    assert deep["count"] == 70
+    assert deep["messages"][-1]["id"] == "m69"
+
+    rest = await server._get_channel_messages("team1", "channel1", 100, deep["next_cursor"])
+    assert [m["id"] for m in rest["messages"]][:2] == ["m70", "m71"]
+    assert rest["count"] == 50
+    assert rest["next_cursor"] is None
+
+    requested.clear()
+    for read in (
+        server._get_channel_messages("team1", "channel1", -1),
+        server._search_messages("deploy", 0),
+        server._get_channel_changes("team1", "channel1", limit=0),
+    ):
+        with pytest.raises(ValueError, match="limit must be at least 1"):
+            await read
+    assert requested == []
+    for name in ("get_channel_messages", "get_channel_changes", "search_messages"):
+        assert server.tools[name].tool.inputSchema["properties"]["limit"]["minimum"] == 1
+
+
+@pytest.mark.asyncio
+async def test_add_team_members_chunks_and_reports_failures(server):
+    """Test members/add chunking, per-member results and a retryable failed list"""
+    emails = [f"user{i}@contoso.com" for i in range(250)]
+    mock_client = MagicMock()
+    mock_client.users.to_get_request_information.side_effect = lambda config: Mock(
+        url=config.query_parameters.filter, path_parameters={}
+    )
+    mock_client.users.get = AsyncMock(
+        side_effect=lambda request_configuration: Mock(
+            value=[
+                Mock(id=f"id-{email}", mail=email)
+                for email in emails
+                if email in request_configuration.query_parameters.filter
+                and email != "user7@contoso.com"
+            ]
+        )
+    )
+
+    async def add_members(body):
+        user_ids = [m.additional_data["user@odata.bind"].split("'")[1] for m in body.values]
+        blocked = Mock(code="Forbidden", message="Blocked")
+        return Mock(
+            value=[
+                Mock(user_id=uid, error=blocked if "user9@" in uid else None) for uid in user_ids
+            ]
+        )
+
+    add = mock_client.teams.by_team_id.return_value.members.add
+    add.post = AsyncMock(side_effect=add_members)
+    server.client = mock_client
+
+    members = [{"user": email} for email in emails] + [{"user": "raw-id", "role": "owner"}]
+    result = await server._add_team_members("team1", members)
+
+    assert result["added"] == 249
+    assert mock_client.users.get.await_count == 17
+    assert {f["user"]: f["error"] for f in result["failed"]} == {
+        "user7@contoso.com": "User not found",
+        "user9@contoso.com": "Blocked",
+    }
+    assert sorted(len(call.args[0].values) for call in add.post.await_args_list) == [50, 200]
+    owner = add.post.await_args_list[-1].args[0].values[-1]
+    assert owner.roles == ["owner"]
+
+
+@pytest.mark.asyncio
+async def test_broadcast_channel_message_limits_concurrency_and_reports_failures():
+    """Test broadcast posts under the concurrency limit and returns retryable failures"""
+    server = M365TeamsServer(Settings(broadcast_concurrency=2))
+    in_flight = 0
+    peak = 0
+
+    async def send(team_id, channel_id, message):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        if channel_id == "c3":
+            raise RuntimeError("Forbidden")
+        return {"success": True, "message_id": f"msg-{channel_id}"}
+
+    server._send_channel_message = send
+    channels = [{"team_id": "t1", "channel_id": f"c{i}"} for i in range(6)]
+
+    result = await server._broadcast_channel_message(channels, "Hello")
+
+    assert peak == 2
+    assert result["sent"] == 5
+    assert result["failed"] == [{"team_id": "t1", "channel_id": "c3", "error": "Forbidden"}]
+
+    retry = await server._broadcast_channel_message(result["failed"], "Hello")
+    assert retry["failed"][0]["channel_id"] == "c3"
+
+
+@pytest.mark.asyncio
+async def test_get_channel_changes_resumes_from_persisted_delta_link(tmp_path):
+    """Test delta paging, change cursors and resuming from a stored deltaLink after restart"""
+    settings = Settings(sync_path=str(tmp_path / "sync.db"))
+    server = M365TeamsServer(settings)
+    server.client = MagicMock()
+    delta = server.client.teams.by_team_id.return_value.channels.by_channel_id.return_value
+    delta = delta.messages.delta
+    delta.get = AsyncMock(
+        return_value=Mock(
+            value=[delta_message("1", "hello", "Ada")],
+            odata_next_link="https://graph.microsoft.com/v1.0/next",
+            odata_delta_link=None,
+        )
+    )
+    delta_link = "https://graph.microsoft.com/v1.0/delta?$deltatoken=A"
+    delta.with_url.return_value.get = AsyncMock(
+        side_effect=[
+            Mock(
+                value=[delta_message("2", "world", "Grace")],
+                odata_next_link=None,
+                odata_delta_link=delta_link,
+            ),
+            Mock(value=[], odata_next_link=None, odata_delta_link=delta_link),
+        ]
+    )
+
+    first = await server._get_channel_changes("team1", "channel1", limit=1)
+    assert [c["id"] for c in first["changes"]] == ["1"]
+    assert first["has_more"] is True
+    second = await server._get_channel_changes("team1", "channel1", first["cursor"])
+    assert [c["message"]["content"] for c in second["changes"]] == ["world"]
+
+    restarted = M365TeamsServer(settings)
+    restarted.client = server.client
+    delta.with_url.reset_mock()
+    delta.with_url.return_value.get = AsyncMock(
+        return_value=Mock(
+            value=[delta_message("1", deleted=True)],
+            odata_next_link=None,
+            odata_delta_link="https://graph.microsoft.com/v1.0/delta?$deltatoken=B",
+        )
+    )
+
+    third = await restarted._get_channel_changes("team1", "channel1", second["cursor"])
+    delta.with_url.assert_called_once_with(delta_link)
+    assert delta.get.await_count == 1
+    assert [(c["id"], c["change"], c["message"]) for c in third["changes"]] == [
+        ("1", "deleted", None)
+    ]
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        await restarted._get_channel_changes("team1", "channel1", "not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_expired_delta_link_triggers_a_full_resync():
+    """Test that a deltaLink Graph rejects is dropped for a full resync, expiring cursors"""
+    from mcp_m365_teams.batching import GraphBatchError
+
+    server = M365TeamsServer(Settings())
+    server.client = MagicMock()
+    delta = server.client.teams.by_team_id.return_value.channels.by_channel_id.return_value
+    delta = delta.messages.delta
+    delta.get = AsyncMock(
+        side_effect=[
+            Mock(value=[delta_message("1", "hello")], odata_next_link=None, odata_delta_link="A"),
+            Mock(value=[delta_message("2", "again")], odata_next_link=None, odata_delta_link="B"),
+        ]
+    )
+    delta.with_url.return_value.get = AsyncMock(
+        side_effect=GraphBatchError(410, {"error": {"code": "syncStateNotFound"}})
+    )
+
+    first = await server._get_channel_changes("team1", "channel1")
+    assert first["cursor_expired"] is False
+    second = await server._get_channel_changes("team1", "channel1", first["cursor"])
+
+    delta.with_url.assert_called_once_with("A")
+    assert [c["id"] for c in second["changes"]] == ["2"]
+    assert second["cursor_expired"] is True
+    assert server.delta.delta_link("team1", "channel1") == "B"
+
+    delta.with_url.return_value.get = AsyncMock(side_effect=GraphBatchError(403, None))
+    with pytest.raises(GraphBatchError):
+        await server._get_channel_changes("team1", "channel1", second["cursor"])
+    assert delta.get.await_count == 2
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
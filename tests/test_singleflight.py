@@ -0,0 +1,82 @@
+"""
+Tests for single-flight deduplication
+"""
+import asyncio
+
+import pytest
+
+from mcp_m365_teams.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    """Test that callers of the same key share one call and its result"""
+    flights = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(flights.do("teams", fetch) for _ in range(5)))
+    other = await flights.do("teams", fetch)
+
+    assert results == [1] * 5
+    assert other == 2
+    assert flights.stats() == {"calls": 2, "shared": 4, "in_flight": 0}
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    """Test that a failed call raises in every caller sharing it"""
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("throttled")
+
+    results = await asyncio.gather(
+        *(flights.do("teams", fail) for _ in range(3)), return_exceptions=True
+    )
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_only_when_every_caller_is():
+    """Test that one cancelled caller leaves the call running for the rest"""
+    flights = SingleFlight()
+    started = asyncio.Event()
+    finish = asyncio.Event()
+    cancelled = False
+
+    async def fetch():
+        nonlocal cancelled
+        started.set()
+        try:
+            await finish.wait()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return "ok"
+
+    first = asyncio.create_task(flights.do("teams", fetch))
+    second = asyncio.create_task(flights.do("teams", fetch))
+    await started.wait()
+    first.cancel()
+    finish.set()
+    assert await second == "ok"
+    assert not cancelled
+
+    finish.clear()
+    started.clear()
+    lone = asyncio.create_task(flights.do("teams", fetch))
+    await started.wait()
+    lone.cancel()
+    await asyncio.gather(lone, return_exceptions=True)
+    await asyncio.sleep(0)
+    assert cancelled
+    assert len(flights) == 0
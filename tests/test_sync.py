@@ -0,0 +1,87 @@
+"""
+Tests for the delta-sync store
+"""
+import pytest
+
+from mcp_m365_teams.sync import DeltaStore, decode_change_cursor
+
+
+@pytest.fixture
+def store(tmp_path):
+    """Create a store backed by a temporary file"""
+    store = DeltaStore(str(tmp_path / "sync.db"), max_changes=3)
+    yield store
+    store.close()
+
+
+def _upsert(msg_id):
+    return {"id": msg_id, "change": "upserted", "message": {"id": msg_id, "content": msg_id}}
+
+
+def test_delta_link_persists_across_reopen(tmp_path):
+    """Test that a stored deltaLink survives closing and reopening the store"""
+    path = str(tmp_path / "sync.db")
+    store = DeltaStore(path)
+    store.record("team1", "channel1", [_upsert("m1")], "https://graph/delta?token=1")
+    store.close()
+
+    reopened = DeltaStore(path)
+    assert reopened.delta_link("team1", "channel1") == "https://graph/delta?token=1"
+    assert reopened.delta_link("team1", "channel2") is None
+    assert reopened.changes_since("team1", "channel1")["count"] == 1
+    reopened.close()
+
+
+def test_changes_since_pages_per_channel(store):
+    """Test cursor paging that ignores other channels' changes"""
+    store.record("team1", "channel1", [_upsert("m1")], "link")
+    store.record("team1", "channel2", [_upsert("x1")], "link")
+    store.record("team1", "channel1", [_upsert("m2"), {"id": "m1", "change": "deleted"}], "link")
+
+    page = store.changes_since("team1", "channel1", 0, limit=2)
+    assert [c["id"] for c in page["changes"]] == ["m1", "m2"]
+    assert page["has_more"] is True
+
+    rest = store.changes_since("team1", "channel1", decode_change_cursor(page["cursor"]))
+    assert [(c["id"], c["change"]) for c in rest["changes"]] == [("m1", "deleted")]
+    assert rest["has_more"] is False
+
+    idle = store.changes_since("team1", "channel1", decode_change_cursor(rest["cursor"]))
+    assert idle["changes"] == []
+    assert idle["cursor"] == rest["cursor"]
+
+
+def test_pruned_changes_expire_old_cursors(store):
+    """Test that the log keeps max_changes per channel and flags cursors behind the pruning"""
+    store.record("team1", "channel1", [_upsert("m1")], "link")
+    cursor = store.changes_since("team1", "channel1")["cursor"]
+    store.record("team1", "channel1", [_upsert(f"m{i}") for i in range(2, 6)], "link")
+
+    page = store.changes_since("team1", "channel1", decode_change_cursor(cursor))
+    assert page["cursor_expired"] is True
+    assert [c["id"] for c in page["changes"]] == ["m3", "m4", "m5"]
+    assert store.status()["changes"] == 3
+
+
+def test_resync_replaces_the_link_and_expires_earlier_cursors(store):
+    """Test that a full resync drops the old log and flags every cursor from before it"""
+    store.record("team1", "channel1", [_upsert("m1")], "old-link")
+    store.record("team1", "channel2", [_upsert("x1")], "link")
+    cursor = decode_change_cursor(store.changes_since("team1", "channel1")["cursor"])
+
+    store.record("team1", "channel1", [_upsert("m1"), _upsert("m2")], "new-link", resync=True)
+
+    assert store.delta_link("team1", "channel1") == "new-link"
+    page = store.changes_since("team1", "channel1", cursor)
+    assert page["cursor_expired"] is True
+    assert [c["id"] for c in page["changes"]] == ["m1", "m2"]
+    caught_up = store.changes_since("team1", "channel1", decode_change_cursor(page["cursor"]) - 1)
+    assert caught_up["cursor_expired"] is False
+    assert store.changes_since("team1", "channel2")["count"] == 1
+
+
+def test_invalid_cursor_is_rejected():
+    """Test that malformed cursors raise ValueError"""
+    for cursor in ("abc", "-1"):
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_change_cursor(cursor)
@@ -0,0 +1,86 @@
+"""
+Tests for the tenant pool
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from mcp_m365_teams.tenants import (
+    DEFAULT_TENANT,
+    TenantConfig,
+    TenantPool,
+    load_tenants,
+    tenant_path,
+)
+
+
+def make_pool(names, max_size=2):
+    configs = {name: TenantConfig(name, f"tid-{name}", "app", "secret") for name in names}
+    evicted = []
+
+    def factory(name, config):
+        tenant = MagicMock(in_use=0, config=config)
+        tenant.name = name
+        return tenant
+
+    return TenantPool(factory, configs, max_size=max_size, on_evict=evicted.append), evicted
+
+
+def test_tenants_are_created_lazily_and_evicted_least_recently_used():
+    """Test lazy creation, LRU eviction of idle tenants and that the default is kept"""
+    pool, evicted = make_pool(["a", "b", "c"])
+
+    a = pool.acquire("a")
+    pool.release(a)
+    b = pool.acquire("b")
+    pool.release(b)
+    assert pool.acquire("a") is a
+    pool.release(a)
+    pool.release(pool.acquire("c"))
+
+    assert [tenant.name for tenant in evicted] == ["b"]
+    assert pool.stats()["live"] == [DEFAULT_TENANT, "a", "c"]
+    assert pool.acquire(DEFAULT_TENANT) is pool.default
+
+
+def test_busy_tenants_are_not_evicted():
+    """Test that a tenant serving a call survives until it is released"""
+    pool, evicted = make_pool(["a", "b"], max_size=1)
+
+    a = pool.acquire("a")
+    b = pool.acquire("b")
+    assert evicted == []
+
+    pool.release(a)
+    assert evicted == [a]
+    pool.release(b)
+
+
+def test_unknown_tenant_is_rejected():
+    pool, _ = make_pool(["a"])
+
+    with pytest.raises(ValueError, match="Unknown tenant"):
+        pool.acquire("nope")
+
+
+def test_load_tenants_validates_entries(tmp_path):
+    """Test reading named credentials and rejecting incomplete ones"""
+    path = tmp_path / "tenants.json"
+    entry = {"tenant_id": "t", "client_id": "c", "client_secret": "s"}
+    path.write_text(json.dumps({"contoso": entry}))
+    assert load_tenants(str(path))["contoso"].key == ("t", "c")
+
+    path.write_text(json.dumps({"fabrikam": {"tenant_id": "t"}}))
+    with pytest.raises(ValueError, match="client_id, client_secret"):
+        load_tenants(str(path))
+
+
+def test_tenant_path():
+    """Test that stores are split per tenant and app registration, like the pool"""
+    config = TenantConfig("contoso", "t1", "app1", "secret")
+    other_app = TenantConfig("contoso-admin", "t1", "app2", "secret")
+    assert tenant_path("/data/index.db", config) == "/data/index.t1.app1.db"
+    assert tenant_path("/data/index.db", other_app) != tenant_path("/data/index.db", config)
+    assert tenant_path(":memory:", config) == ":memory:"
+    assert tenant_path(None, config) is None
@@ -0,0 +1,87 @@
+"""
+Tests for the cached user directory
+"""
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from mcp_m365_teams.users import UserDirectory, mail_filter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_mail_filter_escapes_quotes():
+    """Test that addresses are OR-ed and quotes are escaped"""
+    assert mail_filter(["a@x.com", "o'neil@x.com"]) == (
+        "mail eq 'a@x.com' or mail eq 'o''neil@x.com'"
+    )
+
+
+@pytest.mark.asyncio
+async def test_resolve_caches_hits_and_misses(clock):
+    """Test that found and unknown users are both served from cache until expiry"""
+    lookup = AsyncMock(return_value={"ada@x.com": "user1"})
+    directory = UserDirectory(lookup, ttl=60, negative_ttl=10, clock=clock)
+
+    assert await directory.resolve("Ada@x.com") == "user1"
+    assert await directory.resolve("ghost@x.com") is None
+    assert await directory.resolve("ada@x.com") == "user1"
+    assert await directory.resolve("ghost@x.com") is None
+    assert lookup.await_count == 2
+
+    clock.now = 30
+    assert await directory.resolve("ghost@x.com") is None
+    assert await directory.resolve("ada@x.com") == "user1"
+    assert lookup.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_resolve_many_batches_lookups(clock):
+    """Test that cache misses are resolved in concurrent chunks of at most 15 addresses"""
+    in_flight = []
+
+    async def resolve(emails):
+        in_flight.append(len(emails))
+        await asyncio.sleep(0)
+        assert in_flight == [15, 5]
+        return {e: f"id-{e}" for e in emails}
+
+    lookup = AsyncMock(side_effect=resolve)
+    directory = UserDirectory(lookup, clock=clock)
+    emails = [f"user{i}@x.com" for i in range(20)]
+
+    result = await directory.resolve_many(emails + ["USER0@x.com"])
+
+    assert result["user7@x.com"] == "id-user7@x.com"
+    assert result["USER0@x.com"] == "id-user0@x.com"
+    assert [len(call.args[0]) for call in lookup.await_args_list] == [15, 5]
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction(clock):
+    """Test that the least recently used entry is evicted first"""
+    lookup = AsyncMock(side_effect=lambda emails: {e: e for e in emails})
+    directory = UserDirectory(lookup, max_size=2, clock=clock)
+
+    await directory.resolve("a@x.com")
+    await directory.resolve("b@x.com")
+    await directory.resolve("a@x.com")
+    await directory.resolve("c@x.com")
+
+    assert len(directory) == 2
+    await directory.resolve("a@x.com")
+    assert lookup.await_count == 3
+    await directory.resolve("b@x.com")
+    assert lookup.await_count == 4